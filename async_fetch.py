@@ -0,0 +1,180 @@
+"""asyncio 并发抓取引擎。
+
+用一个带连接池的 requests.Session 抓取页面的服务端 HTML 或内容 JSON，
+每个 host 的并发数由信号量限制、请求速率由自适应令牌桶限制，结果交给 get_dialogue 中的结构 A/B 解析函数。
+解析不到内容（需要 JS 渲染/展开）的页面标记为 needs_js，由调用方回退到 Selenium。
+
+本地测试时可以用 `python -m http.server` 托管保存下来的页面，
+把 CSV 中的 url 指向 localhost 并传入 content_api=""。
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limit import HostRateLimiters
+
+# --- 配置信息 ---
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# 观测枢内容接口，返回的 JSON 中带有词条正文 HTML；为空时直接抓取页面 URL
+CONTENT_API_TEMPLATE = "https://api-static.mihoyo.com/common/blackboard/ys_obc/v1/content/info?app_sn=ys_obc&content_id={content_id}"
+
+DEFAULT_PER_HOST_CONCURRENCY = 4
+REQUEST_TIMEOUT = 10
+
+CONTENT_ID_PATTERN = re.compile(r'/content/(\d+)/')
+
+
+@dataclass
+class FetchResult:
+    title: str
+    url: str
+    dialogues: list = field(default_factory=list)
+    narratives: list = field(default_factory=list)
+    needs_js: bool = False
+    error: str | None = None
+    # 增量刷新相关：响应内容哈希、校验头，以及内容是否与清单记录一致
+    sha256: str | None = None
+    etag: str | None = None
+    last_modified: str | None = None
+    unchanged: bool = False
+
+
+def content_url_for(url, content_api=CONTENT_API_TEMPLATE):
+    """根据页面 URL 得到实际请求的地址：有内容接口且能解析出 content_id 时走接口，否则原样返回"""
+    if not content_api:
+        return url
+    match = CONTENT_ID_PATTERN.search(url)
+    if not match:
+        return url
+    return content_api.format(content_id=match.group(1))
+
+
+def html_from_payload(body):
+    """接口返回 JSON 时取出其中的正文 HTML；普通 HTML 原样返回"""
+    stripped = body.lstrip()
+    if not stripped.startswith("{"):
+        return body
+    try:
+        payload = json.loads(stripped)
+    except ValueError:
+        return body
+
+    content = (payload.get("data") or {}).get("content") or {}
+    parts = [c.get("text", "") for c in content.get("contents") or [] if isinstance(c, dict)]
+    if not any(parts) and content.get("content"):
+        parts = [content["content"]]
+    return "\n".join(p for p in parts if p)
+
+
+def response_text(resp):
+    """
+    响应正文。Content-Type 带 charset 时按其解码；不带时 requests 会把 text/html 当作 ISO-8859-1，
+    中文全部变成乱码，这里按 UTF-8 解码（观测枢与 python -m http.server 托管的页面都是 UTF-8）。
+    """
+    if "charset" in resp.headers.get("Content-Type", "").lower():
+        return resp.text
+    return resp.content.decode("utf-8", errors="replace")
+
+
+def create_session(pool_size=DEFAULT_PER_HOST_CONCURRENCY):
+    """创建共享连接池的 Session"""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class HostSemaphores:
+    """按 host 分配信号量，限制对同一站点的并发请求数"""
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._semaphores = {}
+
+    def get(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host)
+        return self._semaphores[host]
+
+
+async def fetch_one(session, semaphores, limiters, title, url, parse_html, content_api=CONTENT_API_TEMPLATE,
+                    cache=None, manifest=None):
+    """
+    抓取并解析单个页面，失败或解析为空时标记 needs_js；cache 不为空时保存响应原文。
+    manifest 有该 URL 的记录时发送条件请求，304 或内容哈希不变则标记 unchanged 并跳过解析。
+    """
+    result = FetchResult(title=title, url=url)
+    request_url = content_url_for(url, content_api)
+    limiter = limiters.get(request_url)
+    headers = manifest.conditional_headers(url) if manifest is not None else {}
+    async with semaphores.get(request_url):
+        await limiter.acquire_async()
+        started = time.monotonic()
+        try:
+            resp = await asyncio.to_thread(session.get, request_url, timeout=REQUEST_TIMEOUT, headers=headers)
+            if resp.status_code == 304:
+                limiter.record(time.monotonic() - started)
+                result.unchanged = True
+                return result
+            resp.raise_for_status()
+            body = response_text(resp)
+            limiter.record(time.monotonic() - started)
+        except requests.RequestException as e:
+            limiter.record(time.monotonic() - started, ok=False)
+            print(f"HTTP 请求失败: {url} - 错误类型: {type(e).__name__}")
+            result.error = type(e).__name__
+            result.needs_js = True
+            return result
+
+    result.sha256 = hashlib.sha256(body.encode("utf-8")).hexdigest()
+    result.etag = resp.headers.get("ETag")
+    result.last_modified = resp.headers.get("Last-Modified")
+    previous = manifest.get(url) if manifest is not None else None
+    if previous is not None and previous.get("sha256") == result.sha256:
+        result.unchanged = True
+        return result
+
+    if cache is not None:
+        await asyncio.to_thread(cache.put, url, body)
+    html = html_from_payload(body)
+    # 解析放到线程里，避免阻塞事件循环中的其它请求
+    result.dialogues, result.narratives = await asyncio.to_thread(parse_html, html, title, url)
+    if not result.dialogues and not result.narratives:
+        result.needs_js = True
+    else:
+        print(f"[HTTP] 页面 [{title}] 成功提取 {len(result.dialogues)} 条对话，{len(result.narratives)} 条旁白。")
+    return result
+
+
+async def fetch_all(rows, parse_html, per_host=DEFAULT_PER_HOST_CONCURRENCY, content_api=CONTENT_API_TEMPLATE,
+                    limiters=None, cache=None, manifest=None):
+    """
+    并发抓取 rows 中的 (title, url)，返回与输入顺序一致的 FetchResult 列表。
+    parse_html(html, title, url) -> (dialogue_list, narrative_list)
+    limiters 为 HostRateLimiters，信号量限制并发数，令牌桶限制请求速率。
+    cache 为 PageCache 时按页面 URL 保存响应原文（HTML 或内容 JSON）。
+    manifest 为 CrawlManifest 时对已记录的 URL 发送条件请求，未变化的页面标记 unchanged。
+    """
+    semaphores = HostSemaphores(per_host)
+    if limiters is None:
+        limiters = HostRateLimiters()
+    session = create_session(per_host)
+    try:
+        tasks = [fetch_one(session, semaphores, limiters, title, url, parse_html, content_api, cache, manifest)
+                 for title, url in rows]
+        return await asyncio.gather(*tasks)
+    finally:
+        session.close()
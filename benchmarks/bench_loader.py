@@ -0,0 +1,94 @@
+"""语料加载基准。
+
+对比两种加载全部语料的方式的耗时与峰值内存（RSS）：
+    json         对 corpus_loader.find_sources 选出的源文件逐个 json.load
+    columnar     corpus_loader.Corpus 加载全部分类（驻留字符串的列存储）
+两者读取同一组文件（dialogue/ 中有的分类不再读 speaker/ 下的副本），记录数应一致。
+每种方式在独立的子进程中运行，峰值 RSS 互不影响。
+
+运行: python benchmarks/bench_loader.py [--repeat 3]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def peak_rss_mb():
+    """当前进程的峰值 RSS（MB）；没有 resource 模块（Windows）时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def load_json():
+    from corpus_loader import find_sources
+    data = []
+    for paths in find_sources(ROOT / "dialogue", ROOT / "speaker").values():
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                data.append(json.load(f))
+    return sum(len(d) for d in data), data
+
+
+def load_columnar():
+    from corpus_loader import Corpus
+    corpus = Corpus(ROOT / "dialogue", ROOT / "speaker").load_all()
+    return len(corpus), corpus
+
+
+METHODS = {"json": load_json, "columnar": load_columnar}
+
+
+def run_method(name):
+    """子进程入口：加载一次并输出 JSON 结果"""
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    records, data = METHODS[name]()
+    elapsed = time.perf_counter() - started
+    peak = peak_rss_mb()
+    print(json.dumps({"records": records, "seconds": round(elapsed, 4),
+                      "peak_rss_mb": round(peak, 2) if peak is not None else None,
+                      "delta_rss_mb": round(peak - baseline, 2) if peak is not None else None}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语料加载基准")
+    parser.add_argument("--repeat", type=int, default=3, help="每种方式运行的次数，取最快一次")
+    parser.add_argument("--method", choices=METHODS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.method:
+        run_method(args.method)
+        return
+
+    results = {}
+    for name in METHODS:
+        runs = []
+        for _ in range(args.repeat):
+            out = subprocess.run([sys.executable, __file__, "--method", name], capture_output=True, text=True,
+                                 check=True)
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        results[name] = min(runs, key=lambda r: r["seconds"])
+        r = results[name]
+        print(f"[{name}] {r['records']} 条记录，加载 {r['seconds'] * 1000:.0f} ms，"
+              f"峰值 RSS {r['peak_rss_mb']} MB（加载增加 {r['delta_rss_mb']} MB）")
+
+    if results["json"]["records"] != results["columnar"]["records"]:
+        print("警告: 两种方式加载的记录数不一致，对比结果无效")
+    if results["json"]["delta_rss_mb"] and results["columnar"]["delta_rss_mb"]:
+        ratio = results["json"]["delta_rss_mb"] / results["columnar"]["delta_rss_mb"]
+        print(f"列存储加载内存为 json.load 的 1/{ratio:.1f}")
+
+
+if __name__ == "__main__":
+    main()
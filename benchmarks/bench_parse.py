@@ -0,0 +1,117 @@
+"""页面解析基准。
+
+对 fixtures/pages/ 中保存的结构 A / B 页面重复解析，报告每秒页数与吞吐量，
+并用 expected.json 校验提取出的对话 / 旁白条数。
+安装了 BeautifulSoup 时同时测量原先基于 BeautifulSoup 的解析逻辑作为对照。
+
+运行: python benchmarks/bench_parse.py [--repeat 50]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from dialogue_parser import (DIALOGUE_AREA_CLASS, DIALOGUE_NODE_CLASS, FOLD_MODULE_CLASS,  # noqa: E402
+                             parse_dialogue_html, split_dialogue_text)
+
+PAGES_DIR = Path(__file__).resolve().parent / "fixtures" / "pages"
+
+
+def legacy_parse_dialogue_html(html, dialogue_title):
+    """原先的 BeautifulSoup 实现：构建完整 DOM 后多次 find_all"""
+    from bs4 import BeautifulSoup
+
+    dialogue_list = []
+    narrative_list = []
+    soup = BeautifulSoup(html, 'html.parser')
+    for module in soup.find_all("div", class_=FOLD_MODULE_CLASS):
+        title_div = module.find("div", class_="obc-tmpl-fold__title")
+        if title_div:
+            is_target_module = "剧情对话" in title_div.get_text(strip=True)
+        else:
+            title_span = module.find("span")
+            is_target_module = bool(title_span and "剧情对话" in title_span.get_text(strip=True))
+        if not is_target_module:
+            continue
+        for p in module.find_all("p"):
+            text = p.get_text(strip=True)
+            if text:
+                split_dialogue_text(text, dialogue_title, dialogue_list, narrative_list)
+
+    if not dialogue_list and not narrative_list:
+        for container in soup.find_all("div", class_=DIALOGUE_AREA_CLASS):
+            for box in container.find_all("div", class_=DIALOGUE_NODE_CLASS):
+                for p_tag in box.find_all("p"):
+                    text = p_tag.get_text(strip=True)
+                    if text:
+                        split_dialogue_text(text, dialogue_title, dialogue_list, narrative_list)
+    return dialogue_list, narrative_list
+
+
+def load_pages():
+    expected = json.loads((PAGES_DIR / "expected.json").read_text(encoding="utf-8"))
+    pages = []
+    for name in sorted(expected):
+        html = (PAGES_DIR / name).read_text(encoding="utf-8")
+        pages.append((name, html, expected[name]))
+    return pages
+
+
+def check(parse, pages):
+    """校验每个页面的提取条数，返回不一致的页面名列表"""
+    mismatched = []
+    for name, html, expected in pages:
+        dialogues, narratives = parse(html, name)
+        if len(dialogues) != expected["dialogues"] or len(narratives) != expected["narratives"]:
+            mismatched.append(name)
+    return mismatched
+
+
+def measure(parse, pages, repeat):
+    """返回 {pages_per_sec, mb_per_sec, seconds}"""
+    total_bytes = sum(len(html.encode("utf-8")) for _, html, _ in pages) * repeat
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for name, html, _ in pages:
+            parse(html, name)
+    elapsed = time.perf_counter() - started
+    return {
+        "pages_per_sec": round(len(pages) * repeat / elapsed, 2),
+        "mb_per_sec": round(total_bytes / elapsed / 1e6, 3),
+        "seconds": round(elapsed, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对话页面解析基准")
+    parser.add_argument("--repeat", type=int, default=50, help="每个页面重复解析的次数")
+    args = parser.parse_args()
+
+    pages = load_pages()
+    engines = [("single_pass", parse_dialogue_html)]
+    try:
+        import bs4  # noqa: F401
+        engines.append(("beautifulsoup", legacy_parse_dialogue_html))
+    except ImportError:
+        print("未安装 BeautifulSoup，跳过对照组")
+
+    results = {}
+    for name, parse in engines:
+        mismatched = check(parse, pages)
+        if mismatched:
+            print(f"[{name}] 提取条数与 expected.json 不一致: {', '.join(mismatched)}")
+        results[name] = measure(parse, pages, args.repeat)
+        r = results[name]
+        print(f"[{name}] {r['pages_per_sec']} 页/秒，{r['mb_per_sec']} MB/秒 ({len(pages)} 页 × {args.repeat} 次)")
+
+    if "beautifulsoup" in results:
+        speedup = results["single_pass"]["pages_per_sec"] / results["beautifulsoup"]["pages_per_sec"]
+        print(f"单遍解析相对 BeautifulSoup 提速 {speedup:.2f} 倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""离线基准套件：页面解析、旁白提取、合并与按说话人分组。
+
+全部使用仓库中的 fixtures，不访问网络：
+    fixtures/pages/       结构 A / B 的页面 HTML 与 expected.json
+    fixtures/narration/   旁白样本 narrative_data_world.txt
+    fixtures/dialogue/    对话样本 dialogue_data_world.json
+
+各阶段：
+    parse     parse_dialogue_html，即 fetch_and_parse_dialogue_selenium 取得页面后的解析逻辑（页/秒）
+    extract   extract_and_merge.extract_dialogues_from_txt（旁白行/秒）
+    merge     extract_and_merge.merge_dialogues，每次从冷索引开始（主文件与提取文件的记录/秒）
+    group     group_by_speaker.main --full（对话记录/秒）
+每个阶段在独立的子进程与临时工作目录中运行，峰值 RSS 互不影响（包含该阶段启动的进程池子进程），
+耗时取 repeat 次中最快的一次。结果写入 JSON，--compare 与之前的结果对比，
+吞吐量下降或峰值内存上升超过阈值时以退出码 1 结束。
+
+运行:
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+DEFAULT_OUTPUT = Path(__file__).resolve().parent / "results.json"
+CATEGORY = "world"
+
+
+def peak_rss_mb():
+    """本进程与已结束子进程中较大的峰值 RSS（MB）；没有 resource 模块（Windows）时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux 单位为 KB，macOS 为字节
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def timed(fn, repeat, setup=None):
+    """运行 repeat 次，返回最快一次的秒数；setup 在每次计时前运行。阶段函数的输出被丢弃"""
+    best = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def stage_parse(repeat):
+    from bench_parse import check, load_pages
+    from dialogue_parser import parse_dialogue_html
+
+    pages = load_pages()
+    mismatched = check(parse_dialogue_html, pages)
+    if mismatched:
+        raise RuntimeError(f"提取条数与 expected.json 不一致: {', '.join(mismatched)}")
+
+    def run():
+        for name, html, _ in pages:
+            parse_dialogue_html(html, name)
+
+    return {"unit": "pages", "units": len(pages), "bytes": sum(len(html.encode("utf-8")) for _, html, _ in pages),
+            "seconds": timed(run, repeat)}
+
+
+def stage_extract(repeat):
+    from extract_and_merge import extract_dialogues_from_txt, narrative_file_for
+
+    path = narrative_file_for(CATEGORY)
+    with open(path, "r", encoding="utf-8") as f:
+        lines = sum(1 for line in f if line.strip())
+    return {"unit": "lines", "units": lines, "bytes": os.path.getsize(path),
+            "seconds": timed(lambda: extract_dialogues_from_txt((CATEGORY,), jobs=1), repeat)}
+
+
+def stage_merge(repeat):
+    from extract_and_merge import extract_dialogues_from_txt, extracted_file_for, main_file_for, merge_dialogues
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        extract_dialogues_from_txt((CATEGORY,), jobs=1)
+    main_file = main_file_for(CATEGORY)
+    pristine = f"{main_file}.orig"
+    shutil.copyfile(main_file, pristine)
+    extracted = extracted_file_for(CATEGORY)
+    records = 0
+    for path in (main_file, extracted):
+        with open(path, "r", encoding="utf-8") as f:
+            records += len(json.load(f))
+
+    def reset():
+        shutil.copyfile(pristine, main_file)
+        shutil.rmtree("journal", ignore_errors=True)
+
+    return {"unit": "records", "units": records, "bytes": os.path.getsize(main_file) + os.path.getsize(extracted),
+            "seconds": timed(lambda: merge_dialogues(CATEGORY), repeat, reset)}
+
+
+def stage_group(repeat):
+    import group_by_speaker
+
+    src = Path("dialogue") / f"dialogue_data_{CATEGORY}.json"
+    with open(src, "r", encoding="utf-8") as f:
+        records = len(json.load(f))
+
+    def run():
+        argv = sys.argv
+        sys.argv = ["group_by_speaker.py", "--dialogue-dir", "dialogue", "--out-dir", "speaker", "--full",
+                    "--jobs", "1"]
+        try:
+            group_by_speaker.main()
+        finally:
+            sys.argv = argv
+
+    return {"unit": "records", "units": records, "bytes": os.path.getsize(src),
+            "seconds": timed(run, repeat, lambda: shutil.rmtree("speaker", ignore_errors=True))}
+
+
+STAGES = {"parse": stage_parse, "extract": stage_extract, "merge": stage_merge, "group": stage_group}
+
+
+def run_stage(name, repeat):
+    """子进程入口：在当前目录（临时工作目录）运行一个阶段并输出 JSON 结果"""
+    result = STAGES[name](repeat)
+    seconds = max(result["seconds"], 1e-9)
+    result["seconds"] = round(result["seconds"], 5)
+    result["per_sec"] = round(result["units"] / seconds, 1)
+    result["mb_per_sec"] = round(result["bytes"] / seconds / 1e6, 3)
+    peak = peak_rss_mb()
+    result["peak_rss_mb"] = round(peak, 2) if peak is not None else None
+    print(json.dumps(result))
+
+
+def prepare_workdir(workdir):
+    """把旁白与对话样本复制到临时工作目录，目录结构与仓库一致"""
+    for sub in ("narration", "dialogue"):
+        shutil.copytree(FIXTURES_DIR / sub, Path(workdir) / sub)
+    (Path(workdir) / "extraction").mkdir()
+
+
+def compare(results, baseline, threshold):
+    """打印与基线的对比，返回退化的阶段列表"""
+    regressions = []
+    print(f"\n与基线对比（阈值 {threshold:.0%}）:")
+    for name, r in results["stages"].items():
+        b = baseline.get("stages", {}).get(name)
+        if b is None:
+            print(f"  {name}: 基线中没有该阶段")
+            continue
+        speed = r["per_sec"] / b["per_sec"] - 1 if b["per_sec"] else 0.0
+        line = f"  {name}: 吞吐量 {b['per_sec']} -> {r['per_sec']} {r['unit']}/秒 ({speed:+.1%})"
+        worse = speed < -threshold
+        if r["peak_rss_mb"] and b.get("peak_rss_mb"):
+            memory = r["peak_rss_mb"] / b["peak_rss_mb"] - 1
+            line += f"，峰值内存 {b['peak_rss_mb']} -> {r['peak_rss_mb']} MB ({memory:+.1%})"
+            worse = worse or memory > threshold
+        if worse:
+            line += "  <-- 退化"
+            regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线基准套件")
+    parser.add_argument("--stage", action="append", choices=STAGES, help="只运行这些阶段，可重复指定")
+    parser.add_argument("--repeat", type=int, default=20, help="每个阶段运行的次数，取最快一次")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="结果 JSON 路径")
+    parser.add_argument("--compare", type=Path, help="与之前保存的结果 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定退化的相对变化，默认 0.1")
+    parser.add_argument("--run-stage", choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        run_stage(args.run_stage, args.repeat)
+        return
+
+    results = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+               "platform": platform.platform(), "repeat": args.repeat, "stages": {}}
+    for name in args.stage or STAGES:
+        with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as workdir:
+            prepare_workdir(workdir)
+            out = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--run-stage", name,
+                                  "--repeat", str(args.repeat)], cwd=workdir, capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"[{name}] 运行失败:\n{out.stderr.strip()}")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        results["stages"][name] = r
+        print(f"[{name}] {r['units']} {r['unit']}，{r['seconds'] * 1000:.1f} ms，{r['per_sec']} {r['unit']}/秒，"
+              f"{r['mb_per_sec']} MB/秒，峰值 RSS {r['peak_rss_mb']} MB")
+
+    args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"结果已保存至 {args.output}")
+
+    if args.compare:
+        try:
+            baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"读取基线失败: {e}")
+            return
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""爬虫共用的 Chrome 配置。
+
+fast 配置：无头、page_load_strategy='eager'，并屏蔽图片、音视频、字体和第三方统计请求；
+default 配置：与原先一致的有界面、默认加载策略，用于对比耗时。
+chromedriver 路径取环境变量 CHROMEDRIVER_PATH，未设置时交给 Selenium Manager 自动查找，
+不再写死 Windows 路径。
+"""
+import os
+import threading
+from dataclasses import dataclass, replace
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+CHROME_DRIVER_ENV = "CHROMEDRIVER_PATH"
+
+# 通过 CDP Network.setBlockedURLs 屏蔽的资源，每组由 BrowserProfile 中对应的开关控制
+IMAGE_URL_PATTERNS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico"]
+MEDIA_URL_PATTERNS = ["*.mp4", "*.webm", "*.mp3", "*.ogg", "*.m3u8"]
+FONT_URL_PATTERNS = ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"]
+THIRD_PARTY_URL_PATTERNS = ["*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+                            "*hm.baidu.com*", "*cnzz.com*", "*umeng.com*", "*sentry.io*",
+                            "*log-upload.mihoyo.com*", "*sdk-log-upload*"]
+
+PAGE_TIMING_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0] || {};
+const res = performance.getEntriesByType('resource');
+return {
+    dom_ready_ms: nav.domContentLoadedEventEnd || 0,
+    bytes: (nav.transferSize || 0) + res.reduce((a, r) => a + (r.transferSize || 0), 0),
+    resources: res.length
+};
+"""
+
+
+@dataclass(frozen=True)
+class BrowserProfile:
+    name: str
+    headless: bool = True
+    page_load_strategy: str = "eager"
+    block_images: bool = True
+    block_media: bool = True
+    block_fonts: bool = True
+    block_third_party: bool = True
+
+    def blocked_url_patterns(self):
+        patterns = []
+        for enabled, group in ((self.block_images, IMAGE_URL_PATTERNS),
+                               (self.block_media, MEDIA_URL_PATTERNS),
+                               (self.block_fonts, FONT_URL_PATTERNS),
+                               (self.block_third_party, THIRD_PARTY_URL_PATTERNS)):
+            if enabled:
+                patterns.extend(group)
+        return patterns
+
+
+PROFILES = {
+    "fast": BrowserProfile(name="fast"),
+    "default": BrowserProfile(name="default", headless=False, page_load_strategy="normal",
+                              block_images=False, block_media=False, block_fonts=False, block_third_party=False),
+}
+DEFAULT_PROFILE = "fast"
+
+
+def get_profile(name=DEFAULT_PROFILE, headless=None):
+    """按名称取配置；headless 不为 None 时覆盖配置中的值"""
+    profile = PROFILES[name]
+    if headless is not None and headless != profile.headless:
+        profile = replace(profile, headless=headless)
+    return profile
+
+
+def build_options(profile):
+    options = Options()
+    options.page_load_strategy = profile.page_load_strategy
+    if profile.headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--disable-gpu")
+
+    prefs = {}
+    if profile.block_images:
+        prefs["profile.managed_default_content_settings.images"] = 2
+        options.add_argument("--blink-settings=imagesEnabled=false")
+    if profile.block_media:
+        options.add_argument("--autoplay-policy=user-gesture-required")
+    if prefs:
+        options.add_experimental_option("prefs", prefs)
+    return options
+
+
+def create_chrome(profile):
+    """按配置启动 Chrome，并通过 CDP 屏蔽媒体、字体与第三方请求"""
+    driver_path = os.environ.get(CHROME_DRIVER_ENV)
+    service = Service(executable_path=driver_path) if driver_path else Service()
+    driver = webdriver.Chrome(service=service, options=build_options(profile))
+
+    patterns = profile.blocked_url_patterns()
+    if patterns:
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        except Exception as e:
+            print(f"设置请求屏蔽失败，继续使用未屏蔽的浏览器: {e}")
+    return driver
+
+
+class PageTimings:
+    """收集每个页面的加载耗时与传输字节数，运行结束时打印汇总，用于对比不同配置"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def record(self, driver, elapsed):
+        """elapsed 为 driver.get 到对话容器出现的墙钟时间（秒）"""
+        try:
+            timing = driver.execute_script(PAGE_TIMING_SCRIPT) or {}
+        except Exception:
+            timing = {}
+        with self._lock:
+            self.samples.append((elapsed, timing.get("bytes", 0), timing.get("dom_ready_ms", 0)))
+
+    def report(self):
+        print(f"===== 浏览器配置 [{self.profile.name}] 页面加载统计 =====")
+        if not self.samples:
+            print("本次运行没有加载页面。")
+            return
+        n = len(self.samples)
+        avg_elapsed = sum(s[0] for s in self.samples) / n
+        avg_bytes = sum(s[1] for s in self.samples) / n
+        avg_dom_ready = sum(s[2] for s in self.samples) / n
+        print(f"  页面数: {n}")
+        print(f"  平均加载耗时: {avg_elapsed * 1000:.0f} ms (DOMContentLoaded {avg_dom_ready:.0f} ms)")
+        print(f"  平均传输量: {avg_bytes / 1024:.1f} KB，合计 {sum(s[1] for s in self.samples) / 1024 / 1024:.2f} MB")
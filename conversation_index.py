@@ -0,0 +1,180 @@
+"""对话上下文索引：按说话人流式读取每句台词之前的 K 轮对话。
+
+建立在 speaker_view 的 `dialogue/*.jsonl` 之上。build 先刷新 JSONL，再把每个文件中的记录按对话分组，
+写入 `dialogue/conversation.idx`：
+    {"files": {"dialogue_data_world.jsonl": {
+        "sha256": 源 JSON 的哈希（与 speaker.idx 一致时跳过）,
+        "conversations": [[偏移, 长度, 偏移, 长度, ...], ...],   每个对话按轮次排好序
+        "speakers": {说话人: [对话序号, 轮内位置, 对话序号, 轮内位置, ...]}}}}
+
+一个对话是同一页面（page_id，没有时用 source_title）的同一个对话块（block_id），
+块内按 (branch_id, turn) 排序。
+
+dialogue/ 中的记录有两种形式，同一文件内可以混杂：
+    带位置字段   get_dialogue 解析页面写入的记录，字段为 source_title、speaker、text、page_id、block_id、
+                 branch_id、turn（page_id 解析不出时为 null，字段仍在）
+    不带位置字段 旧数据，以及 extract_and_merge 从旁白找回后合并进来的记录，只有 source_title、speaker、text
+不带位置字段的记录无法还原对话块，同一章节的这类记录按文件内顺序视为一个对话，
+且不与同章节带位置字段的对话块混在一起。
+context 只需按索引 seek 读取前 K 条记录，不必重新分组整个语料。
+
+用法:
+    python conversation_index.py build
+    python conversation_index.py context 纳西妲 --k 3 --limit 5
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import speaker_view
+from speaker_view import DEFAULT_DIALOGUE_DIR, speaker_key
+
+INDEX_NAME = "conversation.idx"
+
+
+def conversation_key(item):
+    """(对话键, 排序键)：没有位置字段的记录 block 与 turn 为 None，turn 由调用方用文件内行号代替"""
+    page = item.get("page_id")
+    block = (item.get("block_id") or 0) if "block_id" in item else None
+    conv = (page if page is not None else item.get("source_title") or "", block)
+    return conv, (item.get("branch_id") or 0, item.get("turn"))
+
+
+def index_file(path):
+    """扫描一个 JSONL 文件，返回 (conversations, speakers)"""
+    groups = {}
+    offset = 0
+    with open(path, "rb") as f:
+        for line_no, line in enumerate(f):
+            item = json.loads(line)
+            conv, (branch, turn) = conversation_key(item)
+            order = (branch, line_no if turn is None else turn, line_no)
+            groups.setdefault(str(conv), []).append((order, offset, len(line), speaker_key(item)))
+            offset += len(line)
+
+    conversations = []
+    speakers = {}
+    for members in groups.values():
+        members.sort()
+        spans = []
+        for pos, (_, off, length, speaker) in enumerate(members):
+            spans.extend((off, length))
+            speakers.setdefault(speaker, []).extend((len(conversations), pos))
+        conversations.append(spans)
+    return conversations, speakers
+
+
+def load_index(dialogue_dir=DEFAULT_DIALOGUE_DIR):
+    try:
+        return json.loads((Path(dialogue_dir) / INDEX_NAME).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {"files": {}}
+
+
+def build(dialogue_dir=DEFAULT_DIALOGUE_DIR, full=False):
+    """
+    刷新 JSONL 后为有变化的文件重建对话分组，返回 (重建的文件名列表, 读取失败的文件名列表)。
+    失败的文件不写入索引，其中包括 speaker_view 转写失败的源 JSON。
+    """
+    dialogue_dir = Path(dialogue_dir)
+    _, failed = speaker_view.build(dialogue_dir, full=full)
+    sources = speaker_view.load_index(dialogue_dir)["files"]
+    index = {"files": {}} if full else load_index(dialogue_dir)
+    files = {}
+    rebuilt = []
+    for name, source in sorted(sources.items()):
+        entry = index["files"].get(name)
+        if entry is None or entry.get("sha256") != source["sha256"]:
+            try:
+                conversations, speakers = index_file(dialogue_dir / name)
+            except Exception as e:
+                print(f"跳过文件 {name}，读取失败: {e}")
+                failed.append(name)
+                continue
+            entry = {"sha256": source["sha256"], "conversations": conversations, "speakers": speakers}
+            rebuilt.append(name)
+        files[name] = entry
+
+    tmp = dialogue_dir / f"{INDEX_NAME}.tmp"
+    tmp.write_text(json.dumps({"files": files}, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, dialogue_dir / INDEX_NAME)
+    print(f"对话索引已写入 {dialogue_dir / INDEX_NAME}，重建 {len(rebuilt)} 个文件，"
+          f"跳过 {len(files) - len(rebuilt)} 个未变化的文件")
+    return rebuilt, failed
+
+
+class ConversationIndex:
+    """按说话人读取台词及其之前的对话"""
+
+    def __init__(self, dialogue_dir=DEFAULT_DIALOGUE_DIR):
+        self.dialogue_dir = Path(dialogue_dir)
+        if not (self.dialogue_dir / INDEX_NAME).exists():
+            raise FileNotFoundError(f"未找到 {self.dialogue_dir / INDEX_NAME}，请先运行 python conversation_index.py build")
+        self.files = load_index(dialogue_dir)["files"]
+
+    def conversation(self, name, conv):
+        """某个文件中第 conv 个对话的全部记录，按轮次顺序"""
+        spans = self.files[name]["conversations"][conv]
+        with open(self.dialogue_dir / name, "rb") as f:
+            for offset, length in zip(spans[0::2], spans[1::2]):
+                f.seek(offset)
+                yield json.loads(f.read(length))
+
+    def context(self, speaker, k=3, files=None):
+        """
+        逐条产出 (之前最多 k 条记录, 该说话人的记录)，按源文件、对话、轮次顺序。
+        files 可限定源文件名（.jsonl）。
+        """
+        for name, entry in sorted(self.files.items()):
+            if files is not None and name not in files:
+                continue
+            refs = entry["speakers"].get(speaker)
+            if not refs:
+                continue
+            conversations = entry["conversations"]
+            with open(self.dialogue_dir / name, "rb") as f:
+                for conv, pos in zip(refs[0::2], refs[1::2]):
+                    spans = conversations[conv][2 * max(0, pos - k):2 * (pos + 1)]
+                    records = []
+                    for offset, length in zip(spans[0::2], spans[1::2]):
+                        f.seek(offset)
+                        records.append(json.loads(f.read(length)))
+                    yield records[:-1], records[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对话上下文索引")
+    parser.add_argument("--dialogue-dir", default=DEFAULT_DIALOGUE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="刷新 JSONL 并重建对话索引")
+    build_parser.add_argument("--full", action="store_true", help="忽略已有索引，全部重建")
+    context = sub.add_parser("context", help="显示某个说话人的台词及其之前的对话")
+    context.add_argument("speaker")
+    context.add_argument("--k", type=int, default=3, help="每句台词之前显示的轮数")
+    context.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        _, failed = build(args.dialogue_dir, full=args.full)
+        if failed:
+            # 退出码非 0，脚本与 pipeline 据此判定失败
+            sys.exit(1)
+        return
+    try:
+        index = ConversationIndex(args.dialogue_dir)
+    except FileNotFoundError as e:
+        print(e)
+        sys.exit(1)
+    for i, (history, item) in enumerate(index.context(args.speaker, args.k)):
+        if i >= args.limit:
+            break
+        print(f"[{item.get('source_title')}]")
+        for h in history:
+            print(f"    {h.get('speaker')}：{h.get('text')}")
+        print(f"  > {item.get('speaker')}：{item.get('text')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""语料统计：说话人 × 分类台词数、台词长度分布、按章节的说话人共现与每个任务的台词数。
+
+语料经 corpus_loader.Corpus 读入列存储，array('I') 列以 numpy.frombuffer 零拷贝转为数组，
+全部统计用 bincount / unique / 矩阵乘法完成，不逐条循环：
+    speaker_category   [说话人, 分类] 台词数
+    speaker_chars      [说话人] 总字数
+    length_hist        [分类, 长度区间] 台词数，区间下界见 LENGTH_BINS
+    length_stats       [分类 + 全部, (条数, 平均, p50, p90, p99, 最大)]
+    title_lines        [章节] 台词数；title_speakers 为不同说话人数；title_category 为所属分类
+    cooccur            [K, K] 台词数最多的 K 个说话人两两同时出现的章节数（对角线为各自出现的章节数）
+章节按 (分类, source_title) 区分；说话人经 group_by_speaker.normalize_speaker_name 归一，空说话人记为 ""。
+
+结果以 .npz 缓存在 analytics/ 中，文件名为全部源文件 sha256 与参数的哈希，再次运行时直接载入；
+重新抓取或合并使源文件变化后才重新计算。源文件的哈希按 (大小, 修改时间) 记忆在 analytics/hashes.json，
+未改动的文件不必重新读取。
+
+用法:
+    python corpus_analytics.py speakers --top 10
+    python corpus_analytics.py lengths
+    python corpus_analytics.py cooccur 纳西妲
+    python corpus_analytics.py titles --category world
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from corpus_loader import DEFAULT_DIALOGUE_DIR, DEFAULT_SPEAKER_DIR, Corpus, find_sources
+from group_by_speaker import file_sha256, normalize_speaker_name
+
+DEFAULT_CACHE_DIR = "analytics"
+DEFAULT_COOCCUR_TOP = 300
+HASHES_NAME = "hashes.json"
+# 缓存格式变化时递增，旧缓存自动失效
+CACHE_VERSION = 1
+LENGTH_BINS = (0, 5, 10, 20, 40, 80, 160)
+STAT_COLUMNS = ("count", "mean", "p50", "p90", "p99", "max")
+
+
+def source_hashes(sources, cache_dir=DEFAULT_CACHE_DIR):
+    """[(路径, sha256)]：大小与修改时间未变的文件沿用 hashes.json 中记忆的哈希"""
+    memo_path = Path(cache_dir) / HASHES_NAME
+    try:
+        memo = json.loads(memo_path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        memo = {}
+    hashes = []
+    updated = {}
+    for category, paths in sources.items():
+        for path in paths:
+            st = path.stat()
+            entry = memo.get(str(path))
+            if not entry or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+                entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(path)}
+            updated[str(path)] = entry
+            hashes.append((category, str(path), entry["sha256"]))
+    if updated != memo:
+        memo_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = memo_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(updated, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, memo_path)
+    return hashes
+
+
+def cache_key(hashes, cooccur_top):
+    raw = json.dumps({"version": CACHE_VERSION, "cooccur_top": cooccur_top, "files": hashes}, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def column(arr, dtype=np.uint32):
+    """array('I') -> numpy 数组（零拷贝）"""
+    return np.frombuffer(arr, dtype=dtype) if len(arr) else np.zeros(0, dtype=dtype)
+
+
+def compute(corpus, cooccur_top=DEFAULT_COOCCUR_TOP):
+    """从 Corpus 计算全部统计，返回 {名称: numpy 数组}"""
+    categories = corpus.categories()
+    loaded = [corpus[c] for c in categories]
+
+    # StringTable 编号 -> 归一后的说话人编号
+    names = {}
+    remap = np.zeros(len(corpus.speakers), dtype=np.int64)
+    for i, raw in enumerate(corpus.speakers.strings):
+        remap[i] = names.setdefault(normalize_speaker_name(raw) or "", len(names))
+    n_spk, n_cat = len(names), len(categories)
+
+    spk = np.concatenate([remap[column(c.speaker_ids)] for c in loaded] or [np.zeros(0, np.int64)])
+    title = np.concatenate([column(c.title_ids).astype(np.int64) for c in loaded] or [np.zeros(0, np.int64)])
+    cat = np.concatenate([np.full(len(c), i, dtype=np.int64) for i, c in enumerate(loaded)] or [np.zeros(0, np.int64)])
+    length = np.concatenate([np.diff(column(c.text_offsets)).astype(np.int64) for c in loaded]
+                            or [np.zeros(0, np.int64)])
+
+    speaker_category = np.bincount(spk * n_cat + cat, minlength=n_spk * n_cat).reshape(n_spk, n_cat)
+    speaker_chars = np.bincount(spk, weights=length, minlength=n_spk).astype(np.int64)
+
+    bins = np.asarray(LENGTH_BINS)
+    bin_idx = np.searchsorted(bins, length, side="right") - 1
+    length_hist = np.bincount(cat * len(bins) + bin_idx, minlength=n_cat * len(bins)).reshape(n_cat, len(bins))
+    length_stats = np.zeros((n_cat + 1, len(STAT_COLUMNS)))
+    for i in range(n_cat + 1):
+        values = length[cat == i] if i < n_cat else length
+        if len(values):
+            length_stats[i] = (len(values), values.mean(), *np.percentile(values, (50, 90, 99)), values.max())
+
+    # 章节 = (分类, source_title)
+    scene_keys, scene = np.unique(cat * len(corpus.titles) + title, return_inverse=True)
+    n_scene = len(scene_keys)
+    title_category = scene_keys // len(corpus.titles)
+    title_names = [corpus.titles[int(t)] or "" for t in scene_keys % len(corpus.titles)]
+    title_lines = np.bincount(scene, minlength=n_scene)
+    pairs = np.unique(scene * n_spk + spk)
+    pair_scene, pair_spk = pairs // n_spk, pairs % n_spk
+    title_speakers = np.bincount(pair_scene, minlength=n_scene)
+
+    # 共现只在台词数最多的 K 个说话人（不含空说话人）之间计算：章节 × 说话人关联矩阵自乘
+    totals = speaker_category.sum(axis=1)
+    order = np.argsort(-totals, kind="stable")
+    order = order[order != names.get("", -1)][:cooccur_top]
+    pos = np.full(n_spk, -1, dtype=np.int64)
+    pos[order] = np.arange(len(order))
+    keep = pos[pair_spk] >= 0
+    incidence = np.zeros((n_scene, len(order)), dtype=np.float32)
+    incidence[pair_scene[keep], pos[pair_spk[keep]]] = 1
+    cooccur = (incidence.T @ incidence).round().astype(np.int32)
+
+    return {
+        "categories": np.array(categories, dtype=str),
+        "speakers": np.array(list(names), dtype=str),
+        "titles": np.array(title_names, dtype=str),
+        "speaker_category": speaker_category,
+        "speaker_chars": speaker_chars,
+        "length_bins": bins,
+        "length_hist": length_hist,
+        "length_stats": length_stats,
+        "title_category": title_category,
+        "title_lines": title_lines,
+        "title_speakers": title_speakers,
+        "cooccur_speakers": order,
+        "cooccur": cooccur,
+    }
+
+
+class CorpusStats:
+    """缓存的统计结果；各数组见模块说明"""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.categories = [str(c) for c in arrays["categories"]]
+        self.speakers = [str(s) for s in arrays["speakers"]]
+        self.titles = [str(t) for t in arrays["titles"]]
+        self._speaker_index = {s: i for i, s in enumerate(self.speakers)}
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    @classmethod
+    def load(cls, dialogue_dir=DEFAULT_DIALOGUE_DIR, speaker_dir=DEFAULT_SPEAKER_DIR, cache_dir=DEFAULT_CACHE_DIR,
+             cooccur_top=DEFAULT_COOCCUR_TOP, rebuild=False):
+        """有与当前源文件一致的缓存时直接载入，否则重新计算并写入缓存"""
+        cache_dir = Path(cache_dir)
+        sources = find_sources(dialogue_dir, speaker_dir)
+        path = cache_dir / f"stats_{cache_key(source_hashes(sources, cache_dir), cooccur_top)}.npz"
+        if path.exists() and not rebuild:
+            with np.load(path, allow_pickle=False) as data:
+                return cls({k: data[k] for k in data.files})
+
+        print(f"源文件有变化，重新计算统计（{sum(len(p) for p in sources.values())} 个源文件）")
+        arrays = compute(Corpus(dialogue_dir, speaker_dir), cooccur_top)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.stem}.tmp.npz")
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+        for old in cache_dir.glob("stats_*.npz"):
+            if old != path:
+                old.unlink()
+        return cls(arrays)
+
+    def top_speakers(self, category=None, n=10):
+        """[(说话人, 台词数)]，category 为 None 时按全部分类"""
+        counts = self["speaker_category"]
+        counts = counts.sum(axis=1) if category is None else counts[:, self.categories.index(category)]
+        order = np.argsort(-counts, kind="stable")[:n]
+        return [(self.speakers[i], int(counts[i])) for i in order if counts[i]]
+
+    def partners(self, speaker, n=10):
+        """[(说话人, 共同出现的章节数)]；speaker 不在共现矩阵的 K 个说话人中时返回 None"""
+        idx = self._speaker_index.get(speaker)
+        members = self["cooccur_speakers"]
+        hit = np.flatnonzero(members == idx) if idx is not None else []
+        if not len(hit):
+            return None
+        row = self["cooccur"][hit[0]].copy()
+        row[hit[0]] = 0
+        order = np.argsort(-row, kind="stable")[:n]
+        return [(self.speakers[members[j]], int(row[j])) for j in order if row[j]]
+
+    def top_pairs(self, n=10):
+        """[(说话人, 说话人, 共同出现的章节数)]"""
+        co = self["cooccur"]
+        upper = np.triu(co, k=1)
+        flat = np.argsort(-upper, axis=None, kind="stable")[:n]
+        members = self["cooccur_speakers"]
+        return [(self.speakers[members[i]], self.speakers[members[j]], int(upper[i, j]))
+                for i, j in zip(*np.unravel_index(flat, upper.shape)) if upper[i, j]]
+
+    def top_titles(self, category=None, n=20):
+        """[(分类, 章节, 台词数, 说话人数)]"""
+        lines = self["title_lines"]
+        mask = np.ones(len(lines), dtype=bool) if category is None else \
+            self["title_category"] == self.categories.index(category)
+        idx = np.flatnonzero(mask)
+        order = idx[np.argsort(-lines[idx], kind="stable")[:n]]
+        return [(self.categories[self["title_category"][i]], self.titles[i], int(lines[i]),
+                 int(self["title_speakers"][i])) for i in order]
+
+    def to_frames(self):
+        """转为 pandas DataFrame（需要安装 pandas）：speaker_category、lengths、titles、cooccur"""
+        import pandas as pd
+
+        return {
+            "speaker_category": pd.DataFrame(self["speaker_category"], index=self.speakers, columns=self.categories),
+            "lengths": pd.DataFrame(self["length_stats"], index=self.categories + ["all"], columns=STAT_COLUMNS),
+            "titles": pd.DataFrame({"category": [self.categories[c] for c in self["title_category"]],
+                                    "title": self.titles, "lines": self["title_lines"],
+                                    "speakers": self["title_speakers"]}),
+            "cooccur": pd.DataFrame(self["cooccur"], index=[self.speakers[i] for i in self["cooccur_speakers"]],
+                                    columns=[self.speakers[i] for i in self["cooccur_speakers"]]),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语料统计（结果按源文件哈希缓存）")
+    parser.add_argument("--dialogue-dir", default=DEFAULT_DIALOGUE_DIR)
+    parser.add_argument("--speaker-dir", default=DEFAULT_SPEAKER_DIR)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--cooccur-top", type=int, default=DEFAULT_COOCCUR_TOP,
+                        help="共现矩阵包含的说话人数（按台词数取前 K 个）")
+    parser.add_argument("--rebuild", action="store_true", help="忽略缓存重新计算")
+    sub = parser.add_subparsers(dest="command", required=True)
+    speakers = sub.add_parser("speakers", help="各分类台词数最多的说话人")
+    speakers.add_argument("--top", type=int, default=10)
+    sub.add_parser("lengths", help="各分类的台词长度分布")
+    cooccur = sub.add_parser("cooccur", help="与某个说话人同场的说话人；不指定时列出同场最多的说话人对")
+    cooccur.add_argument("speaker", nargs="?")
+    cooccur.add_argument("--top", type=int, default=10)
+    titles = sub.add_parser("titles", help="台词数最多的任务章节")
+    titles.add_argument("--category", default=None)
+    titles.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    try:
+        stats = CorpusStats.load(args.dialogue_dir, args.speaker_dir, args.cache_dir, args.cooccur_top, args.rebuild)
+    except Exception as e:
+        print(f"统计失败: {e}")
+        sys.exit(1)
+    if not stats.categories:
+        print("未找到语料文件")
+        sys.exit(1)
+
+    if args.command == "speakers":
+        for category in stats.categories + [None]:
+            total = int(stats["speaker_category"].sum() if category is None else
+                        stats["speaker_category"][:, stats.categories.index(category)].sum())
+            print(f"[{category or '全部'}] 共 {total} 条")
+            for name, n in stats.top_speakers(category, args.top):
+                print(f"  {name or '(无)'}: {n} ({n / total:.1%})")
+    elif args.command == "lengths":
+        bins = stats["length_bins"]
+        labels = [f"{lo}-{hi - 1}" for lo, hi in zip(bins, bins[1:])] + [f"{bins[-1]}+"]
+        for i, name in enumerate(stats.categories + ["全部"]):
+            count, mean, p50, p90, p99, longest = stats["length_stats"][i]
+            print(f"[{name}] {int(count)} 条，平均 {mean:.1f} 字，p50 {p50:.0f}，p90 {p90:.0f}，p99 {p99:.0f}，"
+                  f"最长 {longest:.0f}")
+            if i < len(stats.categories):
+                hist = stats["length_hist"][i]
+                for label, n in zip(labels, hist):
+                    bar = "#" * int(round(40 * n / max(1, hist.max())))
+                    print(f"  {label:>8} {int(n):>7} {bar}")
+    elif args.command == "cooccur":
+        if args.speaker:
+            partners = stats.partners(args.speaker, args.top)
+            if partners is None:
+                print(f"{args.speaker} 不在台词数前 {args.cooccur_top} 的说话人中")
+                return
+            for name, n in partners:
+                print(f"  {name}: {n} 个章节")
+        else:
+            for a, b, n in stats.top_pairs(args.top):
+                print(f"  {a} × {b}: {n} 个章节")
+    else:
+        if args.category and args.category not in stats.categories:
+            print(f"未知分类: {args.category}，可选: {', '.join(stats.categories)}")
+            return
+        for category, title, lines, n_speakers in stats.top_titles(args.category, args.top):
+            print(f"  [{category}] {title}: {lines} 条，{n_speakers} 个说话人")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""SQLite 语料库。
+
+把 `dialogue/`、`extraction/` 与 `narration/` 中的数据导入同一个 SQLite 数据库 corpus.db，
+每行记录分类、来源文件、行序、章节名、说话人、文本、对话的位置字段（page_id、block_id、branch_id、turn，
+旧数据没有时为空）以及章节对应的 URL（取自 urls/ 下的 CSV），
+并在说话人、章节名与分类上建立索引，按说话人 / 章节 / 分类查询只需毫秒级。
+
+kind 字段区分来源：
+    dialogue   dialogue/dialogue_data_*.json 中的对话
+    recovered  extraction/ 中从旁白找回、且尚未合并进 dialogue/ 的对话
+    narration  narration/ 中的旁白（speaker 为空）
+
+用法:
+    python corpus_db.py build
+    python corpus_db.py query --speaker 纳西妲 --category archons
+    python corpus_db.py speakers --category world
+    python corpus_db.py export-speakers --out-dir speaker
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+from crawl_journal import JsonArrayWriter
+from group_by_speaker import DEFAULT_GROUPS, group_of, iter_json_entries, sanitize_filename
+from merge_index import record_key
+
+DEFAULT_DB = "corpus.db"
+CATEGORY_ALIASES = {"arhchons": "archons"}
+NARRATION_LINE = re.compile(r'^\[(.*?)\]\s*(.*)$')
+
+SCHEMA = """
+CREATE TABLE lines (
+    id           INTEGER PRIMARY KEY,
+    kind         TEXT NOT NULL,
+    category     TEXT NOT NULL,
+    source_file  TEXT NOT NULL,
+    line_no      INTEGER NOT NULL,
+    source_title TEXT,
+    speaker      TEXT,
+    text         TEXT NOT NULL,
+    url          TEXT,
+    page_id      INTEGER,
+    block_id     INTEGER,
+    branch_id    INTEGER,
+    turn         INTEGER
+);
+"""
+INDEXES = """
+CREATE INDEX idx_lines_speaker ON lines (speaker, category);
+CREATE INDEX idx_lines_title ON lines (source_title);
+CREATE INDEX idx_lines_category ON lines (category, kind);
+"""
+POSITION_FIELDS = ("page_id", "block_id", "branch_id", "turn")
+COLUMNS = ("id", "kind", "category", "source_file", "line_no", "source_title", "speaker", "text", "url") \
+    + POSITION_FIELDS
+
+
+def category_from_name(path, prefix):
+    """dialogue_data_world.json -> world；extracted_from_arhchons.json -> archons"""
+    stem = Path(path).stem
+    category = stem[len(prefix):] if stem.startswith(prefix) else stem
+    return CATEGORY_ALIASES.get(category, category)
+
+
+def load_title_urls(urls_dir):
+    """(category, title) -> url"""
+    urls = {}
+    for path in sorted(Path(urls_dir).glob("dialogue_urls_*.csv")):
+        category = category_from_name(path, "dialogue_urls_")
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                urls.setdefault((category, row["title"]), row["url"])
+    return urls
+
+
+def source_files(dialogue_dir="dialogue", extraction_dir="extraction", narration_dir="narration"):
+    """分类 -> {"dialogue": [...], "recovered": [...], "narration": [...]} 各来源文件列表"""
+    files = {}
+    for kind, directory, pattern, prefix in (("dialogue", dialogue_dir, "*.json", "dialogue_data_"),
+                                             ("recovered", extraction_dir, "*.json", "extracted_from_"),
+                                             ("narration", narration_dir, "*.txt", "narrative_data_")):
+        for path in sorted(Path(directory).glob(pattern)):
+            category = category_from_name(path, prefix)
+            files.setdefault(category, {"dialogue": [], "recovered": [], "narration": []})[kind].append(path)
+    return dict(sorted(files.items()))
+
+
+def position_of(item):
+    """对话的位置字段；旧记录没有时为 (None, None, None, None)"""
+    return tuple(item.get(field) for field in POSITION_FIELDS)
+
+
+def item_from_row(source_title, speaker, text, page_id, block_id, branch_id, turn):
+    """把一行还原成与 dialogue/ 中相同字段、相同顺序的记录：有位置字段的记录 block_id 必不为空"""
+    item = {"source_title": source_title, "speaker": speaker, "text": text}
+    if block_id is not None:
+        item.update(zip(POSITION_FIELDS, (page_id, block_id, branch_id, turn)))
+    return item
+
+
+def iter_dialogue_rows(paths, title_urls):
+    for path in paths:
+        category = category_from_name(path, "dialogue_data_")
+        for line_no, item in enumerate(iter_json_entries(path)):
+            title = item.get("source_title")
+            yield ("dialogue", category, path.name, line_no, title, item.get("speaker"), item.get("text", ""),
+                   title_urls.get((category, title))) + position_of(item)
+
+
+def iter_recovered_rows(paths, title_urls, existing_keys):
+    for path in paths:
+        category = category_from_name(path, "extracted_from_")
+        for line_no, item in enumerate(iter_json_entries(path)):
+            # 已合并进 dialogue/ 的条目不重复导入
+            if record_key(item) in existing_keys:
+                continue
+            title = item.get("source_title")
+            yield ("recovered", category, path.name, line_no, title, item.get("speaker"), item.get("text", ""),
+                   title_urls.get((category, title))) + position_of(item)
+
+
+def iter_narration_rows(paths, title_urls):
+    for path in paths:
+        category = category_from_name(path, "narrative_data_")
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                m = NARRATION_LINE.match(line)
+                title, text = (m.group(1), m.group(2)) if m else (None, line)
+                yield ("narration", category, path.name, line_no, title, None, text,
+                       title_urls.get((category, title))) + position_of({})
+
+
+def iter_category_rows(files, title_urls):
+    """
+    按 对话、找回的对话、旁白 的顺序生成一个分类的全部行：
+    (kind, category, source_file, line_no, source_title, speaker, text, url, page_id, block_id, branch_id, turn)
+    """
+    existing_keys = set()
+    for row in iter_dialogue_rows(files["dialogue"], title_urls):
+        existing_keys.add(record_key({"source_title": row[4], "speaker": row[5], "text": row[6]}))
+        yield row
+    yield from iter_recovered_rows(files["recovered"], title_urls, existing_keys)
+    yield from iter_narration_rows(files["narration"], title_urls)
+
+
+def build(db_path=DEFAULT_DB, dialogue_dir="dialogue", extraction_dir="extraction", narration_dir="narration",
+          urls_dir="urls"):
+    """重新生成数据库：先写入临时文件，建好索引后再替换，构建过程中旧库仍可查询。返回各 kind 的行数"""
+    started = time.perf_counter()
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    title_urls = load_title_urls(urls_dir)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+        names = COLUMNS[1:]
+        insert = f"INSERT INTO lines ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+        with conn:
+            for files in source_files(dialogue_dir, extraction_dir, narration_dir).values():
+                conn.executemany(insert, iter_category_rows(files, title_urls))
+        conn.executescript(INDEXES)
+        conn.execute("ANALYZE")
+        counts = dict(conn.execute("SELECT kind, COUNT(*) FROM lines GROUP BY kind"))
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+    print(f"语料库已写入 {db_path}，用时 {time.perf_counter() - started:.2f} 秒")
+    for kind, n in sorted(counts.items()):
+        print(f"  {kind}: {n}")
+    return counts
+
+
+class CorpusDB:
+    """只读查询接口，结果为 dict 列表，按分类、来源文件与行序排列"""
+
+    def __init__(self, db_path=DEFAULT_DB):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"未找到语料库 {db_path}，请先运行 python corpus_db.py build")
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _where(speaker=None, title=None, category=None, kind=None, contains=None):
+        clauses, params = [], []
+        for column, value in (("speaker", speaker), ("source_title", title), ("category", category)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if kind is not None:
+            kinds = (kind,) if isinstance(kind, str) else tuple(kind)
+            clauses.append(f"kind IN ({', '.join('?' * len(kinds))})")
+            params.extend(kinds)
+        if contains is not None:
+            clauses.append("instr(text, ?) > 0")
+            params.append(contains)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def lines(self, speaker=None, title=None, category=None, kind=("dialogue", "recovered"), contains=None,
+              limit=None):
+        """按说话人 / 章节名 / 分类查询，kind=None 时包括旁白"""
+        where, params = self._where(speaker, title, category, kind, contains)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM lines{where} ORDER BY category, source_file, line_no"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(zip(COLUMNS, row)) for row in self.conn.execute(sql, params)]
+
+    def count(self, speaker=None, title=None, category=None, kind=("dialogue", "recovered"), contains=None):
+        where, params = self._where(speaker, title, category, kind, contains)
+        return self.conn.execute(f"SELECT COUNT(*) FROM lines{where}", params).fetchone()[0]
+
+    def speakers(self, category=None, kind=("dialogue", "recovered")):
+        """[(speaker, 行数)]，按行数降序"""
+        where, params = self._where(category=category, kind=kind)
+        where = (where + " AND" if where else " WHERE") + " speaker IS NOT NULL"
+        sql = f"SELECT speaker, COUNT(*) AS n FROM lines{where} GROUP BY speaker ORDER BY n DESC, speaker"
+        return list(self.conn.execute(sql, params))
+
+    def titles(self, category=None):
+        """[(source_title, url, 行数)]"""
+        where, params = self._where(category=category)
+        sql = f"SELECT source_title, url, COUNT(*) FROM lines{where} GROUP BY source_title, url ORDER BY source_title"
+        return list(self.conn.execute(sql, params))
+
+    def categories(self):
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT category FROM lines ORDER BY category")]
+
+    def export_speakers(self, out_dir="speaker", groups=DEFAULT_GROUPS):
+        """
+        按需生成与 group_by_speaker 相同的 speaker/<分组>/dialogue_data_<分类>.json 结构（仅 kind=dialogue），
+        记录包括位置字段，与 group_by_speaker 的输出逐字节一致。返回 {分组: 条数}。
+        """
+        out_dir = Path(out_dir)
+        sanitized_groups = {sanitize_filename(g) for g in groups}
+        summary = {}
+        sql = f"SELECT source_file, source_title, speaker, text, {', '.join(POSITION_FIELDS)} FROM lines " \
+              "WHERE kind = 'dialogue' ORDER BY source_file, line_no"
+        writers = {}
+        try:
+            for source_file, *fields in self.conn.execute(sql):
+                item = item_from_row(*fields)
+                grp = group_of(item, sanitized_groups)
+                key = (grp, source_file)
+                if key not in writers:
+                    (out_dir / grp).mkdir(parents=True, exist_ok=True)
+                    fh = open(out_dir / grp / source_file, "w", encoding="utf-8")
+                    writers[key] = (fh, JsonArrayWriter(fh, indent=2))
+                writers[key][1].write(item)
+                summary[grp] = summary.get(grp, 0) + 1
+        finally:
+            for fh, writer in writers.values():
+                writer.close()
+                fh.close()
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 语料库：构建、查询与导出")
+    parser.add_argument("--db", default=DEFAULT_DB, help="数据库文件路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("build", help="从 dialogue/、extraction/、narration/ 重新生成数据库")
+
+    query = sub.add_parser("query", help="按说话人 / 章节 / 分类查询对话")
+    query.add_argument("--speaker")
+    query.add_argument("--title")
+    query.add_argument("--category")
+    query.add_argument("--contains", help="文本中包含的子串")
+    query.add_argument("--with-narration", action="store_true", help="同时返回旁白")
+    query.add_argument("--limit", type=int, default=50)
+    query.add_argument("--json", action="store_true", help="以 JSON 输出完整记录")
+
+    speakers = sub.add_parser("speakers", help="列出说话人及其台词数")
+    speakers.add_argument("--category")
+    speakers.add_argument("--top", type=int, default=30)
+
+    export = sub.add_parser("export-speakers", help="生成 speaker/ 目录结构")
+    export.add_argument("--out-dir", default="speaker")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build(args.db)
+        return
+
+    try:
+        db = CorpusDB(args.db)
+    except FileNotFoundError as e:
+        print(e)
+        return
+    with db:
+        started = time.perf_counter()
+        if args.command == "query":
+            kind = None if args.with_narration else ("dialogue", "recovered")
+            rows = db.lines(args.speaker, args.title, args.category, kind, args.contains, args.limit)
+            total = db.count(args.speaker, args.title, args.category, kind, args.contains)
+            elapsed = time.perf_counter() - started
+            for row in rows:
+                if args.json:
+                    print(json.dumps(row, ensure_ascii=False))
+                else:
+                    print(f"[{row['category']}][{row['source_title']}] {row['speaker'] or ''}：{row['text']}")
+            print(f"共 {total} 条，显示 {len(rows)} 条，查询用时 {elapsed * 1000:.1f} ms")
+        elif args.command == "speakers":
+            rows = db.speakers(args.category)
+            elapsed = time.perf_counter() - started
+            for speaker, n in rows[:args.top]:
+                print(f"  {speaker}: {n}")
+            print(f"共 {len(rows)} 个说话人，查询用时 {elapsed * 1000:.1f} ms")
+        else:
+            summary = db.export_speakers(args.out_dir)
+            print(f"已导出到 {args.out_dir}，用时 {time.perf_counter() - started:.2f} 秒")
+            print(f"  total: {sum(summary.values())}")
+
+
+if __name__ == "__main__":
+    main()
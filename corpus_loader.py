@@ -0,0 +1,217 @@
+"""紧凑的内存语料加载器。
+
+json.load 整个语料时每行一个 dict，每个 dict 各自持有 source_title / speaker 字符串，内存远大于去重后的文本量。
+这里按列存储：每个分类一个 CategoryColumns，speaker 与 source_title 经 StringTable 驻留为整数编号，
+存放在 array('I') 中；文本拼接为一个字符串，另以 array('I') 记录每行的起止位置，省去每行一个 str 对象的开销。
+分类在第一次访问时才加载。
+
+第一次取视图时按 (说话人, 原顺序) / (章节, 原顺序) 计数排序一次，得到行号排列与每个编号的起止位置，
+之后 speaker_view / title_view 只是排列数组上的一个切片，O(1) 得到，遍历时按原文件顺序。
+每个文件用 json.load 读入后立即转为列并释放，峰值内存只多出最大的单个文件。
+
+数据来源：dialogue/dialogue_data_<分类>.json；dialogue/ 中没有的分类回退到 speaker/*/dialogue_data_<分类>.json
+（此时各分组内保持原顺序，分组之间按目录名排序）。
+
+用法:
+    corpus = Corpus()
+    view = corpus["archons"].speaker_view("纳西妲")
+    len(view), view[0], list(view.texts())
+"""
+import json
+from array import array
+from pathlib import Path
+
+from group_by_speaker import find_entries
+
+DEFAULT_DIALOGUE_DIR = "dialogue"
+DEFAULT_SPEAKER_DIR = "speaker"
+FILE_PREFIX = "dialogue_data_"
+
+
+def find_sources(dialogue_dir=DEFAULT_DIALOGUE_DIR, speaker_dir=DEFAULT_SPEAKER_DIR):
+    """分类 -> 源文件列表：dialogue/ 中有的分类只用 dialogue/，否则用 speaker/ 下各分组的同名文件"""
+    dialogue_dir = Path(dialogue_dir)
+    speaker_dir = Path(speaker_dir)
+    sources = {}
+    for path in sorted(dialogue_dir.glob(f"{FILE_PREFIX}*.json")):
+        sources[path.stem[len(FILE_PREFIX):]] = [path]
+    if speaker_dir.is_dir():
+        for path in sorted(speaker_dir.glob(f"*/{FILE_PREFIX}*.json")):
+            category = path.stem[len(FILE_PREFIX):]
+            if category not in sources or sources[category][0].parent != dialogue_dir:
+                sources.setdefault(category, []).append(path)
+    return dict(sorted(sources.items()))
+
+
+class StringTable:
+    """字符串 <-> 整数编号，所有分类共用；编号 0 表示空值"""
+
+    def __init__(self):
+        self.strings = [None]
+        self.ids = {None: 0}
+
+    def intern(self, s):
+        i = self.ids.get(s)
+        if i is None:
+            i = len(self.strings)
+            self.ids[s] = i
+            self.strings.append(s)
+        return i
+
+    def __getitem__(self, i):
+        return self.strings[i]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class ColumnView:
+    """CategoryColumns 中一组行的只读视图，rows 为行号数组（memoryview 切片）"""
+
+    __slots__ = ("columns", "rows")
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        return self.columns.record(self.rows[i])
+
+    def __iter__(self):
+        for row in self.rows:
+            yield self.columns.record(row)
+
+    def texts(self):
+        for row in self.rows:
+            yield self.columns.text(row)
+
+
+class CategoryColumns:
+    """一个分类的列存储"""
+
+    def __init__(self, category, speakers, titles):
+        self.category = category
+        self._speakers = speakers
+        self._titles = titles
+        self.speaker_ids = array("I")
+        self.title_ids = array("I")
+        self.text_offsets = array("I", [0])
+        self.text_blob = ""
+        self._pending = []
+        self._speaker_index = None
+        self._title_index = None
+
+    def append(self, item):
+        self.speaker_ids.append(self._speakers.intern(item.get("speaker")))
+        self.title_ids.append(self._titles.intern(item.get("source_title")))
+        text = item.get("text", "")
+        self._pending.append(text)
+        self.text_offsets.append(self.text_offsets[-1] + len(text))
+
+    def seal(self):
+        """加载结束：把暂存的文本拼接为一个字符串"""
+        self.text_blob = "".join(self._pending)
+        self._pending = []
+
+    def __len__(self):
+        return len(self.speaker_ids)
+
+    def text(self, row):
+        return self.text_blob[self.text_offsets[row]:self.text_offsets[row + 1]]
+
+    def record(self, row):
+        return {"source_title": self._titles[self.title_ids[row]],
+                "speaker": self._speakers[self.speaker_ids[row]],
+                "text": self.text(row)}
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.record(row)
+
+    @staticmethod
+    def _group_index(ids):
+        """计数排序：返回 (按编号稳定排序的行号数组, {编号: (起, 止)})"""
+        counts = {}
+        for i in ids:
+            counts[i] = counts.get(i, 0) + 1
+        spans = {}
+        start = 0
+        for i in sorted(counts):
+            spans[i] = (start, start + counts[i])
+            start += counts[i]
+        cursor = {i: s for i, (s, _) in spans.items()}
+        order = array("I", bytes(4 * len(ids)))
+        for row, i in enumerate(ids):
+            order[cursor[i]] = row
+            cursor[i] += 1
+        return memoryview(order), spans
+
+    def _view(self, index, table, name):
+        order, spans = index
+        start, end = spans.get(table.ids.get(name, -1), (0, 0))
+        return ColumnView(self, order[start:end])
+
+    def speaker_view(self, speaker):
+        if self._speaker_index is None:
+            self._speaker_index = self._group_index(self.speaker_ids)
+        return self._view(self._speaker_index, self._speakers, speaker)
+
+    def title_view(self, title):
+        if self._title_index is None:
+            self._title_index = self._group_index(self.title_ids)
+        return self._view(self._title_index, self._titles, title)
+
+    def speaker_counts(self):
+        if self._speaker_index is None:
+            self._speaker_index = self._group_index(self.speaker_ids)
+        return {self._speakers[i]: end - start for i, (start, end) in self._speaker_index[1].items()}
+
+
+class Corpus:
+    """按分类懒加载的语料，corpus[分类] 返回 CategoryColumns"""
+
+    def __init__(self, dialogue_dir=DEFAULT_DIALOGUE_DIR, speaker_dir=DEFAULT_SPEAKER_DIR):
+        self.dialogue_dir = Path(dialogue_dir)
+        self.speaker_dir = Path(speaker_dir)
+        self.speakers = StringTable()
+        self.titles = StringTable()
+        self._loaded = {}
+        self._sources = find_sources(self.dialogue_dir, self.speaker_dir)
+
+    def categories(self):
+        return list(self._sources)
+
+    def __contains__(self, category):
+        return category in self._sources
+
+    def __getitem__(self, category):
+        columns = self._loaded.get(category)
+        if columns is None:
+            if category not in self._sources:
+                raise KeyError(category)
+            columns = CategoryColumns(category, self.speakers, self.titles)
+            for path in self._sources[category]:
+                with open(path, "r", encoding="utf-8") as f:
+                    items = find_entries(json.load(f))
+                for item in items:
+                    columns.append(item)
+                del items
+            columns.seal()
+            self._loaded[category] = columns
+        return columns
+
+    def load_all(self):
+        for category in self._sources:
+            self[category]
+        return self
+
+    def speaker_views(self, speaker):
+        """{分类: 该说话人的 ColumnView}，会加载全部分类"""
+        views = {c: self[c].speaker_view(speaker) for c in self._sources}
+        return {c: view for c, view in views.items() if len(view)}
+
+    def __len__(self):
+        return sum(len(self[c]) for c in self._sources)
@@ -0,0 +1,125 @@
+"""断点续爬用的 JSONL 日志。
+
+每个页面抓取完成后立即向 `journal/<输出文件名>.jsonl` 追加一行
+{"index", "title", "url", "dialogues", "narratives"}，并在 `.checkpoint` 中追加该 URL。
+重启后读取 checkpoint 跳过已完成的 URL；最后由 compact 按 CSV 顺序流式写出
+与原来 json.dump(indent=4) 逐字节一致的 dialogue JSON 和 narration TXT，内存占用与 URL 数量无关。
+"""
+import json
+import os
+import threading
+from pathlib import Path
+
+DEFAULT_JOURNAL_DIR = "journal"
+
+
+class JsonArrayWriter:
+    """流式写出 JSON 数组，格式与 json.dump(items, f, ensure_ascii=False, indent=indent) 相同"""
+
+    def __init__(self, f, indent=4):
+        self.f = f
+        self.pad = " " * indent
+        self.indent = indent
+        self.count = 0
+        f.write("[")
+
+    def write(self, item):
+        self.f.write("\n" + self.pad if self.count == 0 else ",\n" + self.pad)
+        text = json.dumps(item, ensure_ascii=False, indent=self.indent)
+        self.f.write(text.replace("\n", "\n" + self.pad))
+        self.count += 1
+
+    def close(self):
+        self.f.write("\n]" if self.count else "]")
+
+
+class CrawlJournal:
+    def __init__(self, output_dialogue_filename, journal_dir=DEFAULT_JOURNAL_DIR):
+        name = Path(output_dialogue_filename).stem
+        self.journal_dir = Path(journal_dir)
+        self.journal_file = self.journal_dir / f"{name}.jsonl"
+        self.checkpoint_file = self.journal_dir / f"{name}.checkpoint"
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """清空日志与 checkpoint，从头开始爬取"""
+        for path in (self.journal_file, self.checkpoint_file):
+            if path.exists():
+                path.unlink()
+
+    def completed_urls(self):
+        """读取 checkpoint，返回已完成的 URL 集合"""
+        if not self.checkpoint_file.exists():
+            return set()
+        with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+            return {line.rstrip("\n") for line in f if line.strip()}
+
+    def append(self, index, title, url, dialogues, narratives):
+        """追加一个已完成页面的记录；先写日志再写 checkpoint，保证 checkpoint 中的 URL 一定有记录"""
+        self.append_many([(index, title, url, dialogues, narratives)])
+
+    def append_many(self, records):
+        """批量追加 (index, title, url, dialogues, narratives)，只 fsync 一次；同一 URL 的新记录覆盖旧记录"""
+        lines = [json.dumps({"index": index, "title": title, "url": url,
+                             "dialogues": dialogues, "narratives": narratives}, ensure_ascii=False) + "\n"
+                 for index, title, url, dialogues, narratives in records]
+        if not lines:
+            return
+        with self._lock:
+            self.journal_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.checkpoint_file, "a", encoding="utf-8") as f:
+                f.write("".join(url + "\n" for _, _, url, _, _ in records))
+
+    def record_offsets(self):
+        """扫描日志，返回 url -> 该 URL 最新一行的字节偏移"""
+        offsets = {}
+        if not self.journal_file.exists():
+            return offsets
+        with open(self.journal_file, "rb") as f:
+            offset = 0
+            for raw in f:
+                if raw.strip():
+                    try:
+                        url = json.loads(raw)["url"]
+                    except (ValueError, KeyError):
+                        # 崩溃时写了一半的行，忽略
+                        offset += len(raw)
+                        continue
+                    offsets[url] = offset
+                offset += len(raw)
+        return offsets
+
+    def compact(self, urls, output_dialogue_filename, output_narrative_filename):
+        """
+        按 urls 的顺序（即原 CSV 顺序）把日志中的记录流式写成最终的 JSON / TXT。
+        返回 (对话条数, 旁白条数)。
+        """
+        offsets = self.record_offsets()
+        dialogue_count = 0
+        narrative_count = 0
+        dialogue_tmp = f"{output_dialogue_filename}.tmp"
+        narrative_tmp = f"{output_narrative_filename}.tmp"
+        with open(self.journal_file if offsets else os.devnull, "rb") as journal, \
+                open(dialogue_tmp, "w", encoding="utf-8") as df, \
+                open(narrative_tmp, "w", encoding="utf-8") as nf:
+            writer = JsonArrayWriter(df)
+            for url in urls:
+                offset = offsets.get(url)
+                if offset is None:
+                    continue
+                journal.seek(offset)
+                record = json.loads(journal.readline())
+                for item in record["dialogues"]:
+                    writer.write(item)
+                for line in record["narratives"]:
+                    nf.write(line if narrative_count == 0 else "\n" + line)
+                    narrative_count += 1
+            writer.close()
+            dialogue_count = writer.count
+        os.replace(dialogue_tmp, output_dialogue_filename)
+        os.replace(narrative_tmp, output_narrative_filename)
+        return dialogue_count, narrative_count
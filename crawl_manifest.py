@@ -0,0 +1,66 @@
+"""增量刷新用的 URL 清单。
+
+`journal/<输出文件名>.manifest.json` 记录每个 URL 上次抓取到的响应内容 sha256，
+以及站点提供的 ETag / Last-Modified。刷新时带上条件请求头，304 或内容哈希不变的页面直接跳过。
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from crawl_journal import DEFAULT_JOURNAL_DIR
+
+
+class CrawlManifest:
+    def __init__(self, output_dialogue_filename, journal_dir=DEFAULT_JOURNAL_DIR):
+        name = Path(output_dialogue_filename).stem
+        self.manifest_file = Path(journal_dir) / f"{name}.manifest.json"
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.manifest_file, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, url):
+        """返回 {sha256, etag, last_modified, checked_at}，没有记录时返回 None"""
+        with self._lock:
+            return self._load().get(url)
+
+    def conditional_headers(self, url):
+        """根据上次记录的校验信息生成条件请求头"""
+        entry = self.get(url)
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, url, sha256, etag=None, last_modified=None):
+        with self._lock:
+            self._load()[url] = {"sha256": sha256, "etag": etag, "last_modified": last_modified,
+                                 "checked_at": int(time.time())}
+
+    def reset(self):
+        with self._lock:
+            self._entries = {}
+            if self.manifest_file.exists():
+                self.manifest_file.unlink()
+
+    def save(self):
+        """原子写回清单文件"""
+        with self._lock:
+            entries = self._load()
+            self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.manifest_file.with_suffix(".json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.manifest_file)
@@ -0,0 +1,259 @@
+"""对话页面的单遍解析引擎。
+
+基于标准库 html.parser 的流式分词器，一次遍历文档同时收集结构 B（obc-tmpl-fold + 剧情对话）
+和结构 A（obc-tmpl-interactiveDialogue / content-box）中的 <p> 文本，不构建 DOM 树。
+输出与原先 BeautifulSoup 的 find_all 逻辑一致：
+结构 B 有内容时只用结构 B，否则用结构 A；段落文本等同于 get_text(strip=True)。
+
+每条对话额外记录其在页面中的位置，用于还原对话顺序（见 conversation_index.py）：
+    page_id    页面 URL 中的内容编号（/content/<id>/），没有 URL 时为 None
+    block_id   第几个对话块：结构 B 为第几个“剧情对话”折叠模块，结构 A 为第几个 interactiveDialogue 容器
+    branch_id  结构 A 中容器内第几个 content-box（对话分支），结构 B 恒为 0
+    turn       在 (block_id, branch_id) 内第几段非空文本（旁白也计数，因此对话之间的间隔保留了旁白的位置）
+"""
+import re
+from html.parser import HTMLParser
+
+# --- 选择器定义 ---
+DIALOGUE_AREA_CLASS = "obc-tmpl-interactiveDialogue"
+DIALOGUE_NODE_CLASS = "content-box"
+FOLD_MODULE_CLASS = "obc-tmpl-fold"
+FOLD_TITLE_CLASS = "obc-tmpl-fold__title"
+FOLD_TARGET_TITLE = "剧情对话"
+
+# 没有结束标签的元素，不入栈
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+                 "meta", "param", "source", "track", "wbr"}
+# 这些元素内的文本不计入 get_text()
+IGNORED_TEXT_ELEMENTS = {"script", "style", "template"}
+
+PAGE_ID_PATTERN = re.compile(r"/content/(\d+)")
+
+
+def page_id_from_url(url):
+    """https://baike.mihoyo.com/ys/obc/content/507283/detail -> 507283"""
+    m = PAGE_ID_PATTERN.search(url or "")
+    return int(m.group(1)) if m else None
+
+
+def split_dialogue_text(text, dialogue_title, dialogue_list, narrative_list, position=None):
+    """按中文冒号拆分一段文本：含“：”的作为对话，否则作为旁白；position 为对话的位置字段"""
+    if "：" in text:
+        speaker, t = text.split("：", 1)
+        record = {
+            "source_title": dialogue_title,
+            "speaker": speaker.strip(),
+            "text": t.strip()
+        }
+        if position:
+            record.update(position)
+        dialogue_list.append(record)
+    else:
+        narrative_list.append(f"[{dialogue_title}] {text}")
+
+
+class _Capture:
+    """收集某个元素内全部文本节点（各自 strip 后拼接），即 get_text(strip=True)"""
+    __slots__ = ("parts",)
+
+    def __init__(self):
+        self.parts = []
+
+    def text(self):
+        return "".join(self.parts)
+
+
+class _FoldModule:
+    __slots__ = ("title", "span", "paragraphs")
+
+    def __init__(self):
+        self.title = None       # 第一个 obc-tmpl-fold__title 的文本捕获
+        self.span = None        # 第一个 span 的文本捕获（没有标题容器时回退使用）
+        self.paragraphs = []    # (p 的开始序号, 文本)
+
+    def is_target(self):
+        if self.title is not None:
+            return FOLD_TARGET_TITLE in self.title.text()
+        return self.span is not None and FOLD_TARGET_TITLE in self.span.text()
+
+
+class _ContentBox:
+    __slots__ = ("containers", "paragraphs")
+
+    def __init__(self, containers):
+        self.containers = containers    # 该 box 开始时所在的全部对话容器序号
+        self.paragraphs = []
+
+
+class DialogueHTMLParser(HTMLParser):
+    """单遍扫描，记录结构 A / B 中每个 <p> 的文本及其所属模块"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # 栈元素: (标签名, 出栈时需要执行的动作列表)
+        self._stack = []
+        self._captures = []         # 当前打开的文本捕获
+        self._ignore_depth = 0
+        self._p_seq = 0
+
+        self.fold_modules = []
+        self._open_modules = []
+        self.containers = 0
+        self._open_containers = []
+        self.boxes = []
+        self._open_boxes = []
+
+    # --- 工具 ---
+    def _open_capture(self, actions):
+        capture = _Capture()
+        self._captures.append(capture)
+        actions.append(("capture", capture))
+        return capture
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+        actions = []
+        classes = ()
+        for name, value in attrs:
+            if name == "class" and value:
+                classes = value.split()
+                break
+
+        if tag == "div" and classes:
+            if FOLD_MODULE_CLASS in classes:
+                module = _FoldModule()
+                self.fold_modules.append(module)
+                self._open_modules.append(module)
+                actions.append(("module", module))
+            if FOLD_TITLE_CLASS in classes:
+                for module in self._open_modules:
+                    if module.title is None:
+                        module.title = self._open_capture(actions)
+            if DIALOGUE_AREA_CLASS in classes:
+                cid = self.containers
+                self.containers += 1
+                self._open_containers.append(cid)
+                actions.append(("container", cid))
+            if DIALOGUE_NODE_CLASS in classes and self._open_containers:
+                box = _ContentBox(list(self._open_containers))
+                self.boxes.append(box)
+                self._open_boxes.append(box)
+                actions.append(("box", box))
+        elif tag == "span":
+            for module in self._open_modules:
+                if module.span is None:
+                    module.span = self._open_capture(actions)
+        elif tag == "p" and (self._open_modules or self._open_boxes):
+            seq = self._p_seq
+            self._p_seq += 1
+            capture = self._open_capture(actions)
+            actions.append(("p", (seq, capture, list(self._open_modules), list(self._open_boxes))))
+
+        if tag in IGNORED_TEXT_ELEMENTS:
+            self._ignore_depth += 1
+            actions.append(("ignore", None))
+        self._stack.append((tag, actions))
+
+    def handle_startendtag(self, tag, attrs):
+        # <div/> 之类的自闭合写法不包含任何文本
+        pass
+
+    def handle_endtag(self, tag):
+        # 与 BeautifulSoup 一致：弹出到最近的同名标签，找不到则忽略
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                break
+        else:
+            return
+        while len(self._stack) > i:
+            self._close(self._stack.pop()[1])
+
+    def _close(self, actions):
+        for kind, value in reversed(actions):
+            if kind == "capture":
+                self._captures.remove(value)
+            elif kind == "p":
+                seq, capture, modules, boxes = value
+                text = capture.text()
+                for module in modules:
+                    module.paragraphs.append((seq, text))
+                for box in boxes:
+                    box.paragraphs.append((seq, text))
+            elif kind == "module":
+                self._open_modules.remove(value)
+            elif kind == "container":
+                self._open_containers.remove(value)
+            elif kind == "box":
+                self._open_boxes.remove(value)
+            elif kind == "ignore":
+                self._ignore_depth -= 1
+
+    def handle_data(self, data):
+        if not self._captures or self._ignore_depth:
+            return
+        data = data.strip()
+        if data:
+            for capture in self._captures:
+                capture.parts.append(data)
+
+    def close(self):
+        super().close()
+        # 文档结束时仍未闭合的元素按出栈处理
+        while self._stack:
+            self._close(self._stack.pop()[1])
+
+    # --- 结果 ---
+    def fold_paragraphs(self):
+        """结构 B：所有标题含“剧情对话”的 fold 模块中的段落，按模块、段落的文档顺序，产出 (block_id, 0, text)"""
+        targets = (module for module in self.fold_modules if module.is_target())
+        for block_id, module in enumerate(targets):
+            for _, text in sorted(module.paragraphs, key=lambda x: x[0]):
+                yield block_id, 0, text
+
+    def interactive_paragraphs(self):
+        """结构 A：按 容器 -> content-box -> 段落 的顺序，产出 (容器序号, 容器内 box 序号, text)"""
+        for cid in range(self.containers):
+            boxes = (box for box in self.boxes if cid in box.containers)
+            for branch_id, box in enumerate(boxes):
+                for _, text in sorted(box.paragraphs, key=lambda x: x[0]):
+                    yield cid, branch_id, text
+
+
+def _split_paragraphs(paragraphs, dialogue_title, page_id, dialogue_list, narrative_list):
+    turns = {}
+    for block_id, branch_id, text in paragraphs:
+        if not text:
+            continue
+        turn = turns.get((block_id, branch_id), 0)
+        turns[(block_id, branch_id)] = turn + 1
+        position = {"page_id": page_id, "block_id": block_id, "branch_id": branch_id, "turn": turn}
+        split_dialogue_text(text, dialogue_title, dialogue_list, narrative_list, position)
+
+
+def records_from_paragraphs(fold_paragraphs, interactive_paragraphs, dialogue_title, page_id=None):
+    """
+    由结构 B、结构 A 的段落 (block_id, branch_id, text) 生成 (dialogue_list, narrative_list)：
+    结构 B 有内容时只用结构 B，否则用结构 A。HTML 解析与页面内注入脚本两条路径共用。
+    """
+    dialogue_list = []
+    narrative_list = []
+    _split_paragraphs(fold_paragraphs, dialogue_title, page_id, dialogue_list, narrative_list)
+
+    if not dialogue_list and not narrative_list:
+        _split_paragraphs(interactive_paragraphs, dialogue_title, page_id, dialogue_list, narrative_list)
+
+    return dialogue_list, narrative_list
+
+
+def parse_dialogue_html(html, dialogue_title, url=None):
+    """
+    解析已渲染的页面 HTML，优先结构 B（obc-tmpl-fold + 剧情对话），其次结构 A（interactiveDialogue）。
+    Selenium、HTTP 抓取与离线 reparse 共用此函数；url 用于记录 page_id。
+    返回: (dialogue_list, narrative_list)
+    """
+    parser = DialogueHTMLParser()
+    parser.feed(html)
+    parser.close()
+    return records_from_paragraphs(parser.fold_paragraphs(), parser.interactive_paragraphs(), dialogue_title,
+                                   page_id_from_url(url))
@@ -0,0 +1,249 @@
+"""导出角色对话训练数据。
+
+从 dialogue/ 与 speaker/ 中流式读取对话（来源规则同 corpus_loader.find_sources），
+按说话人、分类过滤，每个说话人最多保留 quota 条，经有界缓冲区打乱后写成固定条数的 gzip JSONL 分片：
+    <out-dir>/shard-00000.jsonl.gz ...
+    <out-dir>/manifest.json     参数、各分片的条数 / 字节数 / sha256、各说话人与分类的条数
+
+1. 各源文件在进程池中并行扫描：过滤后的记录写入 <out-dir>/.spool/ 下的临时文件，
+   每条记录计算 blake2b(种子, 内容) 作为排名；配额按排名取每个说话人最小的 quota 条（bottom-k 抽样），
+   worker 只为每个说话人保留 quota 个排名，不保留记录本身。
+2. 主进程按源文件顺序读回临时文件，丢弃超出配额的记录，用大小为 buffer_size 的缓冲区打乱，
+   凑满一个分片后交给进程池压缩写入 .spool/，同时最多 jobs 个分片在内存中。
+   全部分片写完后才替换上一次导出的分片；导出失败时保留上一次的结果，进程以非 0 退出码结束。
+
+内存占用由 quota × 说话人数、buffer_size 与 shard_size × jobs 决定，与语料大小无关；
+相同输入与种子得到逐字节相同的输出。
+
+用法:
+    python export_training.py --speaker 纳西妲 --speaker 派蒙 --quota 2000 --seed 42
+"""
+import argparse
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import os
+import random
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from corpus_loader import DEFAULT_DIALOGUE_DIR, DEFAULT_SPEAKER_DIR, find_sources
+from group_by_speaker import iter_json_entries, normalize_speaker_name
+from merge_index import record_key
+
+DEFAULT_OUT_DIR = "export"
+DEFAULT_SHARD_SIZE = 50000
+DEFAULT_BUFFER_SIZE = 10000
+SPOOL_DIR = ".spool"
+SHARD_PATTERN = "shard-{:05d}.jsonl.gz"
+
+
+def record_rank(seed, item):
+    """记录在给定种子下的排名，只取决于内容"""
+    raw = f"{seed}:{record_key(item)}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big")
+
+
+def scan_file(task):
+    """
+    进程池 worker：过滤一个源文件并写入临时文件，每行 [排名, 序号, 说话人, 记录]。
+    返回 (条数, {说话人: 排名最小的 quota 个 (排名, 文件序号, 序号)})，quota 为 None 时第二项为空。
+    """
+    file_idx, path, category, speakers, min_chars, seed, quota, spool_path = task
+    heaps = {}
+    count = 0
+    with open(spool_path, "w", encoding="utf-8") as out:
+        for n, item in enumerate(iter_json_entries(path)):
+            if not isinstance(item, dict):
+                continue
+            name = normalize_speaker_name(item.get("speaker"))
+            text = item.get("text")
+            if not name or not text or len(text) < min_chars:
+                continue
+            if speakers is not None and name not in speakers:
+                continue
+            record = dict(item)
+            record["category"] = category
+            rank = record_rank(seed, item)
+            out.write(json.dumps([rank, n, name, record], ensure_ascii=False) + "\n")
+            count += 1
+            if quota is not None:
+                # 以取反的键维护大小为 quota 的最大堆
+                heap = heaps.setdefault(name, [])
+                key = (-rank, -file_idx, -n)
+                if len(heap) < quota:
+                    heapq.heappush(heap, key)
+                elif key > heap[0]:
+                    heapq.heapreplace(heap, key)
+    return count, {name: sorted((-r, -f, -n) for r, f, n in heap) for name, heap in heaps.items()}
+
+
+def quota_thresholds(results, quota):
+    """合并各文件的 bottom-k，得到每个说话人允许的最大 (排名, 文件序号, 序号)"""
+    merged = {}
+    for _, heaps in results:
+        for name, keys in heaps.items():
+            merged.setdefault(name, []).extend(keys)
+    return {name: heapq.nsmallest(quota, keys)[-1] for name, keys in merged.items()}
+
+
+def write_shard(path, lines, compresslevel):
+    """进程池 worker：把一批 JSON 行压缩写入分片，返回分片信息"""
+    buf = io.BytesIO()
+    with gzip.GzipFile(filename="", mode="wb", fileobj=buf, compresslevel=compresslevel, mtime=0) as gz:
+        for line in lines:
+            gz.write(line.encode("utf-8"))
+    data = buf.getvalue()
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return {"file": Path(path).name, "records": len(lines), "bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest()}
+
+
+def bounded_shuffle(records, buffer_size, rng):
+    """有界缓冲区打乱：缓冲区满后每来一条随机换出一条，结束时打乱剩余部分"""
+    buffer = []
+    for record in records:
+        if len(buffer) < buffer_size:
+            buffer.append(record)
+            continue
+        j = rng.randrange(buffer_size)
+        yield buffer[j]
+        buffer[j] = record
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+def export(out_dir=DEFAULT_OUT_DIR, dialogue_dir=DEFAULT_DIALOGUE_DIR, speaker_dir=DEFAULT_SPEAKER_DIR,
+           speakers=None, categories=None, min_chars=0, quota=None, seed=0,
+           buffer_size=DEFAULT_BUFFER_SIZE, shard_size=DEFAULT_SHARD_SIZE, jobs=None, compresslevel=6):
+    """执行导出，返回 manifest；失败时保留上一次导出的分片与 manifest，并删除临时目录"""
+    for name, value in (("quota", quota), ("buffer_size", buffer_size), ("shard_size", shard_size)):
+        if value is not None and value < 1:
+            raise ValueError(f"{name} 必须为正整数，收到 {value}")
+    out_dir = Path(out_dir)
+    spool_dir = out_dir / SPOOL_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+    shutil.rmtree(spool_dir, ignore_errors=True)
+    spool_dir.mkdir()
+    try:
+        return _export(out_dir, spool_dir, dialogue_dir, speaker_dir, speakers, categories, min_chars, quota, seed,
+                       buffer_size, shard_size, jobs, compresslevel)
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+
+def _export(out_dir, spool_dir, dialogue_dir, speaker_dir, speakers, categories, min_chars, quota, seed,
+            buffer_size, shard_size, jobs, compresslevel):
+    speaker_filter = frozenset(normalize_speaker_name(s) for s in speakers) if speakers else None
+    sources = [(category, path) for category, paths in find_sources(dialogue_dir, speaker_dir).items()
+               if not categories or category in categories for path in paths]
+    tasks = [(i, str(path), category, speaker_filter, min_chars, seed, quota, str(spool_dir / f"{i:05d}.jsonl"))
+             for i, (category, path) in enumerate(sources)]
+    print(f"扫描 {len(tasks)} 个源文件")
+    jobs = max(1, jobs or os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(scan_file, tasks))
+        thresholds = quota_thresholds(results, quota) if quota is not None else None
+        print(f"过滤后 {sum(count for count, _ in results)} 条")
+
+        def selected():
+            for file_idx, *_, spool_path in tasks:
+                with open(spool_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        rank, n, name, record = json.loads(line)
+                        if thresholds is None or (rank, file_idx, n) <= thresholds[name]:
+                            yield name, record
+
+        shards = []
+        pending = []
+        speaker_counts = {}
+        category_counts = {}
+        lines = []
+
+        def flush():
+            path = spool_dir / SHARD_PATTERN.format(len(shards) + len(pending))
+            pending.append(pool.submit(write_shard, str(path), lines, compresslevel))
+            # 同时最多 jobs 个分片在内存中，按提交顺序收取结果
+            while len(pending) >= jobs:
+                shards.append(pending.pop(0).result())
+
+        rng = random.Random(seed)
+        for name, record in bounded_shuffle(selected(), buffer_size, rng):
+            lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+            speaker_counts[name] = speaker_counts.get(name, 0) + 1
+            category_counts[record["category"]] = category_counts.get(record["category"], 0) + 1
+            if len(lines) >= shard_size:
+                flush()
+                lines = []
+        if lines:
+            flush()
+        shards.extend(f.result() for f in pending)
+
+    # 全部分片写完后才替换上一次导出的分片
+    for old in out_dir.glob("shard-*.jsonl.gz"):
+        old.unlink()
+    for shard in shards:
+        os.replace(spool_dir / shard["file"], out_dir / shard["file"])
+    manifest = {
+        "seed": seed,
+        "filters": {"speakers": sorted(speaker_filter) if speaker_filter else None,
+                    "categories": sorted(categories) if categories else None,
+                    "min_chars": min_chars},
+        "quota": quota,
+        "buffer_size": buffer_size,
+        "shard_size": shard_size,
+        "sources": [str(path) for _, path in sources],
+        "records": sum(s["records"] for s in shards),
+        "categories": dict(sorted(category_counts.items())),
+        "speakers": dict(sorted(speaker_counts.items(), key=lambda x: (-x[1], x[0]))),
+        "shards": shards,
+    }
+    tmp = out_dir / "manifest.json.tmp"
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, out_dir / "manifest.json")
+    return manifest
+
+
+def positive_int(value):
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"必须为正整数: {value}")
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出分片的角色对话训练数据")
+    parser.add_argument("--dialogue-dir", default=DEFAULT_DIALOGUE_DIR)
+    parser.add_argument("--speaker-dir", default=DEFAULT_SPEAKER_DIR)
+    parser.add_argument("--out-dir", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--speaker", action="append", help="只导出这些说话人，可重复指定")
+    parser.add_argument("--category", action="append", help="只导出这些分类，可重复指定")
+    parser.add_argument("--min-chars", type=int, default=0, help="台词最少字数")
+    parser.add_argument("--quota", type=positive_int, default=None, help="每个说话人最多导出的条数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--buffer-size", type=positive_int, default=DEFAULT_BUFFER_SIZE, help="打乱缓冲区条数")
+    parser.add_argument("--shard-size", type=positive_int, default=DEFAULT_SHARD_SIZE, help="每个分片的条数")
+    parser.add_argument("--jobs", type=positive_int, default=None, help="并行进程数，默认为 CPU 核数")
+    args = parser.parse_args()
+
+    try:
+        manifest = export(args.out_dir, args.dialogue_dir, args.speaker_dir, args.speaker, args.category,
+                          args.min_chars, args.quota, args.seed, args.buffer_size, args.shard_size, args.jobs)
+    except Exception as e:
+        print(f"导出失败: {e}")
+        sys.exit(1)
+    print(f"导出 {manifest['records']} 条记录到 {len(manifest['shards'])} 个分片，目录 {args.out_dir}")
+    for name, n in list(manifest["speakers"].items())[:10]:
+        print(f"  {name}: {n}")
+
+
+if __name__ == "__main__":
+    main()
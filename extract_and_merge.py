@@ -1,101 +1,112 @@
-import re
 import json
 import os
+import sys
 import glob
+import argparse
 
-def extract_dialogues_from_txt():
-    # 定义匹配模式
-    # 匹配格式: [章节名] 人名 : 对话文本
-    # 要求冒号前后必须有空格，且只支持英文冒号，人名不能为空
-    pattern = re.compile(r'^\[(.*?)\]\s+(.+?)\s+:\s+(.+)$')
+from group_by_speaker import iter_json_entries
+from merge_index import MergeIndex
+from speaker_recovery import print_report, recover_all
 
-    # 获取当前目录下所有的 narrative_data_*.txt 文件
-    txt_files = ['narration/narrative_data_world.txt']
-    
-    all_dialogues = []
+CATEGORIES = ("world", "timed", "archons", "legend", "others")
+# 仓库中 archons 的提取文件名拼写为 arhchons，保留以兼容已有数据
+EXTRACTION_FILE_ALIASES = {"archons": "extraction/extracted_from_arhchons.json"}
+
+
+def narrative_file_for(category):
+    return f'narration/narrative_data_{category}.txt'
+
+
+def extracted_file_for(category):
+    alias = EXTRACTION_FILE_ALIASES.get(category)
+    if alias and os.path.exists(alias):
+        return alias
+    return f'extraction/extracted_from_{category}.json'
+
+
+def main_file_for(category):
+    return f'dialogue/dialogue_data_{category}.json'
 
-    for txt_file in txt_files:
-        print(f"正在处理文件: {txt_file}")
-        try:
-            with open(txt_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            file_dialogues = []
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                match = pattern.match(line)
-                if match:
-                    source_title = match.group(1)
-                    speaker = match.group(2)
-                    text = match.group(3)
-                    
-                    dialogue_entry = {
-                        "source_title": source_title,
-                        "speaker": speaker,
-                        "text": text
-                    }
-                    file_dialogues.append(dialogue_entry)
-            
-            print(f"  - 从 {txt_file} 提取了 {len(file_dialogues)} 条对话")
-            all_dialogues.extend(file_dialogues)
-            
-        except Exception as e:
-            print(f"处理文件 {txt_file} 时出错: {e}")
 
-    # 导出为 JSON
-    output_file = 'extraction/extracted_from_world.json'
+def extract_dialogues_from_txt(categories=("world",), jobs=None):
+    """
+    从各分类的旁白文件中找回对话，分别导出到 extraction/ 下的提取文件。
+    匹配由 speaker_recovery 的人名自动机完成，多个文件并行处理，并报告每个文件与严格正则的一致率和吞吐量。
+    返回是否全部成功：旁白文件缺失、处理或保存出错时为 False。
+    """
+    txt_files = [narrative_file_for(category) for category in categories]
+    missing = [path for path in txt_files if not os.path.exists(path)]
+    for path in missing:
+        print(f"未找到旁白文件: {path}")
+    pairs = [(category, path) for category, path in zip(categories, txt_files) if path not in missing]
+    ok = not missing
+    if not pairs:
+        return ok
+
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(all_dialogues, f, ensure_ascii=False, indent=4)
-        print(f"\n所有提取的对话已保存至: {output_file}")
-        print(f"共计提取: {len(all_dialogues)} 条")
+        results = recover_all([path for _, path in pairs], jobs=jobs)
     except Exception as e:
-        print(f"保存 JSON 文件时出错: {e}")
+        print(f"处理旁白文件时出错: {e}")
+        return False
+
+    print("各文件提取统计:")
+    for (category, _), (txt_file, file_dialogues, stats) in zip(pairs, results):
+        print_report(txt_file, stats)
+        # 导出为 JSON
+        output_file = extracted_file_for(category)
+        try:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(file_dialogues, f, ensure_ascii=False, indent=4)
+            print(f"    已保存至: {output_file}")
+        except Exception as e:
+            print(f"保存 JSON 文件时出错: {e}")
+            ok = False
+    return ok
+
+def merge_dialogues(category="world"):
+    """
+    将提取的对话合并到主对话文件中。
+    按 (source_title, speaker, text) 去重：主文件中已有的条目不会重复追加，重复运行结果不变。
+    返回是否成功。
+    """
+    extracted_file = extracted_file_for(category)
+    main_file = main_file_for(category)
 
-def merge_dialogues():
-    """将提取的对话合并到主对话文件中"""
-    extracted_file = 'extraction/extracted_from_world.json'
-    main_file = 'dialogue/dialogue_data_world.json'
-    
     if not os.path.exists(extracted_file):
         print(f"未找到提取文件: {extracted_file}")
-        return
-        
-    if not os.path.exists(main_file):
-        print(f"未找到主文件: {main_file}，将直接重命名提取文件。")
-        os.rename(extracted_file, main_file)
-        return
+        return False
 
     try:
-        # 读取提取的对话
-        with open(extracted_file, 'r', encoding='utf-8') as f:
-            extracted_data = json.load(f)
-            
-        # 读取主对话文件
-        with open(main_file, 'r', encoding='utf-8') as f:
-            main_data = json.load(f)
-            
-        # 合并数据
-        initial_count = len(main_data)
-        main_data.extend(extracted_data)
-        final_count = len(main_data)
-        
-        # 保存合并后的数据
-        with open(main_file, 'w', encoding='utf-8') as f:
-            json.dump(main_data, f, ensure_ascii=False, indent=4)
-            
+        index = MergeIndex(main_file)
+        inserted, skipped = index.merge(iter_json_entries(extracted_file))
+
         print(f"\n合并完成！")
-        print(f"主文件原数据量: {initial_count}")
-        print(f"新增数据量: {len(extracted_data)}")
-        print(f"合并后总数据量: {final_count}")
+        print(f"提取文件: {extracted_file}")
+        print(f"新增数据量: {inserted}")
+        print(f"已存在而跳过: {skipped}")
         print(f"数据已保存至: {main_file}")
-        
+        return True
+
     except Exception as e:
         print(f"合并文件时出错: {e}")
+        return False
 
 if __name__ == "__main__":
-    #extract_dialogues_from_txt()
-    merge_dialogues()
+    parser = argparse.ArgumentParser(description="从旁白中提取对话并去重合并到主对话文件")
+    parser.add_argument("--category", choices=CATEGORIES + ("all",), default="world",
+                        help="要处理的分类，all 表示全部")
+    parser.add_argument("--extract", action="store_true", help="合并前先从 narration/ 重新提取对话")
+    parser.add_argument("--jobs", type=int, default=None, help="并行提取的进程数，默认为 CPU 核数")
+    parser.add_argument("--no-merge", action="store_true", help="只提取，不合并到主对话文件（需同时指定 --extract）")
+    args = parser.parse_args()
+
+    categories = CATEGORIES if args.category == "all" else (args.category,)
+    ok = True
+    if args.extract:
+        ok = extract_dialogues_from_txt(categories, jobs=args.jobs)
+    if not args.no_merge:
+        for category in categories:
+            ok = merge_dialogues(category) and ok
+    if not ok:
+        # 退出码非 0，pipeline 据此判定阶段失败
+        sys.exit(1)
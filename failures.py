@@ -0,0 +1,247 @@
+"""抓取失败的分类、重试调度与持久化，取代原先只追加 URL 的 url_error.txt。
+
+失败原因:
+    page_load_timeout  页面加载超时（临时）
+    structure_timeout  等待对话容器超时且页面尚未加载完成（临时）
+    webdriver_crash    WebDriver / 浏览器崩溃，需要重启驱动（临时）
+    http_error         HTTP 请求失败（临时）
+    no_structure       页面已加载完成，但既没有结构 A 也没有结构 B（永久）
+    zero_records       找到了对话结构但提取到 0 条记录（永久）
+临时失败在同一次爬取中按指数退避重试；仍失败或属于永久失败的 URL 连同原因写入 url_failures.json，
+每个 URL 只保留一条记录。再次运行时可以只重试其中未解决的临时失败。
+多个分类的抓取（如 pipeline 中并行的 dialogue 阶段）共用同一个文件：save 在文件锁内重新读取文件，
+只写回本进程改动过的 URL，不会覆盖其他进程的记录。
+
+运行 `python failures.py import-legacy` 可把旧的 url_error.txt 导入为 legacy 记录。
+"""
+import argparse
+import heapq
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+PAGE_LOAD_TIMEOUT = "page_load_timeout"
+STRUCTURE_TIMEOUT = "structure_timeout"
+WEBDRIVER_CRASH = "webdriver_crash"
+HTTP_ERROR = "http_error"
+NO_STRUCTURE = "no_structure"
+ZERO_RECORDS = "zero_records"
+LEGACY = "legacy"
+
+TRANSIENT_CAUSES = {PAGE_LOAD_TIMEOUT, STRUCTURE_TIMEOUT, WEBDRIVER_CRASH, HTTP_ERROR, LEGACY}
+
+STATUS_TRANSIENT = "transient"
+STATUS_PERMANENT = "permanent"
+
+DEFAULT_FAILURE_FILE = "url_failures.json"
+LEGACY_ERROR_FILE = "url_error.txt"
+
+# 锁文件超过该秒数仍未释放时视为持有者已崩溃
+LOCK_STALE_SECONDS = 30.0
+LOCK_TIMEOUT = 60.0
+
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BACKOFF_BASE = 2.0      # 第 n 次重试前等待 base * 2^(n-1) 秒
+DEFAULT_BACKOFF_MAX = 60.0
+
+
+class PageFailure(Exception):
+    """单个页面抓取失败，cause 为上面的失败原因之一"""
+
+    def __init__(self, cause, detail=""):
+        super().__init__(f"{cause}: {detail}" if detail else cause)
+        self.cause = cause
+        self.detail = detail
+
+    @property
+    def transient(self):
+        return self.cause in TRANSIENT_CAUSES
+
+
+class RetryQueue:
+    """按到期时间排序的重试队列，退避时间随尝试次数指数增长"""
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, backoff_base=DEFAULT_BACKOFF_BASE,
+                 backoff_max=DEFAULT_BACKOFF_MAX):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._heap = []
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def backoff(self, attempts):
+        return min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+
+    def push(self, item, attempts):
+        """attempts 为已尝试次数；超过上限时返回 False，不再入队"""
+        if attempts >= self.max_attempts:
+            return False
+        due = time.monotonic() + self.backoff(attempts)
+        heapq.heappush(self._heap, (due, self._seq, attempts, item))
+        self._seq += 1
+        return True
+
+    def pop_ready(self):
+        """取出一个已到期的 (item, attempts)，没有时返回 None"""
+        if self._heap and self._heap[0][0] <= time.monotonic():
+            _, _, attempts, item = heapq.heappop(self._heap)
+            return item, attempts
+        return None
+
+    def wait_time(self):
+        """距离最早一个重试到期的秒数"""
+        if not self._heap:
+            return 0.0
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+
+@contextmanager
+def file_lock(path, timeout=LOCK_TIMEOUT, stale=LOCK_STALE_SECONDS):
+    """以 <path>.lock 的独占创建实现跨进程互斥，Windows 与 POSIX 通用"""
+    lock = f"{path}.lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) > stale:
+                    os.remove(lock)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"等待文件锁超时: {lock}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock)
+
+
+class FailureStore:
+    """url -> 失败记录，持久化到 JSON 文件；_changes 记录本进程改动过的 URL（None 表示已解决）"""
+
+    def __init__(self, path=DEFAULT_FAILURE_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries = self._read()
+        self._changes = {}
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def record(self, url, title, category, failure, attempts):
+        status = STATUS_TRANSIENT if failure.transient else STATUS_PERMANENT
+        entry = {
+            "title": title,
+            "category": category,
+            "cause": failure.cause,
+            "status": status,
+            "attempts": attempts,
+            "last_error": failure.detail,
+            "updated_at": int(time.time()),
+        }
+        with self._lock:
+            self._entries[url] = entry
+            self._changes[url] = entry
+
+    def resolve(self, url):
+        """URL 抓取成功后移除其失败记录"""
+        with self._lock:
+            if self._entries.pop(url, None) is not None or url in self._changes:
+                self._changes[url] = None
+
+    def get(self, url):
+        with self._lock:
+            return self._entries.get(url)
+
+    def entries(self):
+        with self._lock:
+            return dict(self._entries)
+
+    def outstanding(self, category=None, include_permanent=False):
+        """未解决的失败 URL 集合"""
+        with self._lock:
+            return {url for url, e in self._entries.items()
+                    if (category is None or e.get("category") in (category, None))
+                    and (include_permanent or e["status"] == STATUS_TRANSIENT)}
+
+    def save(self):
+        """在文件锁内读取磁盘上的最新内容，合并本进程的改动后写回"""
+        with self._lock, file_lock(self.path):
+            entries = self._read()
+            for url, entry in self._changes.items():
+                if entry is None:
+                    entries.pop(url, None)
+                else:
+                    entries[url] = entry
+            tmp = self.path.with_suffix(".json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+            self._entries = entries
+            self._changes = {}
+
+    def report(self, urls):
+        """打印本次运行中 urls 的失败原因统计"""
+        print("\n===== 提取失败的 URL 列表 =====")
+        entries = [(url, self.get(url)) for url in urls]
+        entries = [(url, e) for url, e in entries if e is not None]
+        if not entries:
+            print("本次运行没有失败的 URL。")
+            return
+        for url, e in entries:
+            print(f"[{e['cause']}/{e['status']}] {url}")
+        counts = Counter(e["cause"] for _, e in entries)
+        print("失败原因统计: " + "，".join(f"{cause} {n}" for cause, n in counts.most_common()))
+        print(f"失败记录已写入 {self.path}")
+
+    def import_legacy(self, legacy_file=LEGACY_ERROR_FILE):
+        """把旧 url_error.txt 中的 URL 去重后导入，返回新增条数"""
+        if not os.path.exists(legacy_file):
+            return 0
+        added = 0
+        with open(legacy_file, "r", encoding="utf-8") as f:
+            for line in f:
+                url = line.strip()
+                if url and self.get(url) is None:
+                    self.record(url, None, None, PageFailure(LEGACY, "imported from url_error.txt"), 0)
+                    added += 1
+        return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看或迁移抓取失败记录")
+    parser.add_argument("command", choices=("list", "import-legacy"))
+    parser.add_argument("--file", default=DEFAULT_FAILURE_FILE)
+    args = parser.parse_args()
+
+    store = FailureStore(args.file)
+    if args.command == "import-legacy":
+        added = store.import_legacy()
+        store.save()
+        print(f"从 {LEGACY_ERROR_FILE} 导入 {added} 条失败记录到 {args.file}")
+    else:
+        entries = store.entries()
+        counts = Counter((e["cause"], e["status"]) for e in entries.values())
+        for (cause, status), n in sorted(counts.items()):
+            print(f"  {cause} ({status}): {n}")
+        print(f"  total: {len(entries)}")
+
+
+if __name__ == "__main__":
+    main()
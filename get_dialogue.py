@@ -1,306 +1,676 @@
 import requests
-from bs4 import BeautifulSoup
 import json 
 import time
 import pandas as pd
-import random
 import os
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
+import sys
+import argparse
+from pathlib import Path
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException, WebDriverException
+
+import async_fetch
+from browser_profile import DEFAULT_PROFILE, PROFILES, PageTimings, create_chrome, get_profile
+from crawl_journal import CrawlJournal
+from crawl_manifest import CrawlManifest
+from dialogue_parser import DIALOGUE_AREA_CLASS, FOLD_MODULE_CLASS, parse_dialogue_html
+from failures import (HTTP_ERROR, NO_STRUCTURE, PAGE_LOAD_TIMEOUT, STRUCTURE_TIMEOUT, WEBDRIVER_CRASH, ZERO_RECORDS,
+                      FailureStore, PageFailure, RetryQueue)
+from merge_index import MergeIndex
+from metrics import DEFAULT_METRICS_DIR, RunMetrics, phase
+from page_cache import DEFAULT_CACHE_DIR, PageCache, read_object
+from page_script import extract_with_script
+from rate_limit import HostRateLimiters
 
 # --- 配置信息 ---
 URL_LIST_FILENAME = "urls/dialogue_urls_world.csv"
 OUTPUT_DIALOGUE_FILENAME = "dialogue/dialogue_data_world.json"
 OUTPUT_NARRATIVE_FILENAME = "narration/narrative_data_world.txt"
 
+# 五个任务分类，对应 urls/dialogue_urls_<分类>.csv
+CATEGORIES = ("world", "timed", "archons", "legend", "others")
+
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
-CHROME_DRIVER_PATH = r"D:\driverchrome\chromedriver.exe" 
-
 # --- 选择器定义 ---
-DIALOGUE_AREA_CLASS = "obc-tmpl-interactiveDialogue"
-DIALOGUE_NODE_CLASS = "content-box"
+# 结构 A / B 的类名定义在 dialogue_parser 中
 EXPAND_BUTTON_SELECTOR = f'.{DIALOGUE_AREA_CLASS} .obc-tmpl__expand-text'
+DIALOGUE_PARAGRAPH_SELECTOR = f'.{DIALOGUE_AREA_CLASS} p'
+# 点击一个展开按钮后最多等待多久；按钮点了没有反应时超时后继续
+EXPAND_WAIT_SECONDS = 2
+
+
+def category_paths(category):
+    """返回某个分类的 (URL 列表, 对话 JSON, 旁白 TXT) 路径"""
+    return (f"urls/dialogue_urls_{category}.csv",
+            f"dialogue/dialogue_data_{category}.json",
+            f"narration/narrative_data_{category}.txt")
 
 
 # --- 核心提取函数 ---
-def fetch_and_parse_dialogue_selenium(driver, url, dialogue_title, wait):
+def expanded(button, paragraphs_before):
     """
-    使用 Selenium 访问单个对话URL，等待JS加载完毕，并提取对话文本。
-    返回: (dialogue_list, narrative_list)
+    点击展开按钮后的等待条件：按钮已从 DOM 移除或不再显示，或结构 A 中的段落数增加，
+    即折叠内容已经出现。
     """
-    dialogue_list = []
-    narrative_list = []
+    def condition(driver):
+        try:
+            if not button.is_displayed():
+                return True
+        except StaleElementReferenceException:
+            return True
+        return len(driver.find_elements(By.CSS_SELECTOR, DIALOGUE_PARAGRAPH_SELECTOR)) > paragraphs_before
+    return condition
+
 
+def fetch_page_selenium(driver, url, dialogue_title, wait, limiter=None, cache=None,
+                        extract_mode="html", timings=None, span=None):
+    """
+    使用 Selenium 访问单个对话URL，等待JS加载完毕，并提取对话文本。
+    limiter 为该 host 的 AdaptiveRateLimiter，请求前取令牌，结束后回报耗时。
+    cache 为 PageCache 时保存渲染后的页面原文，供离线 reparse 使用。
+    extract_mode="script" 时注入一次脚本在页面内完成展开与提取，不逐个点击按钮、不传回整页 HTML
+    （因此也不写入页面缓存）。
+    timings 为 PageTimings 时记录页面加载耗时与传输量；span 为 metrics.PageSpan 时记录各阶段耗时。
+    返回: (dialogue_list, narrative_list)；失败时抛出带失败原因的 PageFailure。
+    """
+    if limiter is not None:
+        with phase(span, "rate_limit"):
+            limiter.acquire()
+    print(f"正在请求对话页面: {dialogue_title}")
+    started = time.monotonic()
     try:
-        print(f"正在请求对话页面: {dialogue_title}")
-        driver.get(url)
-        time.sleep(1)
+        with phase(span, "navigate"):
+            driver.get(url)
+    except TimeoutException as e:
+        if limiter is not None:
+            limiter.record(time.monotonic() - started, ok=False)
+        raise PageFailure(PAGE_LOAD_TIMEOUT, type(e).__name__)
+    except WebDriverException as e:
+        if limiter is not None:
+            limiter.record(time.monotonic() - started, ok=False)
+        raise PageFailure(WEBDRIVER_CRASH, type(e).__name__)
 
-        # 尝试等待主要容器出现（结构 A）
-        # 如果是结构 B 页面，这里会超时，我们需要捕获异常并继续解析
+    try:
+        # 等待结构 A 或结构 B 任一出现，不再固定 sleep
+        # 两者都没有时会超时，我们需要捕获异常并继续解析
+        structure_found = True
+        page_loaded = True
         try:
-            wait.until(EC.presence_of_element_located((By.CLASS_NAME, DIALOGUE_AREA_CLASS)))
-
-            # 点击所有“展开”按钮（仅在结构 A 存在时尝试）
-            clicked_buttons = set()
-            try:
-                expand_buttons = driver.find_elements(By.XPATH,
-                    "//div[contains(@class,'obc-tmpl-interactiveDialogue')]"
-                    "//*[contains(text(),'展开') or contains(@class,'obc-tmpl__expand-text')]"
-                )
-
-                for btn in expand_buttons:
-                    btn_id = id(btn)
-                    if btn_id in clicked_buttons:
-                        continue
-                    try:
-                        driver.execute_script("arguments[0].click();", btn)
-                        clicked_buttons.add(btn_id)
-                        time.sleep(0.3)  # 等待 DOM 刷新
-                    except Exception:
-                        pass
-            except Exception:
-                print("页面没有可展开按钮或点击失败，继续解析已渲染内容")
-        
+            with phase(span, "wait"):
+                wait.until(EC.any_of(
+                    EC.presence_of_element_located((By.CLASS_NAME, DIALOGUE_AREA_CLASS)),
+                    EC.presence_of_element_located((By.CLASS_NAME, FOLD_MODULE_CLASS)),
+                ))
         except TimeoutException:
-            # 如果等待超时，说明页面可能没有 interactiveDialogue 模块（可能是结构 B），不视为错误，继续解析
-            print("未检测到交互式对话容器 (Timeout)，尝试直接解析页面结构...")
-            time.sleep(1) # 等待，确保结构 B 加载完成
-
-        # 获取渲染后的完整 HTML
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-
-        # ----------- 结构 B: obc-tmpl-fold + 剧情对话标题 -----------
-        # 优先尝试结构 B
-        fold_modules = soup.find_all("div", class_="obc-tmpl-fold")
-        for module in fold_modules:
-            # 检查标题是否为“剧情对话”
-            is_target_module = False
-            
-            # 1. 尝试查找标准的标题容器
-            title_div = module.find("div", class_="obc-tmpl-fold__title")
-            if title_div:
-                # 标题容器里包含“剧情对话”
-                if "剧情对话" in title_div.get_text(strip=True):
-                    is_target_module = True
-            else:
-                # 2. 如果没有标题容器，回退到查找第一个 span
-                title_span = module.find("span")
-                if title_span and "剧情对话" in title_span.get_text(strip=True):
-                    is_target_module = True
-            
-            if not is_target_module:
-                continue
-
-            # 找所有 <p>
-            paragraphs = module.find_all("p")
-            for p in paragraphs:
-                text = p.get_text(strip=True)
-                if not text:
-                    continue
-
-                if "：" in text:
-                    speaker, t = text.split("：", 1)
-                    dialogue_list.append({
-                        "source_title": dialogue_title,
-                        "speaker": speaker.strip(),
-                        "text": t.strip()
-                    })
-                else:
-                    narrative_list.append(f"[{dialogue_title}] {text}")
-
-        # ----------- 结构 A: obc-tmpl-interactiveDialogue -----------
-        # 如果结构 B 没有提取到内容，则尝试结构 A
-        if not dialogue_list and not narrative_list:
-            print("结构 B 未提取到内容，尝试使用结构 A")
-            interactive_containers = soup.find_all("div", class_=DIALOGUE_AREA_CLASS)
-            for container in interactive_containers:
-                content_boxes = container.find_all("div", class_=DIALOGUE_NODE_CLASS)
-                for box in content_boxes:
-                    for p_tag in box.find_all("p"):
-                        text = p_tag.get_text(strip=True)
-                        if not text:
+            # 页面已加载完成时超时说明既没有 interactiveDialogue 也没有 fold 模块；
+            # 尚未加载完成则可能只是网络慢，提取不到内容时按临时失败重试
+            structure_found = False
+            page_loaded = driver.execute_script("return document.readyState") == "complete"
+            state = "页面已加载完成" if page_loaded else "页面尚未加载完成"
+            print(f"未检测到对话容器 (Timeout，{state})，尝试直接解析页面结构...")
+
+        if limiter is not None:
+            limiter.record(time.monotonic() - started)
+        if timings is not None:
+            timings.record(driver, time.monotonic() - started)
+
+        if extract_mode == "script":
+            with phase(span, "script"):
+                dialogue_list, narrative_list, clicks = extract_with_script(driver, dialogue_title, url)
+            print(f"页面 [{dialogue_title}] 脚本展开 {clicks} 个按钮，"
+                  f"成功提取 {len(dialogue_list)} 条对话，{len(narrative_list)} 条旁白。")
+        else:
+            # 点击所有“展开”按钮（仅在结构 A 存在时尝试）
+            expand_started = time.monotonic()
+            if driver.find_elements(By.CLASS_NAME, DIALOGUE_AREA_CLASS):
+                clicked_buttons = set()
+                try:
+                    expand_buttons = driver.find_elements(By.XPATH,
+                        "//div[contains(@class,'obc-tmpl-interactiveDialogue')]"
+                        "//*[contains(text(),'展开') or contains(@class,'obc-tmpl__expand-text')]"
+                    )
+
+                    for btn in expand_buttons:
+                        btn_id = id(btn)
+                        if btn_id in clicked_buttons:
                             continue
-                        if "：" in text:
-                            speaker, t = text.split("：", 1)
-                            dialogue_list.append({
-                                "source_title": dialogue_title,
-                                "speaker": speaker.strip(),
-                                "text": t.strip()
-                            })
-                        else:
-                            narrative_list.append(f"[{dialogue_title}] {text}")
-
-        print(f"页面 [{dialogue_title}] 成功提取 {len(dialogue_list)} 条对话，{len(narrative_list)} 条旁白。")
+                        try:
+                            paragraphs = len(driver.find_elements(By.CSS_SELECTOR, DIALOGUE_PARAGRAPH_SELECTOR))
+                            driver.execute_script("arguments[0].click();", btn)
+                            clicked_buttons.add(btn_id)
+                            # 等到按钮失效或折叠内容出现，而不是固定 sleep
+                            WebDriverWait(driver, EXPAND_WAIT_SECONDS, poll_frequency=0.05).until(
+                                expanded(btn, paragraphs))
+                        except Exception:
+                            pass
+                except Exception:
+                    print("页面没有可展开按钮或点击失败，继续解析已渲染内容")
+            if span is not None:
+                span.add("expand", time.monotonic() - expand_started)
+
+            # 获取渲染后的完整 HTML，写入缓存后交给解析函数
+            with phase(span, "page_source"):
+                html = driver.page_source
+                if cache is not None:
+                    cache.put(url, html)
+            with phase(span, "parse"):
+                dialogue_list, narrative_list = parse_dialogue_html(html, dialogue_title, url)
+
+            print(f"页面 [{dialogue_title}] 成功提取 {len(dialogue_list)} 条对话，{len(narrative_list)} 条旁白。")
+    except TimeoutException as e:
+        raise PageFailure(PAGE_LOAD_TIMEOUT, type(e).__name__)
+    except WebDriverException as e:
+        raise PageFailure(WEBDRIVER_CRASH, type(e).__name__)
+
+    if not dialogue_list and not narrative_list:
+        if structure_found:
+            raise PageFailure(ZERO_RECORDS)
+        raise PageFailure(NO_STRUCTURE if page_loaded else STRUCTURE_TIMEOUT)
+    return dialogue_list, narrative_list
 
+
+def fetch_and_parse_dialogue_selenium(driver, url, dialogue_title, wait, limiter=None, cache=None,
+                                      extract_mode="html", timings=None, metrics=None):
+    """
+    与 fetch_page_selenium 相同，但失败时只打印原因并返回空列表。
+    metrics 为 RunMetrics 时把本页面的阶段耗时、条数与失败原因记录为一行 JSON。
+    返回: (dialogue_list, narrative_list)
+    """
+    span = metrics.page(url, dialogue_title) if metrics is not None else None
+    try:
+        dialogue_list, narrative_list = fetch_page_selenium(driver, url, dialogue_title, wait, limiter, cache,
+                                                            extract_mode, timings, span)
+        if metrics is not None:
+            metrics.record(span, dialogues=len(dialogue_list), narratives=len(narrative_list))
+        return dialogue_list, narrative_list
+    except PageFailure as e:
+        print(f"访问或解析页面失败 ({e.cause}): {url}")
+        if metrics is not None:
+            metrics.record(span, e.cause, e.detail)
     except Exception as e:
         print(f"访问或解析页面失败 (WebDriver/超时错误): {url} - 错误类型: {type(e).__name__}")
-
-    return dialogue_list, narrative_list
+        if metrics is not None:
+            metrics.record(span, "error", type(e).__name__)
+    return [], []
 
 # --- 修改 JSON + TXT 导出 ---
-def main_extraction():
-    """启动 Selenium，读取 URL 列表并开始对话提取"""
-    url_error = []
-    if not os.path.exists(URL_LIST_FILENAME):
-        print(f"未找到 URL 列表文件 {URL_LIST_FILENAME}")
-        return
-
-    url_df = pd.read_csv(URL_LIST_FILENAME)
-    all_extracted_dialogues = [] 
-    all_extracted_narratives = [] 
-    
-    # --- 启动 Selenium 驱动 ---
+def save_extraction_results(all_extracted_dialogues, all_extracted_narratives,
+                            output_dialogue_filename=OUTPUT_DIALOGUE_FILENAME,
+                            output_narrative_filename=OUTPUT_NARRATIVE_FILENAME):
+    """将提取结果写入 JSON / TXT，两个文件都写入成功时返回 True"""
+    ok = True
+    print("-" * 30)
+    print(f"爬取完成！共计 {len(all_extracted_dialogues)} 条对话，{len(all_extracted_narratives)} 条旁白。")
+
+    try:
+        with open(output_dialogue_filename, 'w', encoding='utf-8') as f:
+            json.dump(all_extracted_dialogues, f, ensure_ascii=False, indent=4)
+        print(f"对话数据已成功写入 JSON 文件: {output_dialogue_filename}")
+    except Exception as e:
+        print(f"保存对话数据到JSON失败: {e}")
+        ok = False
+
+    try:
+        with open(output_narrative_filename, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(all_extracted_narratives))
+        print(f"旁白/特殊文本已成功写入 TXT 文件: {output_narrative_filename}")
+    except Exception as e:
+        print(f"保存旁白数据到TXT失败: {e}")
+        ok = False
+    return ok
+
+
+def category_of(output_dialogue_filename):
+    """由输出文件名得到分类名，如 dialogue/dialogue_data_world.json -> world"""
+    stem = Path(output_dialogue_filename).stem
+    return stem[len("dialogue_data_"):] if stem.startswith("dialogue_data_") else stem
+
+
+def create_driver(profile):
+    """按浏览器配置启动一个 Chrome 驱动，返回 (driver, wait)"""
+    driver = create_chrome(profile)
+    wait = WebDriverWait(driver, 10)
+    driver.set_page_load_timeout(10)
+    return driver, wait
+
+
+def restart_driver(driver, profile):
+    """WebDriver 崩溃后关闭旧驱动并重新启动"""
+    try:
+        driver.quit()
+    except Exception:
+        pass
+    print("WebDriver 已崩溃，重新启动浏览器")
+    return create_driver(profile)
+
+
+def crawl_shard(shard, journal, failures, category, limiters, profile, cache=None, extract_mode="html",
+                timings=None, metrics=None):
+    """
+    单个 worker：独占一个驱动和 WebDriverWait，依次抓取分片中的 (index, title, url)，
+    每完成一个页面立即追加到 journal。各 worker 共用 limiters 中同一 host 的令牌桶。
+    临时失败（超时、驱动崩溃）放入本 worker 的重试队列，按指数退避在本次运行中重试；
+    所有失败连同原因记录到 failures；metrics 为 RunMetrics 时每次尝试记录一行 JSON。
+    返回驱动是否启动成功。
+    """
     try:
-        service = Service(executable_path=CHROME_DRIVER_PATH)
-        driver = webdriver.Chrome(service=service)
-        wait = WebDriverWait(driver, 10)
-        driver.set_page_load_timeout(10)
+        driver, wait = create_driver(profile)
     except Exception as e:
         print(f"启动 Selenium 失败: {e}")
-        return
+        return False
 
-    print(f"--- 准备开始从 {len(url_df)} 个URL中提取对话 ---")
-    
+    pending = deque(shard)
+    retries = RetryQueue()
     try:
-        for index, row in url_df.iterrows():
-            url = row['url']
-            title = row['title']
-            
-            dialogues, narratives = fetch_and_parse_dialogue_selenium(driver, url, title, wait)
-            
-            if not dialogues and not narratives:
-                print(f"页面提取失败，加入 url_error: {url}")
-                url_error.append(url)
+        while pending or retries:
+            ready = retries.pop_ready()
+            if ready is not None:
+                (index, title, url), attempts = ready
+            elif pending:
+                (index, title, url), attempts = pending.popleft(), 0
             else:
-                if dialogues:
-                    all_extracted_dialogues.extend(dialogues)
-                if narratives:
-                    all_extracted_narratives.extend(narratives)
+                # 只剩尚未到期的重试
+                time.sleep(retries.wait_time())
+                continue
+
+            span = metrics.page(url, title, attempts + 1) if metrics is not None else None
+            try:
+                dialogues, narratives = fetch_page_selenium(driver, url, title, wait, limiters.get(url), cache,
+                                                            extract_mode, timings, span)
+            except PageFailure as e:
+                attempts += 1
+                if metrics is not None:
+                    metrics.record(span, e.cause, e.detail)
+                failures.record(url, title, category, e, attempts)
+                if e.cause == WEBDRIVER_CRASH:
+                    driver, wait = restart_driver(driver, profile)
+                if e.transient and retries.push((index, title, url), attempts):
+                    print(f"页面 [{title}] 失败 ({e.cause})，{retries.backoff(attempts):.0f} 秒后进行第 {attempts + 1} 次尝试")
+                else:
+                    print(f"页面提取失败 ({e.cause})，记录到失败列表: {url}")
+                continue
 
-            
-            delay = random.uniform(0.2, 0.5) 
-            print(f"-> 等待 {delay:.2f} 秒后继续爬取下一个 URL...")
-            time.sleep(delay)
+            if metrics is not None:
+                metrics.record(span, dialogues=len(dialogues), narratives=len(narratives))
+            journal.append(index, title, url, dialogues, narratives)
+            failures.resolve(url)
 
     except Exception as e:
         print(f"\n主循环中断: {e}")
         
     finally:
-        driver.quit()
+        try:
+            driver.quit()
+        except Exception:
+            pass
+    return True
+
+
+def main_extraction(url_list_filename=URL_LIST_FILENAME,
+                    output_dialogue_filename=OUTPUT_DIALOGUE_FILENAME,
+                    output_narrative_filename=OUTPUT_NARRATIVE_FILENAME,
+                    workers=1,
+                    cache_dir=DEFAULT_CACHE_DIR,
+                    fresh=False,
+                    extract_mode="html",
+                    browser_profile=DEFAULT_PROFILE,
+                    retry_failures=False,
+                    metrics_dir=DEFAULT_METRICS_DIR):
+    """
+    启动 Selenium，读取 URL 列表并开始对话提取。
+    每个页面完成后追加到 journal/ 下的 JSONL 日志并记录 checkpoint，中断后重新运行会跳过已完成的 URL；
+    fresh=True 时清空日志从头爬取；extract_mode 见 fetch_page_selenium；
+    browser_profile 为 browser_profile.PROFILES 中的配置名，运行结束时打印该配置的页面加载统计。
+    workers > 1 时启动 N 个无头驱动，URL 按下标轮流分片，最终按原 CSV 顺序从日志压缩输出，
+    因此输出与串行运行逐字节一致。本次没有新完成的页面且输出文件已存在时不改写输出文件，
+    日志之外写入的内容（如 get_urls.py --discover 追加的页面）得以保留，也不会改变下游阶段的输入。
+    失败记录在 url_failures.json 中：默认跳过已判定为永久失败的 URL；
+    retry_failures=True 时只重试其中未解决的临时失败。
+    metrics_dir 非空时把逐页面耗时写入 metrics/selenium_<分类>_*.jsonl，结束时打印分位数并写出 .prom 指标文件。
+    返回是否成功：URL 列表缺失、浏览器无法启动、导出失败或本次待抓取的页面全部失败时为 False。
+    """
+    if not os.path.exists(url_list_filename):
+        print(f"未找到 URL 列表文件 {url_list_filename}")
+        return False
+
+    url_df = pd.read_csv(url_list_filename)
+    rows = [(index, row['title'], row['url']) for index, row in url_df.iterrows()]
+    category = category_of(output_dialogue_filename)
+    journal = CrawlJournal(output_dialogue_filename)
+    failures = FailureStore()
+    if fresh:
+        journal.reset()
+    completed = journal.completed_urls()
+    pending = [row for row in rows if row[2] not in completed]
+    if completed:
+        print(f"检测到 {len(rows) - len(pending)} 个已完成的 URL，从断点继续")
+    if retry_failures:
+        outstanding = failures.outstanding(category)
+        pending = [row for row in pending if row[2] in outstanding]
+        print(f"只重试 {len(pending)} 个未解决的临时失败 URL")
+    elif not fresh:
+        permanent = failures.outstanding(category, include_permanent=True) - failures.outstanding(category)
+        skipped = [row for row in pending if row[2] in permanent]
+        if skipped:
+            print(f"跳过 {len(skipped)} 个已判定为永久失败的 URL")
+            pending = [row for row in pending if row[2] not in permanent]
+
+    if pending:
+        workers = max(1, min(workers, len(pending)))
+        shards = [pending[i::workers] for i in range(workers)]
+        limiters = HostRateLimiters()
+        cache = PageCache(cache_dir) if cache_dir else None
+        # 多个 worker 时始终无头运行
+        profile = get_profile(browser_profile, headless=True if workers > 1 else None)
+        timings = PageTimings(profile)
+        metrics = RunMetrics(f"selenium_{category}", metrics_dir) if metrics_dir else None
+
+        print(f"--- 准备开始从 {len(pending)} 个URL中提取对话 (worker 数: {workers}) ---")
 
-    # --- 导出文件 ---
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                started = list(pool.map(lambda shard: crawl_shard(shard, journal, failures, category, limiters,
+                                                                  profile, cache, extract_mode=extract_mode,
+                                                                  timings=timings, metrics=metrics),
+                                         shards))
+        finally:
+            failures.save()
+            if metrics is not None:
+                metrics.finish()
+        if not any(started):
+            return False
+        limiters.report()
+        timings.report()
+
+    # 本次仍未完成的 URL 即为失败 URL；驱动启动失败而未处理的 URL 也记为驱动故障
+    completed = journal.completed_urls()
+    url_error = [url for _, _, url in pending if url not in completed]
+    for index, title, url in pending:
+        if url not in completed and failures.get(url) is None:
+            failures.record(url, title, category, PageFailure(WEBDRIVER_CRASH, "未处理"), 0)
+    failures.save()
+
+    # --- 按原 CSV 顺序从日志压缩导出文件；本次没有新完成的页面且输出已存在时不改写 ---
+    exported = True
+    if len(url_error) == len(pending) and outputs_exist(output_dialogue_filename, output_narrative_filename):
+        print("本次没有新完成的页面，不改写输出文件。")
+    else:
+        exported = export_journal(journal, [url for _, _, url in rows], output_dialogue_filename,
+                                  output_narrative_filename)
+    failures.report(url_error)
+    return exported and not (pending and len(url_error) == len(pending))
+
+
+def outputs_exist(output_dialogue_filename, output_narrative_filename):
+    return os.path.exists(output_dialogue_filename) and os.path.exists(output_narrative_filename)
+
+
+def export_journal(journal, urls, output_dialogue_filename, output_narrative_filename):
+    """按 urls 顺序把日志压缩为最终的 dialogue JSON 与 narration TXT，成功返回 True"""
     print("-" * 30)
-    print(f"爬取完成！共计 {len(all_extracted_dialogues)} 条对话，{len(all_extracted_narratives)} 条旁白。")
-    
     try:
-        with open(OUTPUT_DIALOGUE_FILENAME, 'w', encoding='utf-8') as f:
-            json.dump(all_extracted_dialogues, f, ensure_ascii=False, indent=4)
-        print(f"对话数据已成功写入 JSON 文件: {OUTPUT_DIALOGUE_FILENAME}")
+        dialogue_count, narrative_count = journal.compact(urls, output_dialogue_filename, output_narrative_filename)
+        print(f"爬取完成！共计 {dialogue_count} 条对话，{narrative_count} 条旁白。")
+        print(f"对话数据已成功写入 JSON 文件: {output_dialogue_filename}")
+        print(f"旁白/特殊文本已成功写入 TXT 文件: {output_narrative_filename}")
+        return True
     except Exception as e:
-        print(f"保存对话数据到JSON失败: {e}")
-        
+        print(f"从日志导出数据失败: {e}")
+        return False
+
+
+def fetch_pages_http(rows, per_host=async_fetch.DEFAULT_PER_HOST_CONCURRENCY,
+                     content_api=async_fetch.CONTENT_API_TEMPLATE, selenium_fallback=True, cache=None,
+                     manifest=None, browser_profile=DEFAULT_PROFILE):
+    """
+    用 asyncio 并发抓取 rows 中的 (title, url)，需要 JS 展开的页面回退到 Selenium。
+    返回 (与 rows 顺序一致的 FetchResult 列表, {url: 最终仍没有内容的页面的 PageFailure})
+    """
+    limiters = HostRateLimiters()
+    results = asyncio.run(async_fetch.fetch_all(rows, parse_dialogue_html, per_host=per_host, content_api=content_api,
+                                                  limiters=limiters, cache=cache, manifest=manifest))
+    unchanged = sum(1 for r in results if r.unchanged)
+    js_results = [r for r in results if r.needs_js]
+    print(f"HTTP 抓取完成，{unchanged} 个页面未变化，{len(results) - unchanged - len(js_results)} 个页面已解析，"
+          f"{len(js_results)} 个页面需要 Selenium 展开")
+
+    # 每个页面最终的失败原因：HTTP 请求失败或静态 HTML 中没有对话结构
+    page_failures = {r.url: PageFailure(HTTP_ERROR, r.error) if r.error else PageFailure(NO_STRUCTURE)
+                     for r in js_results}
+    if js_results and selenium_fallback:
+        try:
+            driver, wait = create_driver(get_profile(browser_profile))
+        except Exception as e:
+            print(f"启动 Selenium 失败，跳过 JS 回退: {e}")
+            driver = None
+        if driver is not None:
+            try:
+                for r in js_results:
+                    try:
+                        r.dialogues, r.narratives = fetch_page_selenium(driver, r.url, r.title, wait,
+                                                                        limiters.get(r.url), cache)
+                        page_failures.pop(r.url, None)
+                    except PageFailure as e:
+                        page_failures[r.url] = e
+                        if e.cause == WEBDRIVER_CRASH:
+                            driver, wait = restart_driver(driver, get_profile(browser_profile))
+            finally:
+                driver.quit()
+    limiters.report()
+    return results, page_failures
+
+
+def main_http_extraction(url_list_filename=URL_LIST_FILENAME,
+                         output_dialogue_filename=OUTPUT_DIALOGUE_FILENAME,
+                         output_narrative_filename=OUTPUT_NARRATIVE_FILENAME,
+                         per_host=async_fetch.DEFAULT_PER_HOST_CONCURRENCY,
+                         content_api=async_fetch.CONTENT_API_TEMPLATE,
+                         selenium_fallback=True,
+                         cache_dir=DEFAULT_CACHE_DIR,
+                         fresh=False,
+                         refresh=False,
+                         browser_profile=DEFAULT_PROFILE,
+                         retry_failures=False):
+    """
+    HTTP 模式：用 asyncio 并发抓取服务端渲染的 HTML / 内容 JSON 并解析，
+    仅对需要 JS 展开（解析不到内容）的页面回退到 Selenium。
+    与 selenium 模式共用断点日志与失败记录；每个 URL 的响应哈希与 ETag / Last-Modified 记录在清单中。
+    refresh=True 时重新检查所有已完成的 URL，只重新提取内容有变化的页面；
+    没有新完成或有变化的页面且输出文件已存在时不改写输出文件。retry_failures=True 时只重试未解决的临时失败。
+    返回是否成功，判定同 main_extraction。
+    """
+    if not os.path.exists(url_list_filename):
+        print(f"未找到 URL 列表文件 {url_list_filename}")
+        return False
+
+    url_df = pd.read_csv(url_list_filename)
+    rows = list(zip(url_df['title'], url_df['url']))
+    category = category_of(output_dialogue_filename)
+    journal = CrawlJournal(output_dialogue_filename)
+    manifest = CrawlManifest(output_dialogue_filename)
+    failures = FailureStore()
+    if fresh:
+        journal.reset()
+        manifest.reset()
+    completed = journal.completed_urls()
+    outstanding = failures.outstanding(category) if retry_failures else None
+    targets = [(index, title, url) for index, (title, url) in enumerate(rows)
+               if (refresh or url not in completed) and (outstanding is None or url in outstanding)]
+    print(f"--- [HTTP] 准备开始从 {len(targets)} 个URL中提取对话 (每个 host 并发 {per_host}) ---")
+
+    cache = PageCache(cache_dir) if cache_dir else None
+    results, page_failures = fetch_pages_http([(title, url) for _, title, url in targets], per_host, content_api,
+                                              selenium_fallback, cache, manifest, browser_profile)
+
+    changed = 0
+    url_error = []
+    for (index, title, url), r in zip(targets, results):
+        if r.unchanged:
+            continue
+        if r.dialogues or r.narratives:
+            journal.append(index, title, url, r.dialogues, r.narratives)
+            if r.sha256:
+                manifest.update(url, r.sha256, r.etag, r.last_modified)
+            failures.resolve(url)
+            changed += 1
+        elif url not in completed:
+            # 已完成的页面刷新失败时保留旧记录，不算作失败
+            failures.record(url, title, category, page_failures[url], 1)
+            url_error.append(url)
+    manifest.save()
+    failures.save()
+
+    exported = True
+    if not changed and outputs_exist(output_dialogue_filename, output_narrative_filename):
+        if refresh:
+            print(f"刷新完成，检查了 {len(targets)} 个页面，没有页面发生变化，不改写输出文件。")
+        else:
+            print("本次没有新完成的页面，不改写输出文件。")
+    else:
+        if refresh:
+            print(f"刷新完成，{changed} 个页面有变化，重新导出输出文件。")
+        exported = export_journal(journal, [url for _, url in rows], output_dialogue_filename,
+                                  output_narrative_filename)
+    failures.report(url_error)
+    return exported and not (url_error and len(url_error) == len(targets))
+
+
+def main_append_extraction(rows, output_dialogue_filename=OUTPUT_DIALOGUE_FILENAME,
+                           output_narrative_filename=OUTPUT_NARRATIVE_FILENAME,
+                           cache_dir=DEFAULT_CACHE_DIR,
+                           browser_profile=DEFAULT_PROFILE):
+    """
+    只抓取 rows 中新发现的 (title, url)，把结果追加到已有输出：对话经 MergeIndex 去重后追加到 JSON 数组末尾，
+    旁白追加到 TXT 末尾。不读写断点日志，已有页面不会被重新抓取或改写。
+    返回新增的对话条数；写入输出失败时返回 None。
+    """
+    if not rows:
+        return 0
+    category = category_of(output_dialogue_filename)
+    failures = FailureStore()
+    cache = PageCache(cache_dir) if cache_dir else None
+    print(f"--- 抓取 {len(rows)} 个新发现的页面 ({category}) ---")
+    results, page_failures = fetch_pages_http(rows, cache=cache, browser_profile=browser_profile)
+
+    dialogues = []
+    narratives = []
+    url_error = []
+    for (title, url), r in zip(rows, results):
+        if r.dialogues or r.narratives:
+            dialogues.extend(r.dialogues)
+            narratives.extend(r.narratives)
+            failures.resolve(url)
+        else:
+            failures.record(url, title, category, page_failures.get(url, PageFailure(NO_STRUCTURE)), 1)
+            url_error.append(url)
+    failures.save()
+
+    inserted = 0
+    ok = True
     try:
-        with open(OUTPUT_NARRATIVE_FILENAME, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(all_extracted_narratives))
-        print(f"旁白/特殊文本已成功写入 TXT 文件: {OUTPUT_NARRATIVE_FILENAME}")
+        inserted, skipped = MergeIndex(output_dialogue_filename).merge(dialogues)
+        print(f"新增 {inserted} 条对话（{skipped} 条已存在），已追加到 {output_dialogue_filename}")
     except Exception as e:
-        print(f"保存旁白数据到TXT失败: {e}")
+        print(f"追加对话数据失败: {e}")
+        ok = False
+    if narratives:
+        try:
+            has_content = os.path.exists(output_narrative_filename) and os.path.getsize(output_narrative_filename) > 0
+            with open(output_narrative_filename, 'a', encoding='utf-8') as f:
+                f.write(("\n" if has_content else "") + "\n".join(narratives))
+            print(f"新增 {len(narratives)} 条旁白，已追加到 {output_narrative_filename}")
+        except Exception as e:
+            print(f"追加旁白数据失败: {e}")
+            ok = False
+    failures.report(url_error)
+    return inserted if ok else None
+
+
+def reparse_cached_page(task):
+    """进程池 worker：从缓存对象文件重新解析一个页面。task = (title, 对象路径, url)"""
+    title, object_path, url = task
+    html = read_object(object_path)
+    if html is None:
+        return None
+    return parse_dialogue_html(async_fetch.html_from_payload(html), title, url)
+
+
+def main_reparse(url_list_filename=URL_LIST_FILENAME,
+                 output_dialogue_filename=OUTPUT_DIALOGUE_FILENAME,
+                 output_narrative_filename=OUTPUT_NARRATIVE_FILENAME,
+                 cache_dir=DEFAULT_CACHE_DIR,
+                 jobs=None):
+    """
+    离线模式：不访问网络，从页面缓存重新解析每个页面，把结果作为该页面的新记录写入断点日志，
+    再按 CSV 顺序从日志导出 dialogue / narration 文件，之后的 selenium / http 续爬导出的也是新的解析结果。
+    缓存缺失或解析为空的页面保留日志中原有的记录。返回是否导出成功。
+    """
+    if not os.path.exists(url_list_filename):
+        print(f"未找到 URL 列表文件 {url_list_filename}")
+        return False
+
+    url_df = pd.read_csv(url_list_filename)
+    cache = PageCache(cache_dir)
+    journal = CrawlJournal(output_dialogue_filename)
+    rows = list(zip(url_df['title'], url_df['url']))
+    tasks = []
+    indices = []
+    missing = []
+    for index, (title, url) in enumerate(rows):
+        entry = cache.entry(url)
+        if entry is None:
+            missing.append(url)
+        else:
+            tasks.append((title, cache.object_path(entry["sha256"]), url))
+            indices.append(index)
+
+    print(f"--- [reparse] 从缓存重新解析 {len(tasks)} 个页面，缓存缺失 {len(missing)} 个 ---")
+    records = []
+    empty = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for index, (title, _, url), result in zip(indices, tasks,
+                                                   pool.map(reparse_cached_page, tasks, chunksize=16)):
+            dialogues, narratives = result if result is not None else ([], [])
+            if not dialogues and not narratives:
+                empty.append(title)
+                continue
+            records.append((index, title, url, dialogues, narratives))
+    journal.append_many(records)
 
-    print("\n===== 提取失败的 URL 列表 =====")
-    for u in url_error:
-        print(u)
+    # 离线重建不改动失败记录，只打印缺失与解析为空的页面
+    ok = export_journal(journal, [url for _, url in rows], output_dialogue_filename, output_narrative_filename)
+    for url in missing:
+        print(f"缓存中没有该页面: {url}")
+    for title in empty:
+        print(f"缓存页面解析为空，保留日志中原有的记录: {title}")
+    return ok
 
-    if url_error:
-        # 检查文件是否存在且有内容，以便决定是否添加换行符
-        has_content = os.path.exists("url_error.txt") and os.path.getsize("url_error.txt") > 0
-        
-        with open("url_error.txt", "a", encoding="utf-8") as f:
-            if has_content:
-                f.write("\n")
-            f.write("\n".join(url_error))
-        print("失败URL已追加写入 url_error.txt")
-    else:
-        print("本次运行没有失败的 URL。")
 
 TEST_URL = "https://baike.mihoyo.com/ys/obc/content/504413/detail?bbs_presentation_style=no_header"
 TEST_TITLE = "为我敞开心扉"
 
 def test_single_page_extraction():
-    """专门测试结构 B 页面（obc-tmpl-fold + 剧情对话）"""
+    """专门测试结构 B 页面（obc-tmpl-fold + 剧情对话），解析逻辑与批量抓取共用 parse_dialogue_html"""
     # --- 启动 Selenium ---
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.page_load_strategy = 'normal'  # 保证页面完全加载
-
-    service = Service(executable_path=CHROME_DRIVER_PATH)
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    driver = create_chrome(get_profile(DEFAULT_PROFILE, headless=True))
 
     try:
         print(f"正在请求页面: {TEST_TITLE}")
         print(f"URL: {TEST_URL}")
         driver.get(TEST_URL)
-        time.sleep(3)  # 增加等待时间，确保加载完成
-
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        dialogue_list = []
-        narrative_list = []
-
-        # 找所有 obc-tmpl-fold
-        fold_modules = soup.find_all("div", class_="obc-tmpl-fold")
-        print(f"调试: 找到 {len(fold_modules)} 个 obc-tmpl-fold 模块")
-
-        for i, module in enumerate(fold_modules):
-            # 检查标题是否为“剧情对话”
-            is_target_module = False
-            title_text_debug = "N/A"
-            
-            # 逻辑同上
-            title_div = module.find("div", class_="obc-tmpl-fold__title")
-            if title_div:
-                title_text_debug = title_div.get_text(strip=True)
-                if "剧情对话" in title_text_debug:
-                    is_target_module = True
-            else:
-                title_span = module.find("span")
-                if title_span:
-                    title_text_debug = title_span.get_text(strip=True)
-                    if "剧情对话" in title_text_debug:
-                        is_target_module = True
-            
-            print(f"调试: 模块 {i+1} 标题: '{title_text_debug}' -> 是否目标: {is_target_module}")
-
-            if not is_target_module:
-                continue
+        # 等待 fold 模块渲染完成，确保加载完成
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, FOLD_MODULE_CLASS)))
 
-            paragraphs = module.find_all("p")
-            print(f"调试: 目标模块中找到 {len(paragraphs)} 个 <p> 标签")
-
-            for p in paragraphs:
-                text = p.get_text(strip=True)
-                if not text:
-                    continue
-
-                if "：" in text:
-                    speaker, t = text.split("：", 1)
-                    dialogue_list.append({
-                        "source_title": TEST_TITLE,
-                        "speaker": speaker.strip(),
-                        "text": t.strip()
-                    })
-                else:
-                    narrative_list.append(f"[{TEST_TITLE}] {text}")
+        print(f"调试: 找到 {len(driver.find_elements(By.CLASS_NAME, FOLD_MODULE_CLASS))} 个 obc-tmpl-fold 模块")
+        dialogue_list, narrative_list = parse_dialogue_html(driver.page_source, TEST_TITLE, TEST_URL)
 
         print(f"\n提取完成: {len(dialogue_list)} 条对话，{len(narrative_list)} 条旁白")
         if dialogue_list:
@@ -311,6 +681,65 @@ def test_single_page_extraction():
     finally:
         driver.quit()
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="从 urls/ 下的 URL 列表抓取对话与旁白")
+    parser.add_argument("--category", choices=CATEGORIES + ("all",), default=None,
+                        help="任务分类，决定输入 CSV 与输出文件名；all 依次处理全部分类；默认使用文件顶部的配置")
+    parser.add_argument("--mode", choices=("selenium", "http", "reparse", "test"), default="test",
+                        help="selenium: 逐页浏览器抓取; http: asyncio 并发抓取，仅必要时回退 Selenium; "
+                             "reparse: 离线从页面缓存重建输出; test: 单页测试")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="selenium 模式下并行的无头浏览器数量，默认 1 (串行)")
+    parser.add_argument("--fresh", action="store_true",
+                        help="忽略断点日志与清单，从头爬取")
+    parser.add_argument("--refresh", action="store_true",
+                        help="http 模式下用条件请求重新检查已完成的页面，只重新提取有变化的页面")
+    parser.add_argument("--extract-mode", choices=("html", "script"), default="html",
+                        help="html: 逐个点击展开后解析整页 HTML; script: 注入脚本在页面内一次完成展开与提取")
+    parser.add_argument("--browser-profile", choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+                        help="fast: 无头 + eager + 屏蔽图片/媒体/字体/第三方请求; default: 原先的默认浏览器配置")
+    parser.add_argument("--retry-failures", action="store_true",
+                        help="只重试 url_failures.json 中未解决的临时失败，不重新抓取已成功的页面")
+    parser.add_argument("--per-host", type=int, default=async_fetch.DEFAULT_PER_HOST_CONCURRENCY,
+                        help="HTTP 模式下每个 host 的最大并发请求数")
+    parser.add_argument("--content-api", default=async_fetch.CONTENT_API_TEMPLATE,
+                        help="内容 JSON 接口模板（含 {content_id}），传空字符串则直接抓取页面 HTML")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="原始页面缓存目录，传空字符串则不缓存")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="reparse 模式下的解析进程数，默认等于 CPU 核数")
+    parser.add_argument("--metrics-dir", default=DEFAULT_METRICS_DIR,
+                        help="selenium 模式下逐页面耗时与 Prometheus 指标文件的目录，传空字符串则不记录")
+    parser.add_argument("--no-selenium-fallback", action="store_true",
+                        help="HTTP 模式下不为需要 JS 展开的页面启动 Selenium")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    test_single_page_extraction()
-    # main_extraction()
\ No newline at end of file
+    args = parse_args()
+    if args.category == "all":
+        path_list = [category_paths(c) for c in CATEGORIES]
+    elif args.category:
+        path_list = [category_paths(args.category)]
+    else:
+        path_list = [(URL_LIST_FILENAME, OUTPUT_DIALOGUE_FILENAME, OUTPUT_NARRATIVE_FILENAME)]
+
+    ok = True
+    for paths in path_list:
+        if args.mode == "selenium":
+            ok = main_extraction(*paths, workers=args.workers, cache_dir=args.cache_dir, fresh=args.fresh,
+                                 extract_mode=args.extract_mode, browser_profile=args.browser_profile,
+                                 retry_failures=args.retry_failures, metrics_dir=args.metrics_dir) and ok
+        elif args.mode == "http":
+            ok = main_http_extraction(*paths, per_host=args.per_host, content_api=args.content_api,
+                                      selenium_fallback=not args.no_selenium_fallback, cache_dir=args.cache_dir,
+                                      fresh=args.fresh, refresh=args.refresh, browser_profile=args.browser_profile,
+                                      retry_failures=args.retry_failures) and ok
+        elif args.mode == "reparse":
+            ok = main_reparse(*paths, cache_dir=args.cache_dir or DEFAULT_CACHE_DIR, jobs=args.jobs) and ok
+        else:
+            test_single_page_extraction()
+            break
+    if not ok:
+        # 退出码非 0，pipeline 据此判定阶段失败
+        sys.exit(1)
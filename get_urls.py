@@ -1,23 +1,37 @@
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-import time
+from selenium.common.exceptions import TimeoutException
 import csv
+import json
 import requests.compat
 import os
+import sys
+import time
+import argparse
+
+from browser_profile import DEFAULT_PROFILE, PROFILES, PageTimings, create_chrome, get_profile
+from metrics import DEFAULT_METRICS_DIR, RunMetrics, phase
 
 # --- 配置信息 ---
 TARGET_URL = "https://baike.mihoyo.com/ys/obc/channel/map/189/43?bbs_presentation_style=no_header&visit_device=pc"
 OUTPUT_FILENAME = "urls/dialogue_urls_timed.csv"
-CHROME_DRIVER_PATH = r"D:\driverchrome\chromedriver.exe"
+DEFAULT_CATEGORY = "timed"
+# 分类 -> “任务类型”筛选框中的选项文字，分类名与 urls/dialogue_urls_<分类>.csv 一致
+TASK_TYPES = {
+    "archons": "魔神任务",
+    "legend": "传说任务",
+    "world": "世界任务",
+    "timed": "限时任务",
+    "others": "其他任务",
+}
 # --- 选择器定义 ---
 # 1. 点击“任务类型”筛选框（使用绝对XPath）
 CLICK_TASK_TYPE_XPATH = '/html/body/div[1]/div/div/div[2]/div[2]/div/div[1]/div[2]/ul/li/div/div[1]/div[2]/div/div[1]/div'
 
 # 2. 点击目标任务
-DEMON_TASK_OPTION_XPATH = '//li[@class="el-select-dropdown__item"]//span[text()="限时任务"]' 
+TASK_OPTION_XPATH = '//li[@class="el-select-dropdown__item"]//span[text()="{label}"]'
+DEMON_TASK_OPTION_XPATH = TASK_OPTION_XPATH.format(label=TASK_TYPES[DEFAULT_CATEGORY])
 
 # 3. 包含所有链接列表的父容器 Class Name (用于等待内容加载)
 URL_CONTAINER_CLASS = "position-list__list" 
@@ -26,85 +40,165 @@ URL_CONTAINER_CLASS = "position-list__list"
 LINK_SELECTOR = 'li a' 
 
 
-# --- 核心爬取函数 ---
+DISCOVERY_DIFF_FILENAME = "urls/discovery_diff.json"
 
-def scrape_dialogue_urls():
-    """执行点击、等待、并提取所有对话URL"""
-    
-    service = Service(executable_path=CHROME_DRIVER_PATH)
-    
-    try:
-        driver = webdriver.Chrome(service=service) 
-    except Exception as e:
-        print(f"启动 Chrome 失败：{e}")
-        return []
 
-    print("启动浏览器，打开目标页面")
-    driver.get(TARGET_URL) 
-    print("页面加载中")
-    wait = WebDriverWait(driver, 20)
-    dialogue_urls = []
+def output_file_for(category):
+    return f"urls/dialogue_urls_{category}.csv"
 
-    try:
-        # --- 点击“任务类型”打开下拉菜单 ---
-        print("正在定位并点击任务类型筛选框")
-        task_type_button = wait.until(
-            EC.element_to_be_clickable((By.XPATH, CLICK_TASK_TYPE_XPATH))
-        )
-        driver.execute_script("arguments[0].click();", task_type_button) 
-        
-        # --- 点击任务选项 --
-        print("正在定位并点击下拉菜单中的目标选项...")
-        demon_task_option = wait.until(
-            EC.element_to_be_clickable((By.XPATH, DEMON_TASK_OPTION_XPATH))
-        )
-        driver.execute_script("arguments[0].click();", demon_task_option)
-        time.sleep(1)
-        # --- 等待新的 URL 列表加载 ---
-        print(f"等待URL列表加载 (Class: {URL_CONTAINER_CLASS})...")
+
+# --- 核心爬取函数 ---
+
+def select_and_collect(driver, wait, category, span=None):
+    """
+    在已打开的任务列表页上切换“任务类型”筛选到 category，等待列表刷新后提取全部链接。
+    返回 [{'title', 'url'}]；同一会话中可对多个分类依次调用。
+    """
+    # --- 点击“任务类型”打开下拉菜单 ---
+    print("正在定位并点击任务类型筛选框")
+    filter_started = time.monotonic()
+    task_type_button = wait.until(
+        EC.element_to_be_clickable((By.XPATH, CLICK_TASK_TYPE_XPATH))
+    )
+    driver.execute_script("arguments[0].click();", task_type_button) 
+    
+    # --- 点击任务选项 --
+    print(f"正在定位并点击下拉菜单中的目标选项: {TASK_TYPES[category]}")
+    demon_task_option = wait.until(
+        EC.element_to_be_clickable((By.XPATH, TASK_OPTION_XPATH.format(label=TASK_TYPES[category])))
+    )
+    # 记下筛选前的列表项，筛选后等待它被替换，而不是固定 sleep
+    old_items = driver.find_elements(By.CSS_SELECTOR, f'.{URL_CONTAINER_CLASS} li.position-list__item')
+    driver.execute_script("arguments[0].click();", demon_task_option)
+    if old_items:
+        try:
+            wait.until(EC.staleness_of(old_items[0]))
+        except TimeoutException:
+            print("筛选后列表未刷新，继续使用当前列表")
+    if span is not None:
+        span.add("filter", time.monotonic() - filter_started)
+    # --- 等待新的 URL 列表加载 ---
+    print(f"等待URL列表加载 (Class: {URL_CONTAINER_CLASS})...")
+    with phase(span, "wait"):
         list_container = wait.until(
             EC.presence_of_element_located((By.CLASS_NAME, URL_CONTAINER_CLASS))
         )
-        if not list_container:
-            print("未找到包含链接的列表容器")
-            return []
-        else:
-            print("准备提取链接")
-        # 提取所有链接
-        print("开始遍历列表提取URL")
+    if not list_container:
+        print("未找到包含链接的列表容器")
+        return []
+    # 提取所有链接
+    print("开始遍历列表提取URL")
+    with phase(span, "wait"):
         wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, f'.{URL_CONTAINER_CLASS} {LINK_SELECTOR}')))
         wait.until(
             EC.presence_of_element_located(
                 (By.CSS_SELECTOR, f'.{URL_CONTAINER_CLASS} li.position-list__item')
             )
         )
-        
-        # 重新获取链接元素
+
+    # 重新获取链接元素
+    dialogue_urls = []
+    with phase(span, "collect"):
         link_elements = list_container.find_elements(By.CSS_SELECTOR, LINK_SELECTOR)
-        
+
         for link_element in link_elements:
             href = link_element.get_attribute('href')
             title = link_element.get_attribute('title')
-            
+
             if href:
                 full_url = requests.compat.urljoin(TARGET_URL, href)
                 dialogue_urls.append({'title': title, 'url': full_url})
-        
-        print(f"成功提取 {len(dialogue_urls)} 个对话链接。")
+    return dialogue_urls
+
+
+def scrape_dialogue_urls(browser_profile=DEFAULT_PROFILE, metrics_dir=DEFAULT_METRICS_DIR,
+                         category=DEFAULT_CATEGORY):
+    """
+    执行点击、等待、并提取所有对话URL；browser_profile 为 browser_profile.PROFILES 中的配置名。
+    category 为 TASK_TYPES 中的分类，决定点击哪个任务类型选项。
+    metrics_dir 非空时把各阶段耗时记录到 metrics/urls_<分类>_*.jsonl 并写出 .prom 指标文件。
+    """
+    return discover_all([category], browser_profile, metrics_dir, run=f"urls_{category}").get(category, [])
+
+
+def discover_all(categories=tuple(TASK_TYPES), browser_profile=DEFAULT_PROFILE, metrics_dir=DEFAULT_METRICS_DIR,
+                 run="urls_discovery"):
+    """
+    在同一个浏览器会话中依次切换筛选，收集多个分类的对话 URL，只打开一次浏览器和列表页。
+    返回 {分类: [{'title', 'url'}]}；某个分类失败时不包含该分类。
+    """
+    profile = get_profile(browser_profile)
+    timings = PageTimings(profile)
+    metrics = RunMetrics(run, metrics_dir) if metrics_dir else None
+
+    try:
+        driver = create_chrome(profile)
+    except Exception as e:
+        print(f"启动 Chrome 失败：{e}")
+        return {}
+
+    print("启动浏览器，打开目标页面")
+    started = time.monotonic()
+    navigate_span = metrics.page(TARGET_URL, "任务列表") if metrics is not None else None
+    found = {}
+    try:
+        with phase(navigate_span, "navigate"):
+            driver.get(TARGET_URL) 
+        print("页面加载中")
+        wait = WebDriverWait(driver, 20)
+        if metrics is not None:
+            metrics.record(navigate_span)
+
+        for category in categories:
+            span = metrics.page(TARGET_URL, TASK_TYPES[category]) if metrics is not None else None
+            failure = None
+            dialogue_urls = []
+            try:
+                dialogue_urls = select_and_collect(driver, wait, category, span)
+                if not timings.samples:
+                    timings.record(driver, time.monotonic() - started)
+                found[category] = dialogue_urls
+                print(f"[{TASK_TYPES[category]}] 成功提取 {len(dialogue_urls)} 个对话链接。")
+            except Exception as e:
+                print(f"[{TASK_TYPES[category]}] 爬取过程中发生错误: {e}")
+                failure = "page_load_timeout" if isinstance(e, TimeoutException) else "error"
+            if metrics is not None:
+                metrics.record(span, failure, urls=len(dialogue_urls))
 
     except Exception as e:
         print(f"爬取过程中发生错误: {e}")
         
     finally:
         driver.quit() 
+        timings.report()
+        if metrics is not None:
+            metrics.finish()
         
-    return dialogue_urls
+    return found
+
+
+def load_urls_csv(filename):
+    """读取已有的 URL 列表，文件不存在时返回空列表"""
+    if not os.path.exists(filename):
+        return []
+    with open(filename, 'r', newline='', encoding='utf-8') as csvfile:
+        return [{'title': row['title'], 'url': row['url']} for row in csv.DictReader(csvfile)]
+
+
+def diff_urls(old_rows, new_rows):
+    """按 URL 比较，返回 (新增, 移除)，均保持各自列表中的顺序"""
+    old_urls = {row['url'] for row in old_rows}
+    new_urls = {row['url'] for row in new_rows}
+    added = [row for row in new_rows if row['url'] not in old_urls]
+    removed = [row for row in old_rows if row['url'] not in new_urls]
+    return added, removed
 
 # --- 数据保存函数 ---
 
 def save_urls_to_csv(data_list, filename):
+    """写入 CSV，成功返回 True"""
     if not data_list:
-        return
+        return False
         
     fieldnames = ['title', 'url'] 
     
@@ -114,16 +208,84 @@ def save_urls_to_csv(data_list, filename):
             writer.writeheader() 
             writer.writerows(data_list)
         print(f"-> 已成功将所有链接写入 {filename}")
+        return True
     except Exception as e:
         print(f"保存数据到CSV失败: {e}")
+        return False
+
+
+def main_discovery(categories, browser_profile=DEFAULT_PROFILE, metrics_dir=DEFAULT_METRICS_DIR, crawl=False):
+    """
+    一个浏览器会话收集全部分类的 URL，与 urls/ 下已有的 CSV 对比，只报告新增与移除的任务，
+    有变化的分类改写 CSV，差异写入 DISCOVERY_DIFF_FILENAME。
+    crawl=True 时新增的 URL 直接交给 get_dialogue 抓取并追加到已有输出。
+    返回 ({分类: {"added": [...], "removed": [...]}}, 是否全部成功)
+    """
+    found = discover_all(categories, browser_profile, metrics_dir)
+    diff = {}
+    ok = True
+    for category in categories:
+        rows = found.get(category)
+        if not rows:
+            # 收集失败或列表为空时不改写 CSV，避免把已有任务全部当作移除
+            print(f"[{category}] 没有收集到 URL，保留原有列表")
+            ok = False
+            continue
+        filename = output_file_for(category)
+        added, removed = diff_urls(load_urls_csv(filename), rows)
+        diff[category] = {"added": added, "removed": removed}
+        print(f"[{category}] 共 {len(rows)} 个任务，新增 {len(added)} 个，移除 {len(removed)} 个")
+        for row in added:
+            print(f"  + {row['title']} {row['url']}")
+        for row in removed:
+            print(f"  - {row['title']} {row['url']}")
+        if added or removed:
+            ok = save_urls_to_csv(rows, filename) and ok
+
+    try:
+        with open(DISCOVERY_DIFF_FILENAME, 'w', encoding='utf-8') as f:
+            json.dump(diff, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"保存差异文件失败: {e}")
+        ok = False
+
+    if crawl:
+        # 延迟导入：只收集 URL 时不需要加载抓取模块
+        from get_dialogue import category_paths, main_append_extraction
+        for category, d in diff.items():
+            if d["added"]:
+                _, dialogue_file, narrative_file = category_paths(category)
+                ok = main_append_extraction([(row['title'], row['url']) for row in d["added"]], dialogue_file,
+                                            narrative_file, browser_profile=browser_profile) is not None and ok
+    return diff, ok
 
 
 # --- 主运行逻辑 ---
 if __name__ == "__main__":
-    print("=== 开始爬取对话 URL ===")
-    url_list = scrape_dialogue_urls()
-    
-    if url_list:
-        save_urls_to_csv(url_list, OUTPUT_FILENAME)
-        
-    print("成功")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="从观测枢任务列表抓取对话页面 URL")
+    parser.add_argument("--browser-profile", choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+                        help="fast: 无头 + eager + 屏蔽图片/媒体/字体/第三方请求; default: 原先的默认浏览器配置")
+    parser.add_argument("--metrics-dir", default=DEFAULT_METRICS_DIR,
+                        help="各阶段耗时与 Prometheus 指标文件的目录，传空字符串则不记录")
+    parser.add_argument("--category", choices=sorted(TASK_TYPES), default=None,
+                        help="任务分类，决定筛选的任务类型与输出的 urls/dialogue_urls_<分类>.csv；默认使用文件顶部的配置")
+    parser.add_argument("--discover", action="store_true",
+                        help="一个浏览器会话收集全部分类（或 --category 指定的分类），只报告并写入与已有 CSV 的差异")
+    parser.add_argument("--crawl", action="store_true", help="配合 --discover：新增的 URL 直接抓取并追加到对话输出")
+    args = parser.parse_args()
+
+    if args.discover:
+        print("=== 开始增量发现对话 URL ===")
+        _, ok = main_discovery([args.category] if args.category else list(TASK_TYPES), args.browser_profile,
+                               args.metrics_dir, crawl=args.crawl)
+    else:
+        print("=== 开始爬取对话 URL ===")
+        category = args.category or DEFAULT_CATEGORY
+        url_list = scrape_dialogue_urls(args.browser_profile, args.metrics_dir, category)
+        ok = save_urls_to_csv(url_list, output_file_for(args.category) if args.category else OUTPUT_FILENAME)
+
+    if not ok:
+        # 退出码非 0，pipeline 据此判定阶段失败
+        print("失败")
+        sys.exit(1)
+    print("成功")
@@ -1,16 +1,27 @@
 
 """按 speaker 分组对话文件。
 
-遍历 `dialogue/` 目录下的所有 `.json` 文件，根据条目中的 `speaker` 字段将条目分到 `speaker/` 下的子目录
+根据条目中的 `speaker` 字段把 `dialogue/` 下每个 `.json` 文件的条目分到 `speaker/` 下的子目录，
 每个源文件会在对应分组目录下生成同名的 JSON 文件。
+
+speaker/ 是按需生成的副本，pipeline 不再运行本脚本。运行时先刷新 speaker_view 的 JSONL 与偏移索引，
+再从视图按偏移读取各分组的记录并流式写出，内存占用与文件大小无关。
+`speaker/.manifest.json` 记录每个源文件的哈希与分组统计，再次运行时只重新生成内容变化的源文件对应的输出；
+分组列表变化或指定 --full 时全部重建。多个源文件在进程池中并行处理。
+
+只需要按说话人读取时请直接使用 speaker_view.py，不生成副本。
 """
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
-from collections import defaultdict, Counter
+import os
+import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List
 
 
 DEFAULT_GROUPS = {  "旅行者",   "派蒙",     "纳西妲",   "安柏",     "砂糖", 
@@ -37,6 +48,8 @@ DEFAULT_GROUPS = {  "旅行者",   "派蒙",     "纳西妲",   "安柏",     "
                     "流浪者",   "埃洛伊"
                   }
 DEFAULT_TOP_N = 5
+MANIFEST_NAME = ".manifest.json"
+READ_CHUNK_SIZE = 1 << 16
 
 
 def normalize_speaker_name(speaker: Any) -> str | None:
@@ -101,18 +114,98 @@ def normalize_group(speaker: Any, groups: set) -> str:
     return "other"
 
 
-def merge_write_json(out_file: Path, items: List[Any]) -> None:
-    if out_file.exists():
-        try:
-            existing = json.loads(out_file.read_text(encoding="utf-8"))
-            if not isinstance(existing, list):
-                existing = [existing]
-        except Exception:
-            existing = []
-        merged = existing + items
-    else:
-        merged = items
-    out_file.write_text(json.dumps(merged, ensure_ascii=False, indent=2), encoding="utf-8")
+def iter_json_entries(path: Path) -> Iterator[Any]:
+    """
+    逐条读取 JSON 文件中的条目：顶层为数组时按块读取并用 raw_decode 依次解码每个元素，
+    不把整个文件载入内存；顶层不是数组时回退到整体读取后 find_entries。
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(READ_CHUNK_SIZE)
+        eof = not buf
+        pos = 0
+
+        def skip_ws():
+            nonlocal buf, pos, eof
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                buf, pos = f.read(READ_CHUNK_SIZE), 0
+                eof = not buf
+
+        skip_ws()
+        if pos >= len(buf) or buf[pos] != "[":
+            # 非数组（对象或空文件）：整体解析
+            buf += f.read()
+            yield from find_entries(json.loads(buf))
+            return
+        pos += 1
+
+        first = True
+        while True:
+            skip_ws()
+            if pos >= len(buf):
+                raise ValueError("JSON 数组未闭合")
+            if buf[pos] == "]":
+                return
+            if not first:
+                if buf[pos] != ",":
+                    raise ValueError(f"JSON 数组元素之间缺少逗号 (位置 {pos})")
+                pos += 1
+                skip_ws()
+            first = False
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                    # 元素后面必须紧跟空白、',' 或 ']'，否则可能是被块边界截断的数字
+                    if (end < len(buf) and buf[end] in " \t\r\n,]") or eof:
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                more = f.read(READ_CHUNK_SIZE)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+            pos = end
+            yield item
+            if pos > READ_CHUNK_SIZE:
+                buf, pos = buf[pos:], 0
+
+
+def group_of(item: Any, sanitized_groups: set) -> str:
+    """说话人（经 sanitize 后）在 sanitized_groups 中则归入该人名文件夹，否则统一归入 other"""
+    sp = normalize_speaker_name(get_speaker(item))
+    san_sp = sanitize_filename(sp) if sp is not None else None
+    if san_sp and san_sp in sanitized_groups:
+        return san_sp
+    return "other"
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def groups_digest(sanitized_groups: set) -> str:
+    return hashlib.sha256("\n".join(sorted(sanitized_groups)).encode("utf-8")).hexdigest()
+
+
+def load_manifest(out_dir: Path) -> Dict[str, Any]:
+    try:
+        return json.loads((out_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_manifest(out_dir: Path, manifest: Dict[str, Any]) -> None:
+    tmp = out_dir / f"{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, out_dir / MANIFEST_NAME)
 
 
 def main() -> None:
@@ -121,6 +214,8 @@ def main() -> None:
     parser.add_argument("--out-dir", type=Path, default=Path(__file__).parent / "speaker")
     parser.add_argument("--groups", type=str, default=",".join(sorted(DEFAULT_GROUPS)),
                         help="以逗号分隔的分组名，默认: 仓库内 DEFAULT_GROUPS 的值")
+    parser.add_argument("--full", action="store_true", help="忽略清单，重新生成所有源文件的输出")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="并行处理源文件的进程数")
     args = parser.parse_args()
 
     groups = {g.strip() for g in args.groups.split(",") if g.strip()}
@@ -130,51 +225,61 @@ def main() -> None:
     out_dir = args.out_dir
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    summary = defaultdict(int)
-
     if not dialogue_dir.exists() or not dialogue_dir.is_dir():
         print(f"dialogue 目录不存在: {dialogue_dir}")
-        return
+        sys.exit(1)
 
     files = sorted(dialogue_dir.glob("*.json"))
     if not files:
         print(f"在 {dialogue_dir} 中未找到任何 .json 文件")
-        return
+        sys.exit(1)
+
+    # 分组列表变化时所有输出都需要重建
+    manifest = load_manifest(out_dir)
+    digest = groups_digest(sanitized_groups)
+    if args.full or manifest.get("groups") != digest:
+        manifest = {"groups": digest, "files": {}}
+    entries = manifest.setdefault("files", {})
 
-    # 缓冲所有要写入的输出文件内容，避免对同一文件多次打开并追加，防止重复
-    out_buffers: Dict[Path, List[Any]] = defaultdict(list)
+    # 延迟导入：speaker_view 依赖本模块中的工具函数
+    import speaker_view
 
+    _, failed = speaker_view.build(dialogue_dir, full=args.full)
+    sources = speaker_view.load_index(dialogue_dir)["files"]
+    changed = []
     for f in files:
-        try:
-            raw = json.loads(f.read_text(encoding="utf-8"))
-        except Exception as e:
-            print(f"跳过文件 {f.name}，读取失败: {e}")
+        source = sources.get(f.with_suffix(".jsonl").name)
+        if source is None:
+            entries.pop(f.name, None)
             continue
+        entry = entries.get(f.name)
+        if entry is None or entry.get("sha256") != source["sha256"]:
+            changed.append((f, source["sha256"]))
+    print(f"{len(files)} 个源文件中 {len(changed)} 个需要重新分组")
+
+    if changed:
+        jobs = max(1, min(args.jobs, len(changed)))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [(f, sha, pool.submit(speaker_view.export_task,
+                                            (dialogue_dir, f.with_suffix(".jsonl").name, out_dir, sanitized_groups)))
+                       for f, sha in changed]
+            for f, sha, future in futures:
+                try:
+                    counts = future.result()
+                except Exception as e:
+                    print(f"跳过文件 {f.name}，写出失败: {e}")
+                    entries.pop(f.name, None)
+                    failed.append(f.name)
+                    continue
+                entries[f.name] = {"sha256": sha, "counts": counts}
+                print(f"  {f.name}: {sum(counts.values())} 条")
+    save_manifest(out_dir, manifest)
 
-        entries = find_entries(raw)
-
-        # 直接按说话人导出：若说话人（经 sanitize 后）在 sanitized_groups 中则生成该人名文件夹，
-        # 否则统一归入 other
-        for item in entries:
-            sp_raw = get_speaker(item)
-            sp = normalize_speaker_name(sp_raw)
-            san_sp = sanitize_filename(sp) if sp is not None else None
-            if san_sp and san_sp in sanitized_groups:
-                grp = san_sp
-            else:
-                grp = "other"
-            grp_dir = out_dir / grp
-            grp_dir.mkdir(parents=True, exist_ok=True)
-            out_file = grp_dir / f.name
-            out_buffers[out_file].append(item)
-            summary[grp] += 1
-
-    # 将缓冲区的内容一次性写入对应文件（覆盖现有文件），避免重复追加
-    for out_file, items in out_buffers.items():
-        try:
-            out_file.write_text(json.dumps(items, ensure_ascii=False, indent=2), encoding="utf-8")
-        except Exception as e:
-            print(f"写入文件 {out_file} 失败: {e}")
+    # 统计当前所有源文件（包括未变化的）的分组条数
+    summary = defaultdict(int)
+    for f in files:
+        for grp, n in entries.get(f.name, {}).get("counts", {}).items():
+            summary[grp] += n
 
     print("分组完成，统计如下:")
     total = 0
@@ -182,6 +287,9 @@ def main() -> None:
         print(f"  {k}: {v}")
         total += v
     print(f"  total: {total}")
+    if failed:
+        # 退出码非 0，pipeline 据此判定阶段失败
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+"""合并对话时使用的持久化去重索引。
+
+为每个主对话文件在 `journal/<文件名>.keys.sqlite` 中保存全部条目 (source_title, speaker, text) 的 16 字节哈希
+（WITHOUT ROWID 主键表），并记录建立索引时主文件的大小与修改时间。合并时只把新条目的哈希分批送入 SQLite 查询，
+不把索引载入内存；新条目直接追加到主文件 JSON 数组末尾（格式与 json.dump(indent=4) 一致），不重写整个文件，
+耗时与内存都与新增条目数成正比（每次查询为 O(log n)）。
+主文件被其他程序改写（大小或修改时间变化）时自动从主文件重建索引。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+from crawl_journal import DEFAULT_JOURNAL_DIR
+from group_by_speaker import iter_json_entries
+
+TAIL_WINDOW = 256
+# 每次 IN 查询的键数，低于 SQLite 默认的变量个数上限
+LOOKUP_BATCH = 500
+
+
+def record_key(item):
+    """(source_title, speaker, text) 的 16 字节哈希，十六进制表示"""
+    raw = json.dumps([item.get("source_title"), item.get("speaker"), item.get("text")], ensure_ascii=False)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def append_json_array(path, items, indent=4):
+    """
+    把 items 追加到 path 中 JSON 数组的末尾：截掉结尾的 ']' 后续写，
+    原文件由 json.dump(indent=indent) 生成时，结果与对完整列表 json.dump 逐字节一致。
+    """
+    pad = " " * indent
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        window = TAIL_WINDOW
+        while True:
+            start = max(0, size - window)
+            f.seek(start)
+            body = f.read().rstrip()
+            if not body.endswith(b"]"):
+                raise ValueError(f"{path} 不是以 ']' 结尾的 JSON 数组")
+            body = body[:-1].rstrip()
+            if body or start == 0:
+                break
+            window *= 4
+        if not body:
+            raise ValueError(f"{path} 不是以 ']' 结尾的 JSON 数组")
+        empty = body.endswith(b"[")
+        f.seek(start + len(body))
+        f.truncate()
+
+        parts = []
+        for i, item in enumerate(items):
+            text = json.dumps(item, ensure_ascii=False, indent=indent).replace("\n", "\n" + pad)
+            parts.append(("\n" if empty and i == 0 else ",\n") + pad + text)
+        parts.append("\n]" if items or not empty else "]")
+        f.write("".join(parts).encode("utf-8"))
+
+
+class MergeIndex:
+    def __init__(self, main_file, journal_dir=DEFAULT_JOURNAL_DIR):
+        self.main_file = Path(main_file)
+        self.journal_dir = Path(journal_dir)
+        self.keys_file = self.journal_dir / f"{self.main_file.stem}.keys.sqlite"
+
+    def _stat(self):
+        st = self.main_file.stat()
+        return st.st_size, st.st_mtime_ns
+
+    def _connect(self):
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.keys_file)
+        conn.execute("CREATE TABLE IF NOT EXISTS keys (k BLOB PRIMARY KEY) WITHOUT ROWID")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (size INTEGER, mtime_ns INTEGER)")
+        return conn
+
+    def _is_current(self, conn):
+        return conn.execute("SELECT size, mtime_ns FROM meta").fetchone() == self._stat()
+
+    def _save_meta(self, conn):
+        conn.execute("DELETE FROM meta")
+        conn.execute("INSERT INTO meta VALUES (?, ?)", self._stat())
+
+    def _rebuild(self, conn):
+        count = 0
+
+        def keys():
+            nonlocal count
+            for item in iter_json_entries(self.main_file):
+                if isinstance(item, dict):
+                    count += 1
+                    yield (bytes.fromhex(record_key(item)),)
+
+        with conn:
+            conn.execute("DELETE FROM keys")
+            conn.executemany("INSERT OR IGNORE INTO keys VALUES (?)", keys())
+            self._save_meta(conn)
+        return count
+
+    def rebuild(self):
+        """从主文件流式重建索引，返回条目数"""
+        conn = self._connect()
+        try:
+            return self._rebuild(conn)
+        finally:
+            conn.close()
+
+    def merge(self, records):
+        """
+        把 records 中主文件尚未包含的条目追加到主文件，返回 (inserted, skipped)。
+        同一批次内重复的条目也计为 skipped。
+        """
+        if not self.main_file.exists():
+            self.main_file.parent.mkdir(parents=True, exist_ok=True)
+            self.main_file.write_text("[]", encoding="utf-8")
+        conn = self._connect()
+        try:
+            if not self._is_current(conn):
+                print(f"重建 {self.main_file} 的去重索引……")
+                self._rebuild(conn)
+
+            new_items = []
+            new_keys = set()
+            skipped = 0
+            batch = []
+
+            def flush():
+                nonlocal skipped
+                placeholders = ",".join("?" * len(batch))
+                found = {row[0] for row in conn.execute(f"SELECT k FROM keys WHERE k IN ({placeholders})",
+                                                        [key for key, _ in batch])}
+                for key, item in batch:
+                    if key in found or key in new_keys:
+                        skipped += 1
+                        continue
+                    new_keys.add(key)
+                    new_items.append(item)
+                batch.clear()
+
+            for item in records:
+                batch.append((bytes.fromhex(record_key(item)), item))
+                if len(batch) >= LOOKUP_BATCH:
+                    flush()
+            if batch:
+                flush()
+
+            if new_items:
+                # 先追加主文件，再在一个事务中写入新键与 meta；中途中断时 meta 不匹配，下次会重建索引
+                append_json_array(self.main_file, new_items)
+                with conn:
+                    conn.executemany("INSERT OR IGNORE INTO keys VALUES (?)", ((key,) for key in new_keys))
+                    self._save_meta(conn)
+            return len(new_items), skipped
+        finally:
+            conn.close()
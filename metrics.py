@@ -0,0 +1,197 @@
+"""爬虫的逐页面耗时记录与运行指标。
+
+每个页面的每次尝试对应一个 PageSpan，按阶段记录耗时：
+    rate_limit   等待令牌桶
+    navigate     driver.get
+    wait         等待结构 A / B 出现
+    expand       逐个点击“展开”按钮
+    page_source  取回渲染后的整页 HTML（含写入页面缓存）
+    parse        解析 HTML
+    script       注入脚本完成展开与提取（extract_mode="script"）
+    filter / collect   URL 列表页的筛选与链接收集（get_urls）
+结束后以 JSON 行追加到 `metrics/<运行名>_<开始时间>.jsonl`：
+    {"ts", "run", "url", "title", "attempt", "ok", "cause", "detail", "records": {...}, "phases": {...}, "total"}
+运行结束时 RunMetrics.finish 打印各阶段 p50/p95/p99 与每分钟页面数，
+并把同样的汇总以 Prometheus 文本格式原子写入 `metrics/<运行名>.prom`，供 node_exporter 的 textfile 采集。
+"""
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULT_METRICS_DIR = "metrics"
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class PageSpan:
+    """一个页面的一次尝试"""
+
+    def __init__(self, url, title, attempt=1):
+        self.url = url
+        self.title = title
+        self.attempt = attempt
+        self.phases = {}
+        self.records = {}
+        self.cause = None
+        self.detail = None
+        self.started = time.monotonic()
+        self.elapsed = None
+
+    def add(self, phase_name, seconds):
+        self.phases[phase_name] = self.phases.get(phase_name, 0.0) + seconds
+
+    def to_json(self, run):
+        return {"ts": round(time.time(), 3), "run": run, "url": self.url, "title": self.title,
+                "attempt": self.attempt, "ok": self.cause is None, "cause": self.cause, "detail": self.detail,
+                "records": self.records, "phases": {k: round(v, 4) for k, v in self.phases.items()},
+                "total": round(self.elapsed, 4)}
+
+
+@contextmanager
+def phase(span, name):
+    """记录 with 块的耗时到 span 的某个阶段；span 为 None 时不记录"""
+    if span is None:
+        yield
+        return
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        span.add(name, time.monotonic() - started)
+
+
+def percentile(sorted_values, q):
+    """最近秩百分位数"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class RunMetrics:
+    """一次运行的指标：多个 worker 线程共用，record 线程安全"""
+
+    def __init__(self, run, metrics_dir=DEFAULT_METRICS_DIR):
+        self.run = run
+        self.metrics_dir = Path(metrics_dir)
+        self.metrics_dir.mkdir(parents=True, exist_ok=True)
+        self.started_wall = time.time()
+        self.started = time.monotonic()
+        self.events_file = self.metrics_dir / f"{run}_{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+        self.spans = []
+        self._lock = threading.Lock()
+        self._f = open(self.events_file, "a", encoding="utf-8")
+
+    def page(self, url, title, attempt=1):
+        return PageSpan(url, title, attempt)
+
+    def record(self, span, cause=None, detail=None, **records):
+        """结束一个 span：cause 为 None 表示成功，records 为提取条数（如 dialogues=、narratives=）"""
+        span.elapsed = time.monotonic() - span.started
+        span.cause = cause
+        span.detail = detail
+        span.records = records
+        line = json.dumps(span.to_json(self.run), ensure_ascii=False)
+        with self._lock:
+            self.spans.append(span)
+            self._f.write(line + "\n")
+            self._f.flush()
+
+    def summary(self):
+        """{pages, succeeded, retries, failures: {原因: 次数}, records, phases: {阶段: {count, sum, p50...}}, ...}"""
+        with self._lock:
+            spans = list(self.spans)
+        elapsed = time.monotonic() - self.started
+        succeeded = sum(1 for s in spans if s.cause is None)
+        failures = {}
+        records = {}
+        by_phase = {}
+        for s in spans:
+            if s.cause is not None:
+                failures[s.cause] = failures.get(s.cause, 0) + 1
+            for k, v in s.records.items():
+                records[k] = records.get(k, 0) + v
+            for name, seconds in s.phases.items():
+                by_phase.setdefault(name, []).append(seconds)
+            by_phase.setdefault("total", []).append(s.elapsed)
+        phases = {}
+        for name, values in by_phase.items():
+            values.sort()
+            phases[name] = {"count": len(values), "sum": sum(values),
+                            **{f"p{int(q * 100)}": percentile(values, q) for q in QUANTILES}}
+        return {"pages": len(spans), "succeeded": succeeded, "retries": sum(1 for s in spans if s.attempt > 1),
+                "failures": failures, "records": records, "phases": phases, "elapsed": elapsed,
+                "pages_per_minute": succeeded / elapsed * 60 if elapsed > 0 else 0.0}
+
+    def write_prometheus(self, summary):
+        """把汇总以 Prometheus 文本格式原子写入 <运行名>.prom"""
+        run = self.run
+        out = [
+            "# HELP crawler_last_run_pages Page attempts in the last run by outcome.",
+            "# TYPE crawler_last_run_pages gauge",
+            f"crawler_last_run_pages{_labels(run=run, outcome='ok')} {summary['succeeded']}",
+            f"crawler_last_run_pages{_labels(run=run, outcome='failed')} {summary['pages'] - summary['succeeded']}",
+            "# HELP crawler_last_run_retries Retry attempts in the last run.",
+            "# TYPE crawler_last_run_retries gauge",
+            f"crawler_last_run_retries{_labels(run=run)} {summary['retries']}",
+            "# HELP crawler_last_run_failures Failed attempts in the last run by cause.",
+            "# TYPE crawler_last_run_failures gauge",
+        ]
+        out += [f"crawler_last_run_failures{_labels(run=run, cause=c)} {n}" for c, n in sorted(summary["failures"].items())]
+        out += ["# HELP crawler_last_run_records Records extracted in the last run by kind.",
+                "# TYPE crawler_last_run_records gauge"]
+        out += [f"crawler_last_run_records{_labels(run=run, kind=k)} {n}" for k, n in sorted(summary["records"].items())]
+        out += ["# HELP crawler_phase_seconds Per-page phase duration in the last run.",
+                "# TYPE crawler_phase_seconds summary"]
+        for name, p in sorted(summary["phases"].items()):
+            for q in QUANTILES:
+                out.append(f"crawler_phase_seconds{_labels(run=run, phase=name, quantile=q)} "
+                           f"{p[f'p{int(q * 100)}']:.6f}")
+            out.append(f"crawler_phase_seconds_sum{_labels(run=run, phase=name)} {p['sum']:.6f}")
+            out.append(f"crawler_phase_seconds_count{_labels(run=run, phase=name)} {p['count']}")
+        out += ["# HELP crawler_pages_per_minute Successful pages per minute in the last run.",
+                "# TYPE crawler_pages_per_minute gauge",
+                f"crawler_pages_per_minute{_labels(run=run)} {summary['pages_per_minute']:.3f}",
+                "# HELP crawler_run_duration_seconds Wall-clock duration of the last run.",
+                "# TYPE crawler_run_duration_seconds gauge",
+                f"crawler_run_duration_seconds{_labels(run=run)} {summary['elapsed']:.3f}",
+                "# HELP crawler_last_run_timestamp_seconds Unix time the last run started.",
+                "# TYPE crawler_last_run_timestamp_seconds gauge",
+                f"crawler_last_run_timestamp_seconds{_labels(run=run)} {self.started_wall:.0f}"]
+        path = self.metrics_dir / f"{run}.prom"
+        tmp = self.metrics_dir / f"{run}.prom.tmp"
+        tmp.write_text("\n".join(out) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+        return path
+
+    def finish(self):
+        """关闭事件文件，打印汇总并写出 Prometheus 指标文件"""
+        with self._lock:
+            self._f.close()
+        summary = self.summary()
+        print(f"===== 运行指标 [{self.run}] =====")
+        print(f"  页面尝试: {summary['pages']}，成功: {summary['succeeded']}，重试: {summary['retries']}，"
+              f"{summary['pages_per_minute']:.1f} 页/分钟")
+        if summary["failures"]:
+            print("  失败原因: " + "，".join(f"{c} {n}" for c, n in sorted(summary["failures"].items())))
+        if summary["records"]:
+            print("  提取条数: " + "，".join(f"{k} {n}" for k, n in sorted(summary["records"].items())))
+        for name, p in sorted(summary["phases"].items(), key=lambda x: -x[1]["sum"]):
+            print(f"  {name:<12} n={p['count']:<6} p50 {p['p50'] * 1000:8.0f} ms  p95 {p['p95'] * 1000:8.0f} ms  "
+                  f"p99 {p['p99'] * 1000:8.0f} ms  合计 {p['sum']:.1f} s")
+        try:
+            path = self.write_prometheus(summary)
+            print(f"  逐页面记录: {self.events_file}，Prometheus 指标: {path}")
+        except Exception as e:
+            print(f"写入指标文件失败: {e}")
+        return summary
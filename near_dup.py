@@ -0,0 +1,297 @@
+"""语料级近似重复检测：MinHash 签名 + 局部敏感哈希（LSH）。
+
+同一句台词常出现多次：主页面解析一次，旁白找回（extraction/extracted_from_*.json）又一次，
+复用场景的任务之间也会重复，且往往只差标点（“……” 与 “⋯⋯”、全角与半角）。
+
+1. 归一化：NFKC、转小写后去掉全部标点、符号与空白，两种省略号都会被去掉；
+   归一化后少于 min_chars 个字的台词（“嗯。”“……”）不参与检测，始终保留。
+2. 各分类在进程池中并行扫描（主对话文件与该分类的提取文件），归一化文本相同的记录只计算一次签名：
+   签名取字 n 元组（默认三元组）在 num_perm 个哈希函数下各自的最小值。
+3. 签名分为 bands 段，(说话人, 段号, 段内容) 的哈希相同即为候选；逐段处理，每段只保留一个桶表，
+   候选与桶内第一个签名比较，估计的 Jaccard 相似度不低于 threshold 时用并查集合并。
+   耗时与内存都与记录数近似成线性。--ignore-speaker 时不同说话人的相同台词也视为重复。
+
+输出（--out-dir，默认 dedup/）：
+    clusters.jsonl                每行一个重复簇 {"id", "size", "categories", "members": [...]}，成员按源文件顺序
+    dialogue_data_<分类>.json     --write-dedup 时写出去重后的语料，每个簇只保留第一条
+
+用法:
+    python near_dup.py
+    python near_dup.py --category archons --threshold 0.7 --write-dedup
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import unicodedata
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from corpus_loader import DEFAULT_DIALOGUE_DIR, DEFAULT_SPEAKER_DIR, find_sources
+from extract_and_merge import CATEGORIES, extracted_file_for
+from group_by_speaker import iter_json_entries, normalize_speaker_name
+
+DEFAULT_OUT_DIR = "dedup"
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_SHINGLE = 3
+DEFAULT_MIN_CHARS = 5
+CLUSTERS_NAME = "clusters.jsonl"
+# 元组置换值缓存的条目上限（每条约 num_perm × 4 字节）
+SHINGLE_CACHE_SIZE = 200000
+
+
+def normalize_text(text):
+    """NFKC、小写，去掉标点（P*）、符号（S*）、空白与分隔符（Z*）及控制字符"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(c for c in text if unicodedata.category(c)[0] not in "PSZC")
+
+
+def shingles(text, n=DEFAULT_SHINGLE):
+    """字 n 元组集合；不足 n 个字时整段作为一个元组"""
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class MinHasher:
+    """
+    计算 MinHash 签名。每个元组用 shake_128(种子, 元组) 一次生成 num_perm 个 32 位哈希，相当于 num_perm 个独立的哈希函数，
+    签名即各列的最小值。元组的哈希值在进程内缓存，反复出现的元组只计算一次；
+    不依赖 hash() 的随机种子，各进程结果一致。
+    """
+
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, shingle=DEFAULT_SHINGLE, seed=0, cache_size=SHINGLE_CACHE_SIZE):
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self.prefix = f"{seed}:".encode("utf-8")
+        self.cache_size = cache_size
+        self._values = {}
+
+    def _hashes(self, s):
+        values = self._values.get(s)
+        if values is None:
+            if len(self._values) >= self.cache_size:
+                self._values.clear()
+            values = array("I")
+            values.frombytes(hashlib.shake_128(self.prefix + s.encode("utf-8")).digest(4 * self.num_perm))
+            self._values[s] = values
+        return values
+
+    def signature(self, text):
+        return array("I", map(min, zip(*[self._hashes(s) for s in shingles(text, self.shingle)])))
+
+
+def band_keys(speaker, signature, bands):
+    """每段一个 64 位键：说话人、段号与段内签名一起哈希，不同说话人不会落入同一个桶"""
+    rows = len(signature) // bands
+    prefix = speaker.encode("utf-8") + b"\x00"
+    keys = array("Q")
+    for i in range(bands):
+        raw = prefix + i.to_bytes(2, "big") + signature[i * rows:(i + 1) * rows].tobytes()
+        keys.append(int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big"))
+    return keys
+
+
+def similarity(a, b):
+    """两个签名的估计 Jaccard 相似度"""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def sources_by_category(dialogue_dir=DEFAULT_DIALOGUE_DIR, speaker_dir=DEFAULT_SPEAKER_DIR, categories=None):
+    """分类 -> 源文件列表：主对话文件（规则同 corpus_loader.find_sources）在前，该分类的提取文件在后"""
+    sources = {c: list(paths) for c, paths in find_sources(dialogue_dir, speaker_dir).items()}
+    for category in list(sources) + [c for c in CATEGORIES if c not in sources]:
+        extracted = Path(extracted_file_for(category))
+        if extracted.exists():
+            sources.setdefault(category, []).append(extracted)
+    return {c: paths for c, paths in sources.items() if not categories or c in categories}
+
+
+def scan_category(task):
+    """
+    进程池 worker：扫描一个分类的全部源文件。
+    返回 (refs, uniques)：refs 为 array('I')，每条参与检测的记录占三项 (文件序号, 条目序号, 分类内唯一文本编号)；
+    uniques 为 [(签名字节, 段键字节)]，按唯一文本编号排列。
+    """
+    paths, num_perm, bands, shingle, min_chars, ignore_speaker, seed = task
+    hasher = MinHasher(num_perm, shingle, seed)
+    refs = array("I")
+    ids = {}
+    uniques = []
+    for file_idx, path in enumerate(paths):
+        for n, item in enumerate(iter_json_entries(path)):
+            if not isinstance(item, dict) or not isinstance(item.get("text"), str):
+                continue
+            text = normalize_text(item["text"])
+            if len(text) < min_chars:
+                continue
+            speaker = "" if ignore_speaker else normalize_speaker_name(item.get("speaker")) or ""
+            key = (speaker, text)
+            uid = ids.get(key)
+            if uid is None:
+                uid = ids[key] = len(uniques)
+                signature = hasher.signature(text)
+                uniques.append((signature.tobytes(), band_keys(speaker, signature, bands).tobytes()))
+            refs.extend((file_idx, n, uid))
+    return refs, uniques
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = array("I", range(n))
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            # 编号小的作为根，簇的代表与扫描顺序一致
+            if b < a:
+                a, b = b, a
+            self.parent[b] = a
+        return a != b
+
+
+def link_candidates(signatures, keys, bands, threshold):
+    """逐段分桶，候选与桶内第一个签名比较，返回 (并查集, 比较次数)"""
+    uf = UnionFind(len(signatures))
+    compared = 0
+    for band in range(bands):
+        bucket = {}
+        for uid, k in enumerate(keys):
+            key = k[band]
+            first = bucket.setdefault(key, uid)
+            if first == uid or uf.find(first) == uf.find(uid):
+                continue
+            compared += 1
+            if similarity(signatures[first], signatures[uid]) >= threshold:
+                uf.union(first, uid)
+    return uf, compared
+
+
+def detect(dialogue_dir=DEFAULT_DIALOGUE_DIR, speaker_dir=DEFAULT_SPEAKER_DIR, categories=None,
+           out_dir=DEFAULT_OUT_DIR, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS,
+           shingle=DEFAULT_SHINGLE, min_chars=DEFAULT_MIN_CHARS, ignore_speaker=False, write_dedup=False,
+           jobs=None, seed=0):
+    """执行检测，写出 clusters.jsonl（以及去重语料），返回统计信息"""
+    if num_perm % bands:
+        raise ValueError(f"num_perm ({num_perm}) 必须是 bands ({bands}) 的整数倍")
+    started = time.monotonic()
+    sources = sources_by_category(dialogue_dir, speaker_dir, categories)
+    names = list(sources)
+    print(f"扫描 {len(names)} 个分类、{sum(len(p) for p in sources.values())} 个源文件")
+    tasks = [([str(p) for p in sources[c]], num_perm, bands, shingle, min_chars, ignore_speaker, seed) for c in names]
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(tasks) or 1))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(scan_category, tasks))
+
+    # 各分类的唯一文本编号平移为全局编号
+    signatures = []
+    keys = []
+    offsets = []
+    for _, uniques in results:
+        offsets.append(len(signatures))
+        for sig, band in uniques:
+            signatures.append(array("I", sig))
+            keys.append(array("Q", band))
+    records = sum(len(refs) // 3 for refs, _ in results)
+    print(f"参与检测 {records} 条，归一化后 {len(signatures)} 条不同的台词")
+
+    uf, compared = link_candidates(signatures, keys, bands, threshold)
+
+    # 根 -> [(分类序号, 文件序号, 条目序号)]，只保留多于一条记录的簇
+    members = {}
+    for c, (refs, _) in enumerate(results):
+        base = offsets[c]
+        for i in range(0, len(refs), 3):
+            members.setdefault(uf.find(base + refs[i + 2]), []).append((c, refs[i], refs[i + 1]))
+    clusters = [m for m in members.values() if len(m) > 1]
+    clusters.sort(key=lambda m: m[0])
+    cluster_of = {}
+    for cid, m in enumerate(clusters):
+        for pos, ref in enumerate(m):
+            cluster_of[ref] = (cid, pos)
+
+    # 第二遍读取：取出簇成员的内容，并按需写出去重语料
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    details = [[None] * len(m) for m in clusters]
+    removed = {}
+    for c, category in enumerate(names):
+        kept = []
+        for file_idx, path in enumerate(sources[category]):
+            for n, item in enumerate(iter_json_entries(path)):
+                hit = cluster_of.get((c, file_idx, n))
+                if hit is not None:
+                    cid, pos = hit
+                    details[cid][pos] = {"category": category, "file": str(path), "index": n,
+                                         "source_title": item.get("source_title"), "speaker": item.get("speaker"),
+                                         "text": item.get("text")}
+                    if pos > 0:
+                        removed[category] = removed.get(category, 0) + 1
+                        continue
+                if write_dedup:
+                    kept.append(item)
+        if write_dedup:
+            path = out_dir / f"dialogue_data_{category}.json"
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(kept, f, ensure_ascii=False, indent=4)
+
+    tmp = out_dir / f"{CLUSTERS_NAME}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for cid, m in enumerate(details):
+            line = {"id": cid, "size": len(m), "categories": sorted({d["category"] for d in m}), "members": m}
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    os.replace(tmp, out_dir / CLUSTERS_NAME)
+
+    return {"records": records, "unique": len(signatures), "compared": compared, "clusters": len(clusters),
+            "cross_category": sum(1 for m in clusters if len({c for c, _, _ in m}) > 1),
+            "removed": removed, "elapsed": time.monotonic() - started}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MinHash/LSH 近似重复检测")
+    parser.add_argument("--dialogue-dir", default=DEFAULT_DIALOGUE_DIR)
+    parser.add_argument("--speaker-dir", default=DEFAULT_SPEAKER_DIR)
+    parser.add_argument("--out-dir", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--category", action="append", help="只检测这些分类，可重复指定；默认全部")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="估计 Jaccard 相似度阈值")
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM, help="签名长度")
+    parser.add_argument("--bands", type=int, default=DEFAULT_BANDS, help="LSH 段数，须整除签名长度")
+    parser.add_argument("--shingle", type=int, default=DEFAULT_SHINGLE, help="字 n 元组的长度")
+    parser.add_argument("--min-chars", type=int, default=DEFAULT_MIN_CHARS, help="归一化后少于该字数的台词不参与检测")
+    parser.add_argument("--ignore-speaker", action="store_true", help="不同说话人的相同台词也视为重复")
+    parser.add_argument("--write-dedup", action="store_true", help="写出去重后的语料")
+    parser.add_argument("--jobs", type=int, default=None, help="并行进程数，默认为 CPU 核数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        stats = detect(args.dialogue_dir, args.speaker_dir, args.category, args.out_dir, args.threshold,
+                       args.num_perm, args.bands, args.shingle, args.min_chars, args.ignore_speaker,
+                       args.write_dedup, args.jobs, args.seed)
+    except Exception as e:
+        print(f"近似重复检测失败: {e}")
+        sys.exit(1)
+    print(f"候选比较 {stats['compared']} 次，找到 {stats['clusters']} 个重复簇（跨分类 {stats['cross_category']} 个），"
+          f"用时 {stats['elapsed']:.1f} 秒")
+    for category, n in sorted(stats["removed"].items()):
+        print(f"  {category}: 重复 {n} 条")
+    print(f"重复簇已写入 {Path(args.out_dir) / CLUSTERS_NAME}" +
+          (f"，去重语料已写入 {args.out_dir}/" if args.write_dedup else ""))
+
+
+if __name__ == "__main__":
+    main()
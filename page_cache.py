@@ -0,0 +1,110 @@
+"""按内容寻址的原始页面缓存。
+
+每个抓取到的页面原文以 gzip 压缩后存为 `objects/<sha256 前两位>/<sha256>.html.gz`，
+相同内容只存一份；`index.jsonl` 逐行追加 url -> sha256 的映射，后写入的覆盖先写入的。
+修改解析逻辑后可以直接从缓存重新解析，无需重新爬取。
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = "cache/pages"
+
+
+class PageCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.root = Path(cache_dir)
+        self.objects_dir = self.root / "objects"
+        self.index_file = self.root / "index.jsonl"
+        self._index = None
+        self._lock = threading.Lock()
+
+    # --- 索引 ---
+    def _load_index(self):
+        if self._index is not None:
+            return self._index
+        index = {}
+        if self.index_file.exists():
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    index[entry["url"]] = entry
+        self._index = index
+        return index
+
+    def entry(self, url):
+        """返回 url 对应的索引条目 {url, sha256, size, fetched_at}，不存在时返回 None"""
+        with self._lock:
+            return self._load_index().get(url)
+
+    def __contains__(self, url):
+        return self.entry(url) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load_index())
+
+    # --- 读写 ---
+    def object_path(self, digest):
+        return self.objects_dir / digest[:2] / f"{digest}.html.gz"
+
+    def put(self, url, html):
+        """写入一个页面，返回其 sha256；内容未变时只在索引中记录一次"""
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            # mtime=0 保证相同内容得到相同的压缩文件
+            with gzip.GzipFile(tmp, "wb", mtime=0) as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+        with self._lock:
+            index = self._load_index()
+            old = index.get(url)
+            if old is not None and old["sha256"] == digest:
+                return digest
+            entry = {"url": url, "sha256": digest, "size": len(data), "fetched_at": int(time.time())}
+            index[url] = entry
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.index_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return digest
+
+    def get(self, url):
+        """读取 url 对应的页面原文，不存在时返回 None"""
+        entry = self.entry(url)
+        if entry is None:
+            return None
+        return read_object(self.object_path(entry["sha256"]))
+
+    def compact_index(self):
+        """重写索引，每个 url 只保留最新一行"""
+        with self._lock:
+            index = self._load_index()
+            tmp = self.index_file.with_suffix(".jsonl.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                for entry in index.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.index_file)
+
+
+def read_object(path):
+    """读取一个缓存对象；文件缺失时返回 None"""
+    try:
+        with gzip.open(path, "rb") as f:
+            return f.read().decode("utf-8")
+    except FileNotFoundError:
+        return None
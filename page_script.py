@@ -0,0 +1,103 @@
+"""页面内注入脚本：一次性展开并提取对话。
+
+html 模式下每个“展开”按钮都要一次 execute_script 往返、再等待 DOM 变化，最后还要传回整页 HTML 重新解析。
+EXTRACT_SCRIPT 通过 execute_async_script 注入一次：在页面内点击所有折叠按钮，
+用 MutationObserver 等到 DOM 在 quiet_ms 内不再变化（新出现的按钮继续点击），
+然后按与 dialogue_parser 相同的规则收集结构 A / B 的段落 [block_id, branch_id, 文本]，以 JSON 形式直接返回。
+"""
+from dialogue_parser import (DIALOGUE_AREA_CLASS, DIALOGUE_NODE_CLASS, FOLD_MODULE_CLASS, FOLD_TARGET_TITLE,
+                             FOLD_TITLE_CLASS, page_id_from_url, records_from_paragraphs)
+
+DEFAULT_QUIET_MS = 300      # DOM 连续无变化多久视为展开完成
+DEFAULT_MAX_MS = 8000       # 展开阶段的最长等待时间
+
+EXTRACT_SCRIPT = """
+const [quietMs, maxMs, areaClass, nodeClass, foldClass, foldTitleClass, targetTitle] = arguments;
+const done = arguments[arguments.length - 1];
+
+// 与 BeautifulSoup get_text(strip=True) 相同：各文本节点 trim 后拼接，忽略 script/style/template
+function textOf(el) {
+    const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+    const parts = [];
+    for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+        if (node.parentElement && node.parentElement.closest('script,style,template')) continue;
+        const t = node.nodeValue.trim();
+        if (t) parts.push(t);
+    }
+    return parts.join('');
+}
+
+function expandAll() {
+    const found = new Set(document.querySelectorAll(`.${areaClass} .obc-tmpl__expand-text`));
+    const xp = document.evaluate(`//div[contains(@class,'${areaClass}')]//*[contains(text(),'展开')]`,
+        document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    for (let i = 0; i < xp.snapshotLength; i++) found.add(xp.snapshotItem(i));
+    let clicked = 0;
+    for (const btn of found) {
+        if (btn.dataset.dialogueExpanded) continue;
+        btn.dataset.dialogueExpanded = '1';
+        try { btn.click(); clicked++; } catch (e) {}
+    }
+    return clicked;
+}
+
+function extract() {
+    const fold = [];
+    let block = 0;
+    for (const module of document.querySelectorAll(`div.${foldClass}`)) {
+        const title = module.querySelector(`div.${foldTitleClass}`) || module.querySelector('span');
+        if (!title || !textOf(title).includes(targetTitle)) continue;
+        for (const p of module.querySelectorAll('p')) fold.push([block, 0, textOf(p)]);
+        block++;
+    }
+    const interactive = [];
+    document.querySelectorAll(`div.${areaClass}`).forEach((container, ci) => {
+        container.querySelectorAll(`div.${nodeClass}`).forEach((box, bi) => {
+            for (const p of box.querySelectorAll('p')) interactive.push([ci, bi, textOf(p)]);
+        });
+    });
+    return {fold: fold, interactive: interactive};
+}
+
+const started = Date.now();
+let clicks = expandAll();
+let timer = null;
+let finished = false;
+const observer = new MutationObserver(() => {
+    clearTimeout(timer);
+    timer = setTimeout(settle, quietMs);
+});
+function settle(force) {
+    if (finished) return;
+    // 展开后可能出现新的折叠按钮，继续点击直到没有新按钮或超时
+    const more = expandAll();
+    clicks += more;
+    if (!force && more && Date.now() - started < maxMs) {
+        timer = setTimeout(settle, quietMs);
+        return;
+    }
+    finished = true;
+    clearTimeout(timer);
+    observer.disconnect();
+    const result = extract();
+    result.clicks = clicks;
+    result.elapsedMs = Date.now() - started;
+    done(result);
+}
+observer.observe(document.body, {childList: true, subtree: true, characterData: true, attributes: true});
+timer = setTimeout(settle, clicks ? quietMs : 0);
+setTimeout(() => settle(true), maxMs);
+"""
+
+
+def extract_with_script(driver, dialogue_title, url=None, quiet_ms=DEFAULT_QUIET_MS, max_ms=DEFAULT_MAX_MS):
+    """
+    在当前页面注入 EXTRACT_SCRIPT，返回 (dialogue_list, narrative_list, 点击的按钮数)。
+    调用前页面应已加载到结构 A 或 B 出现；url 用于记录 page_id。
+    """
+    driver.set_script_timeout(max_ms / 1000 + 5)
+    payload = driver.execute_async_script(EXTRACT_SCRIPT, quiet_ms, max_ms, DIALOGUE_AREA_CLASS, DIALOGUE_NODE_CLASS,
+                                          FOLD_MODULE_CLASS, FOLD_TITLE_CLASS, FOLD_TARGET_TITLE)
+    dialogue_list, narrative_list = records_from_paragraphs(payload.get("fold", []), payload.get("interactive", []),
+                                                            dialogue_title, page_id_from_url(url))
+    return dialogue_list, narrative_list, payload.get("clicks", 0)
@@ -0,0 +1,231 @@
+"""一条命令刷新全部分类：get_urls -> get_dialogue -> extract -> merge -> speaker_view build。
+
+每个分类各有 urls / dialogue / extract / merge 四个阶段，全部分类的 merge 完成后运行一次 group。
+阶段之间按依赖关系调度，不同分类的阶段在线程池中同时运行，每个阶段以子进程运行对应脚本的 CLI，
+输出写入 journal/pipeline/<阶段>_<分类>.log。
+
+各脚本出错时以非 0 退出码结束；退出码为 0 但缺少输出的阶段同样视为失败。
+阶段成功后写入 journal/pipeline/<阶段>_<分类>.stamp，失败时写入 .failed。阶段在依赖完成后才检查是否需要运行：
+上次没有失败、输出都存在，且完成时间（stamp 的修改时间，没有 stamp 时取输出中最旧的修改时间）
+不早于所有输入时跳过。
+    urls       输入: 无                      输出: urls/dialogue_urls_<分类>.csv
+    dialogue   输入: URL 列表                输出: dialogue/dialogue_data_<分类>.json、narration/narrative_data_<分类>.txt
+    extract    输入: 旁白 TXT                输出: extraction/extracted_from_<分类>.json
+    merge      输入: 提取文件                输出: （只有 stamp，主对话文件同时是 dialogue 的输出）
+    group      输入: 各分类的主对话文件      输出: dialogue/speaker.idx（speaker/ 副本按需运行 group_by_speaker.py 生成）
+
+用法:
+    python pipeline.py                      # 全部分类，跳过已是最新的阶段
+    python pipeline.py --category world --force dialogue --mode selenium --workers 4
+    python pipeline.py --dry-run
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from extract_and_merge import CATEGORIES, extracted_file_for, main_file_for, narrative_file_for
+from get_urls import output_file_for as url_file_for
+
+ROOT = Path(__file__).resolve().parent
+PIPELINE_DIR = Path("journal") / "pipeline"
+STAGES = ("urls", "dialogue", "extract", "merge", "group")
+LOG_TAIL_LINES = 20
+
+
+class Stage:
+    def __init__(self, kind, category, deps, inputs, outputs, command):
+        self.kind = kind
+        self.category = category
+        self.deps = deps
+        self.inputs = inputs
+        self.outputs = outputs
+        self.command = command
+
+    @property
+    def name(self):
+        return f"{self.kind}:{self.category}" if self.category else self.kind
+
+    @property
+    def stamp(self):
+        return ROOT / PIPELINE_DIR / f"{self.name.replace(':', '_')}.stamp"
+
+    @property
+    def failed_marker(self):
+        return ROOT / PIPELINE_DIR / f"{self.name.replace(':', '_')}.failed"
+
+    @property
+    def log(self):
+        return ROOT / PIPELINE_DIR / f"{self.name.replace(':', '_')}.log"
+
+    def up_to_date(self):
+        """上次没有失败，输出都存在且完成时间不早于所有输入"""
+        outputs = [ROOT / p for p in self.outputs]
+        if self.failed_marker.exists() or not all(p.exists() for p in outputs):
+            return False
+        if self.stamp.exists():
+            finished = self.stamp.stat().st_mtime
+        elif outputs:
+            finished = min(p.stat().st_mtime for p in outputs)
+        else:
+            return False
+        inputs = [ROOT / p for p in self.inputs]
+        if not all(p.exists() for p in inputs):
+            return False
+        return all(p.stat().st_mtime <= finished for p in inputs)
+
+    def run(self):
+        """以子进程运行，返回 (退出码, 耗时)；退出码为 0 但缺少输出时退出码记为“缺少输出”"""
+        self.log.parent.mkdir(parents=True, exist_ok=True)
+        started = time.monotonic()
+        with open(self.log, "w", encoding="utf-8") as log:
+            code = subprocess.run(self.command, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+                                  env={**os.environ, "PYTHONUNBUFFERED": "1"}).returncode
+            missing = [p for p in self.outputs if not (ROOT / p).exists()]
+            if code == 0 and missing:
+                # 退出码为 0 但没有产出输出，同样视为失败
+                log.write(f"\n[pipeline] 阶段退出码为 0，但缺少输出: {', '.join(missing)}\n")
+                code = "缺少输出"
+        if code == 0:
+            self.failed_marker.unlink(missing_ok=True)
+            self.stamp.touch()
+        else:
+            # 失败的阶段可能留下了不完整的输出，下次无论修改时间如何都重新运行
+            self.stamp.unlink(missing_ok=True)
+            self.failed_marker.touch()
+        return code, time.monotonic() - started
+
+
+def build_stages(categories, mode="http", workers=1, browser_profile=None, jobs=None):
+    """按分类生成阶段列表（依赖在前）"""
+    py = sys.executable
+    profile = ["--browser-profile", browser_profile] if browser_profile else []
+    job_args = ["--jobs", str(jobs)] if jobs else []
+    stages = []
+    for c in categories:
+        url_file = url_file_for(c)
+        stages += [
+            Stage("urls", c, [], [], [url_file],
+                  [py, "get_urls.py", "--category", c] + profile),
+            Stage("dialogue", c, [f"urls:{c}"], [url_file], [main_file_for(c), narrative_file_for(c)],
+                  [py, "get_dialogue.py", "--category", c, "--mode", mode, "--workers", str(workers)] + profile),
+            Stage("extract", c, [f"dialogue:{c}"], [narrative_file_for(c)], [extracted_file_for(c)],
+                  [py, "extract_and_merge.py", "--category", c, "--extract", "--no-merge"] + job_args),
+            Stage("merge", c, [f"extract:{c}"], [extracted_file_for(c)], [],
+                  [py, "extract_and_merge.py", "--category", c]),
+        ]
+    stages.append(Stage("group", None, [f"merge:{c}" for c in categories], [main_file_for(c) for c in categories],
+                        ["dialogue/speaker.idx"], [py, "speaker_view.py", "build"]))
+    return stages
+
+
+def tail(path, n=LOG_TAIL_LINES):
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.readlines()[-n:]
+    except OSError:
+        return []
+
+
+def run_pipeline(stages, selected=STAGES, force=(), parallel=len(CATEGORIES), dry_run=False):
+    """
+    按依赖调度阶段。selected 之外的阶段视为已完成；force 中的阶段类型不检查是否最新。
+    返回 {阶段名: 状态}，状态为 ran / skipped / failed / blocked / excluded
+    """
+    by_name = {s.name: s for s in stages}
+    status = {}
+    for s in stages:
+        if s.kind not in selected:
+            status[s.name] = "excluded"
+    done = {"ran", "skipped", "excluded"}
+
+    def ready(s):
+        return all(status.get(d) in done for d in s.deps)
+
+    def blocked(s):
+        return any(status.get(d) in ("failed", "blocked") for d in s.deps)
+
+    if dry_run:
+        # 按依赖顺序估计：上游会运行的阶段，下游也会运行
+        for s in stages:
+            if s.name in status:
+                continue
+            upstream = any(status.get(d) == "ran" for d in s.deps)
+            status[s.name] = "ran" if upstream or s.kind in force or not s.up_to_date() else "skipped"
+            print(f"  {s.name:<16} {'需要运行' if status[s.name] == 'ran' else '已是最新'}")
+        return status
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        while True:
+            for s in stages:
+                if s.name in status or s.name in running.values():
+                    continue
+                if blocked(s):
+                    status[s.name] = "blocked"
+                    print(f"[跳过] {s.name}：上游阶段失败")
+                elif ready(s):
+                    if s.kind not in force and s.up_to_date():
+                        status[s.name] = "skipped"
+                        print(f"[最新] {s.name}")
+                    else:
+                        print(f"[开始] {s.name}: {' '.join(s.command[1:])}")
+                        running[pool.submit(s.run)] = s.name
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    code, elapsed = future.result()
+                except Exception as e:
+                    code, elapsed = str(e), 0.0
+                if code == 0:
+                    status[name] = "ran"
+                    print(f"[完成] {name}，用时 {elapsed:.1f} 秒")
+                else:
+                    status[name] = "failed"
+                    print(f"[失败] {name}（{code}），日志: {by_name[name].log}")
+                    for line in tail(by_name[name].log):
+                        print(f"    {line.rstrip()}")
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按依赖关系并行刷新全部分类的 URL、对话、提取、合并与分组")
+    parser.add_argument("--category", action="append", choices=CATEGORIES,
+                        help="只处理这些分类，可重复指定；默认全部")
+    parser.add_argument("--stage", action="append", choices=STAGES,
+                        help="只运行这些阶段，可重复指定；未选中的阶段视为已完成")
+    parser.add_argument("--force", action="append", choices=STAGES + ("all",), default=[],
+                        help="这些阶段即使已是最新也重新运行，可重复指定")
+    parser.add_argument("--parallel", type=int, default=len(CATEGORIES), help="同时运行的阶段数")
+    parser.add_argument("--mode", choices=("http", "selenium"), default="http", help="get_dialogue 的抓取模式")
+    parser.add_argument("--workers", type=int, default=1, help="selenium 模式下每个分类的无头浏览器数量")
+    parser.add_argument("--browser-profile", default=None, help="传给 get_urls / get_dialogue 的浏览器配置")
+    parser.add_argument("--jobs", type=int, default=None, help="extract 阶段的进程数")
+    parser.add_argument("--dry-run", action="store_true", help="只显示各阶段是否需要运行")
+    args = parser.parse_args()
+
+    categories = args.category or list(CATEGORIES)
+    force = STAGES if "all" in args.force else tuple(args.force)
+    stages = build_stages(categories, args.mode, args.workers, args.browser_profile, args.jobs)
+    started = time.monotonic()
+    status = run_pipeline(stages, args.stage or STAGES, force, max(1, args.parallel), args.dry_run)
+    if args.dry_run:
+        return
+
+    counts = {}
+    for st in status.values():
+        counts[st] = counts.get(st, 0) + 1
+    print(f"流水线结束，用时 {time.monotonic() - started:.1f} 秒：" +
+          "，".join(f"{k} {v}" for k, v in sorted(counts.items())))
+    if counts.get("failed") or counts.get("blocked"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""自适应令牌桶限速器。
+
+每个 host 一个令牌桶，请求前取令牌；请求结束后回报耗时与成败，
+按 AIMD 调整速率：正常时线性加速，延迟明显高于基线时小幅减速，出错时减半。
+Selenium 线程与 asyncio 抓取共用同一套限速器，运行结束时可打印实际请求速率。
+"""
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_RATE = 2.0          # 初始速率 (请求/秒)
+DEFAULT_MIN_RATE = 0.2
+DEFAULT_MAX_RATE = 8.0
+DEFAULT_BURST = 2.0
+INCREASE_STEP = 0.2         # 每次正常响应增加的速率
+SLOW_FACTOR = 0.8           # 延迟超过基线 SLOW_LATENCY_RATIO 倍时的减速系数
+ERROR_FACTOR = 0.5          # 出错时的减速系数
+SLOW_LATENCY_RATIO = 2.0
+LATENCY_SMOOTHING = 0.2     # 延迟基线的 EWMA 平滑系数
+
+
+class AdaptiveRateLimiter:
+    """线程安全的令牌桶，速率随观测到的延迟与错误率自动调整"""
+
+    def __init__(self, rate=DEFAULT_RATE, min_rate=DEFAULT_MIN_RATE, max_rate=DEFAULT_MAX_RATE,
+                 burst=DEFAULT_BURST):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+        self.baseline_latency = None
+        self.requests = 0
+        self.errors = 0
+        self.started = None
+        self.finished = None
+
+    def _reserve(self):
+        """预留一个令牌，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            if self.started is None:
+                self.started = now
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """阻塞直到取得令牌 (Selenium 线程使用)"""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """协程版本，等待期间不阻塞事件循环"""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record(self, latency, ok=True):
+        """回报一次请求的耗时与成败，并据此调整速率"""
+        with self._lock:
+            self.requests += 1
+            self.finished = time.monotonic()
+            if not ok:
+                self.errors += 1
+                self.rate = max(self.min_rate, self.rate * ERROR_FACTOR)
+                return
+
+            if self.baseline_latency is None:
+                self.baseline_latency = latency
+            slow = latency > self.baseline_latency * SLOW_LATENCY_RATIO
+            self.baseline_latency += LATENCY_SMOOTHING * (latency - self.baseline_latency)
+            if slow:
+                self.rate = max(self.min_rate, self.rate * SLOW_FACTOR)
+            else:
+                self.rate = min(self.max_rate, self.rate + INCREASE_STEP)
+
+    def effective_rate(self):
+        """整个运行期间实际达到的请求速率 (请求/秒)"""
+        if not self.requests or self.started is None or self.finished is None:
+            return 0.0
+        elapsed = self.finished - self.started
+        return self.requests / elapsed if elapsed > 0 else float(self.requests)
+
+
+class HostRateLimiters:
+    """按 host 懒创建限速器"""
+
+    def __init__(self, **limiter_kwargs):
+        self._limiter_kwargs = limiter_kwargs
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = AdaptiveRateLimiter(**self._limiter_kwargs)
+            return self._limiters[host]
+
+    def report(self):
+        """打印每个 host 的请求数、错误数、实际速率与最终速率"""
+        print("===== 请求速率统计 =====")
+        if not self._limiters:
+            print("本次运行没有发出请求。")
+            return
+        for host, limiter in sorted(self._limiters.items()):
+            print(f"  {host}: {limiter.requests} 次请求，{limiter.errors} 次错误，"
+                  f"实际速率 {limiter.effective_rate():.2f} 次/秒，最终限速 {limiter.rate:.2f} 次/秒")
@@ -0,0 +1,340 @@
+"""对话与旁白的中文全文检索。
+
+中文文本没有分词，这里以字二元组（bigram）和单字为词项建立倒排索引，每个分类一个段，保存在 index/<分类>/：
+    docs.jsonl   每行一条文档 [kind, source_title, speaker, text, source_file, line_no]
+    docs.off     uint64 数组，第 i 条文档在 docs.jsonl 中的字节偏移（末尾多一个文件长度）
+    docs.len     uint32 数组，每条文档的字数，用于不解码文档直接计算得分
+    docs.spk     uint32 数组，每条文档的说话人编号（对应 speakers.json，0 为无说话人）
+    docs.kind    uint8 数组，每条文档的来源类型编号（对应 KINDS）
+    terms.key    uint64 数组，已排序的词项（两个字的码位拼成一个 64 位整数，单字的第二个码位为 0）
+    terms.off    uint64 数组，每个词项在 postings 中的起始下标（末尾多一个总数）
+    postings     uint32 数组，(文档号, 词频) 交替存放
+所有数组文件以 mmap 打开，加载不需要解析，查询时二分查找词项。
+index/manifest.json 记录每个段输入文件的 sha256，重新构建时只重建输入变化的分类。
+
+排序使用 BM25：先只用倒排表、文档长度与说话人 / 类型编号过滤并为候选打分，
+再按得分从高到低解码文档并核对，取够 limit 条即停止。
+phrase=True 时要求文本包含完整查询串，否则查询按空白切分为多个词，每个词都须出现。
+
+用法:
+    python search_index.py build
+    python search_index.py search 神之眼 --speaker 派蒙 --category world
+"""
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import os
+import shutil
+import time
+from array import array
+from bisect import bisect_left
+from heapq import heapify, heappop
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from corpus_db import iter_category_rows, load_title_urls, source_files
+
+DEFAULT_INDEX_DIR = "index"
+MANIFEST_NAME = "manifest.json"
+BM25_K1 = 1.2
+BM25_B = 0.75
+KINDS = ("dialogue", "recovered", "narration")
+
+
+def term_key(a, b=None):
+    return (ord(a) << 32) | (ord(b) if b else 0)
+
+
+def text_terms(text):
+    """文本中的全部单字与相邻二元组（空白不计）"""
+    chars = [c for c in text if not c.isspace()]
+    terms = [term_key(c) for c in chars]
+    terms.extend(term_key(a, b) for a, b in zip(chars, chars[1:]))
+    return terms
+
+
+def query_terms(query):
+    """查询用的词项：两个字以上只用二元组，单字查询用单字"""
+    chars = [c for c in query if not c.isspace()]
+    if len(chars) == 1:
+        return [term_key(chars[0])]
+    return [term_key(a, b) for a, b in zip(chars, chars[1:])]
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_array(path, typecode, values):
+    with open(path, "wb") as f:
+        array(typecode, values).tofile(f)
+
+
+def build_segment(segment_dir, rows):
+    """把一个分类的行写成一个段，返回文档数"""
+    tmp_dir = Path(f"{segment_dir}.tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    postings = defaultdict(list)
+    offsets = [0]
+    lengths = []
+    speaker_ids = []
+    kinds = []
+    speakers = {None: 0}
+    with open(tmp_dir / "docs.jsonl", "wb") as f:
+        for doc_id, (kind, _, source_file, line_no, title, speaker, text, *_) in enumerate(rows):
+            line = json.dumps([kind, title, speaker, text, source_file, line_no], ensure_ascii=False) + "\n"
+            offsets.append(offsets[-1] + f.write(line.encode("utf-8")))
+            counts = Counter(text_terms(text))
+            lengths.append(len(text))
+            speaker_ids.append(speakers.setdefault(speaker, len(speakers)))
+            kinds.append(KINDS.index(kind))
+            for key, tf in counts.items():
+                postings[key].append((doc_id, tf))
+
+    keys = sorted(postings)
+    term_offsets = [0]
+    flat = array("I")
+    for key in keys:
+        for doc_id, tf in postings[key]:
+            flat.append(doc_id)
+            flat.append(tf)
+        term_offsets.append(len(flat) // 2)
+    write_array(tmp_dir / "docs.off", "Q", offsets)
+    write_array(tmp_dir / "docs.len", "I", lengths)
+    write_array(tmp_dir / "docs.spk", "I", speaker_ids)
+    write_array(tmp_dir / "docs.kind", "B", kinds)
+    (tmp_dir / "speakers.json").write_text(json.dumps(list(speakers), ensure_ascii=False), encoding="utf-8")
+    write_array(tmp_dir / "terms.key", "Q", keys)
+    write_array(tmp_dir / "terms.off", "Q", term_offsets)
+    with open(tmp_dir / "postings", "wb") as f:
+        flat.tofile(f)
+    avg_len = sum(lengths) / len(lengths) if lengths else 0.0
+    (tmp_dir / "meta.json").write_text(json.dumps({"docs": len(lengths), "avg_len": avg_len}), encoding="utf-8")
+
+    if os.path.exists(segment_dir):
+        shutil.rmtree(segment_dir)
+    os.replace(tmp_dir, segment_dir)
+    return len(lengths)
+
+
+def build(index_dir=DEFAULT_INDEX_DIR, dialogue_dir="dialogue", extraction_dir="extraction",
+          narration_dir="narration", urls_dir="urls", full=False):
+    """按分类增量构建索引：只重建输入文件哈希变化（或新出现）的分类，删除已没有输入的分类"""
+    started = time.perf_counter()
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        manifest = json.loads((index_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+    if full:
+        manifest = {}
+
+    categories = source_files(dialogue_dir, extraction_dir, narration_dir)
+    title_urls = None
+    rebuilt = []
+    for category, files in categories.items():
+        inputs = {str(path): file_sha256(path) for paths in files.values() for path in paths}
+        if manifest.get(category, {}).get("inputs") == inputs and (index_dir / category).exists():
+            continue
+        if title_urls is None:
+            title_urls = load_title_urls(urls_dir)
+        docs = build_segment(index_dir / category, iter_category_rows(files, title_urls))
+        manifest[category] = {"inputs": inputs, "docs": docs}
+        rebuilt.append(category)
+        print(f"  {category}: {docs} 条文档")
+
+    for category in set(manifest) - set(categories):
+        shutil.rmtree(index_dir / category, ignore_errors=True)
+        del manifest[category]
+
+    (index_dir / MANIFEST_NAME).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"索引构建完成，重建 {len(rebuilt)} 个分类，跳过 {len(categories) - len(rebuilt)} 个未变化的分类，"
+          f"用时 {time.perf_counter() - started:.2f} 秒")
+    return rebuilt
+
+
+def _map_array(path, typecode):
+    """以只读 mmap 打开一个数组文件，返回 (mmap, memoryview)；空文件返回空数组"""
+    if os.path.getsize(path) == 0:
+        return None, memoryview(array(typecode))
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mm, memoryview(mm).cast(typecode)
+
+
+class Segment:
+    """一个分类的只读索引段"""
+
+    def __init__(self, segment_dir, category):
+        self.category = category
+        segment_dir = Path(segment_dir)
+        meta = json.loads((segment_dir / "meta.json").read_text(encoding="utf-8"))
+        self.doc_count = meta["docs"]
+        self.avg_len = meta["avg_len"] or 1.0
+        self._maps = []
+        self.doc_offsets = self._open(segment_dir / "docs.off", "Q")
+        self.doc_lengths = self._open(segment_dir / "docs.len", "I")
+        self.doc_speakers = self._open(segment_dir / "docs.spk", "I")
+        self.doc_kinds = self._open(segment_dir / "docs.kind", "B")
+        speakers = json.loads((segment_dir / "speakers.json").read_text(encoding="utf-8"))
+        self.speaker_ids = {name: i for i, name in enumerate(speakers)}
+        self.keys = self._open(segment_dir / "terms.key", "Q")
+        self.term_offsets = self._open(segment_dir / "terms.off", "Q")
+        self.postings = self._open(segment_dir / "postings", "I")
+        with open(segment_dir / "docs.jsonl", "rb") as f:
+            self.docs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.doc_count else b""
+
+    def _open(self, path, typecode):
+        mm, view = _map_array(path, typecode)
+        self._maps.append((mm, view))
+        return view
+
+    def close(self):
+        for mm, view in self._maps:
+            view.release()
+            if mm is not None:
+                mm.close()
+        if isinstance(self.docs, mmap.mmap):
+            self.docs.close()
+
+    def term_postings(self, key):
+        """{文档号: 词频}，词项不存在时为空"""
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return {}
+        start, end = self.term_offsets[i], self.term_offsets[i + 1]
+        pairs = self.postings[start * 2:end * 2].tolist()
+        return dict(zip(pairs[0::2], pairs[1::2]))
+
+    def doc(self, doc_id):
+        start, end = self.doc_offsets[doc_id], self.doc_offsets[doc_id + 1]
+        kind, title, speaker, text, source_file, line_no = json.loads(self.docs[start:end])
+        return {"kind": kind, "category": self.category, "source_title": title, "speaker": speaker,
+                "text": text, "source_file": source_file, "line_no": line_no}
+
+
+class SearchIndex:
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR):
+        index_dir = Path(index_dir)
+        try:
+            manifest = json.loads((index_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise FileNotFoundError(f"未找到索引 {index_dir}，请先运行 python search_index.py build")
+        self.segments = {category: Segment(index_dir / category, category) for category in sorted(manifest)}
+
+    def close(self):
+        for segment in self.segments.values():
+            segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def search(self, query, speaker=None, category=None, phrase=True, include_narration=True, limit=20):
+        """
+        返回按 BM25 得分降序的命中列表，每条为文档 dict 加 score。
+        phrase=True 时文本须包含完整查询串；否则查询按空白切分，每个词都须出现在文本中。
+        """
+        parts = [query.strip()] if phrase else query.split()
+        parts = [p for p in parts if p]
+        if not parts:
+            return []
+        keys = sorted({key for part in parts for key in query_terms(part)})
+        segments = [self.segments[category]] if category else list(self.segments.values())
+
+        scored = []
+        for segment in segments:
+            postings = [segment.term_postings(key) for key in keys]
+            if any(not p for p in postings):
+                continue
+            # 从最短的倒排表开始求交集
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for p in postings[1:]:
+                candidates.intersection_update(p)
+                if not candidates:
+                    break
+            if speaker is not None:
+                speaker_id = segment.speaker_ids.get(speaker)
+                candidates = [d for d in candidates if segment.doc_speakers[d] == speaker_id]
+            if not include_narration:
+                narration = KINDS.index("narration")
+                candidates = [d for d in candidates if segment.doc_kinds[d] != narration]
+            idf = [math.log(1 + (segment.doc_count - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+            for doc_id in candidates:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.doc_lengths[doc_id] / segment.avg_len)
+                score = sum(w * p[doc_id] * (BM25_K1 + 1) / (p[doc_id] + norm) for w, p in zip(idf, postings))
+                scored.append((-score, segment.category, doc_id))
+
+        # 堆中按得分依次取出，只解码排在前面的文档
+        heapify(scored)
+        hits = []
+        while scored and len(hits) < limit:
+            neg_score, category, doc_id = heappop(scored)
+            doc = self.segments[category].doc(doc_id)
+            # 二元组都出现不代表整个串出现，逐条核对
+            if not all(part in doc["text"] for part in parts):
+                continue
+            doc["score"] = round(-neg_score, 4)
+            hits.append(doc)
+        return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对话与旁白的中文全文检索")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = sub.add_parser("build", help="增量构建索引")
+    build_parser.add_argument("--full", action="store_true", help="忽略清单，重建所有分类")
+
+    search = sub.add_parser("search", help="检索")
+    search.add_argument("query")
+    search.add_argument("--speaker")
+    search.add_argument("--category")
+    search.add_argument("--words", action="store_true", help="按空白切分为多个词分别匹配，而不是整串匹配")
+    search.add_argument("--no-narration", action="store_true", help="不检索旁白")
+    search.add_argument("--limit", type=int, default=20)
+    search.add_argument("--json", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build(args.index_dir, full=args.full)
+        return
+
+    try:
+        index = SearchIndex(args.index_dir)
+    except FileNotFoundError as e:
+        print(e)
+        return
+    with index:
+        if args.category and args.category not in index.segments:
+            print(f"索引中没有分类 {args.category}，可选: {', '.join(index.segments)}")
+            return
+        started = time.perf_counter()
+        hits = index.search(args.query, speaker=args.speaker, category=args.category, phrase=not args.words,
+                            include_narration=not args.no_narration, limit=args.limit)
+        elapsed = time.perf_counter() - started
+        for hit in hits:
+            if args.json:
+                print(json.dumps(hit, ensure_ascii=False))
+            else:
+                speaker = f"{hit['speaker']}：" if hit["speaker"] else ""
+                print(f"{hit['score']:>7.2f} [{hit['category']}][{hit['source_title']}] {speaker}{hit['text']}")
+        print(f"{len(hits)} 条结果，查询用时 {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
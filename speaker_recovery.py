@@ -0,0 +1,298 @@
+r"""从旁白文件中找回对话。
+
+旁白文件 `narration/narrative_data_*.txt` 中每行形如 `[章节名] 文本`。原先只用严格的正则
+`^\[(.*?)\]\s+(.+?)\s+:\s+(.+)$` 找回对话，`派蒙:……`、`派蒙 ：……` 等写法都会漏掉。
+
+这里用 DEFAULT_GROUPS、dialogue/ 中出现过的说话人以及严格正则匹配到的说话人构建
+Aho-Corasick 自动机，对每行正文扫描一遍：某个人名从正文开头匹配到、其后紧跟分隔符
+（可带空格的 ':' / '：' / '∶'）时即作为说话人，多个候选取最长者。
+多个文件在进程池中并行处理，每个文件报告与严格正则的一致率和吞吐量。
+
+一致率只覆盖严格正则能匹配的行，说明不了严格正则之外新找回的行是否正确。新增行的精确率在人工标注的
+样本上计算：--sample 导出随机抽取的新增行，在“标注”列填 1（说话人与正文切分正确）或 0，再用 --labels 计算。
+extraction/recovered_sample.tsv 是按默认种子抽取、已标注的 100 条样本。
+用法:
+    python speaker_recovery.py
+    python speaker_recovery.py --sample 200 --sample-out recovered_sample.tsv
+    python speaker_recovery.py --labels recovered_sample.tsv
+"""
+import argparse
+import csv
+import os
+import random
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from group_by_speaker import DEFAULT_GROUPS, iter_json_entries
+
+STRICT_PATTERN = re.compile(r'^\[(.*?)\]\s+(.+?)\s+:\s+(.+)$')
+TITLE_PATTERN = re.compile(r'^\[(.*?)\]\s*(.*)$')
+SEPARATORS = frozenset(":：∶")
+MAX_SPEAKER_LEN = 16
+NARRATION_GLOB = "narration/narrative_data_*.txt"
+
+
+class SpeakerAutomaton:
+    """Aho-Corasick 多模式匹配自动机"""
+
+    def __init__(self, names):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [0]          # 以该状态结尾的最长人名长度，0 表示没有
+        self.depth = [0]
+        for name in names:
+            self._add(name)
+        self._build()
+
+    def _add(self, name):
+        state = 0
+        for ch in name:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(0)
+                self.depth.append(self.depth[state] + 1)
+            state = nxt
+        self.out[state] = max(self.out[state], len(name))
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+
+    def speaker_prefix(self, body):
+        """
+        扫描 body，返回从开头匹配到且其后（可隔空格）紧跟分隔符的最长人名长度与分隔符位置，
+        没有时返回 None。扫描到第一个分隔符或离开前缀路径即停止，每行最多扫描最长人名的长度。
+        """
+        state = 0
+        best = None
+        for i, ch in enumerate(body):
+            if ch in SEPARATORS:
+                break
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            # 只关心从开头开始的匹配：状态深度小于 i + 1 说明已离开前缀路径，之后不可能再有前缀人名
+            if self.depth[state] != i + 1:
+                break
+            if self.out[state] == i + 1:
+                j = i + 1
+                while j < len(body) and body[j].isspace():
+                    j += 1
+                if j < len(body) and body[j] in SEPARATORS:
+                    best = (i + 1, j)
+        return best
+
+
+def split_line(automaton, line):
+    """返回 (source_title, speaker, text)，不是对话时返回 None"""
+    m = TITLE_PATTERN.match(line)
+    if not m:
+        return None
+    title, body = m.group(1), m.group(2)
+    found = automaton.speaker_prefix(body)
+    if found is None:
+        return None
+    name_len, sep = found
+    text = body[sep + 1:].strip()
+    if not text:
+        return None
+    return title, body[:name_len], text
+
+
+def strict_speakers(narration_files):
+    """严格正则在旁白中匹配到的说话人"""
+    names = set()
+    for path in narration_files:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                m = STRICT_PATTERN.match(line.strip())
+                if m:
+                    names.add(m.group(2))
+    return names
+
+
+def dialogue_speakers(dialogue_dir="dialogue"):
+    """dialogue/ 中出现过的说话人"""
+    names = set()
+    for path in sorted(Path(dialogue_dir).glob("*.json")):
+        try:
+            for item in iter_json_entries(path):
+                if isinstance(item, dict) and item.get("speaker"):
+                    names.add(str(item["speaker"]).strip())
+        except Exception as e:
+            print(f"读取 {path} 中的说话人失败: {e}")
+    return names
+
+
+def build_vocabulary(narration_files, dialogue_dir="dialogue"):
+    """
+    构建人名词表：DEFAULT_GROUPS、严格正则匹配到的说话人，以及 dialogue/ 中的说话人。
+    dialogue/ 中的单字人名不收录，避免把“我”“你”之类的开头当作说话人。
+    """
+    vocabulary = set(DEFAULT_GROUPS)
+    candidates = [(name, 1) for name in strict_speakers(narration_files)]
+    candidates += [(name, 2) for name in dialogue_speakers(dialogue_dir)]
+    for name, min_len in candidates:
+        if min_len <= len(name) <= MAX_SPEAKER_LEN and not any(c in SEPARATORS for c in name):
+            vocabulary.add(name)
+    return sorted(vocabulary)
+
+
+_automaton = None
+
+
+def _init_worker(vocabulary):
+    global _automaton
+    _automaton = SpeakerAutomaton(vocabulary)
+
+
+def recover_file(path):
+    """
+    逐行扫描一个旁白文件，返回 (records, stats)。
+    旁白中没有对话块的信息，records 只有 source_title、speaker、text，不带位置字段（见 conversation_index.py）。
+    stats: lines / strict（严格正则匹配行数）/ agreed（其中结果一致的行数）/ recovered /
+    extra（严格正则之外新找回的行数）/ bytes / seconds
+    """
+    records = []
+    stats = {"lines": 0, "strict": 0, "agreed": 0, "recovered": 0, "bytes": os.path.getsize(path)}
+    started = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            stats["lines"] += 1
+            result = split_line(_automaton, line)
+            strict = STRICT_PATTERN.match(line)
+            if strict:
+                stats["strict"] += 1
+                if result == strict.groups():
+                    stats["agreed"] += 1
+            if result:
+                title, speaker, text = result
+                records.append({"source_title": title, "speaker": speaker, "text": text})
+    stats["recovered"] = len(records)
+    stats["extra"] = stats["recovered"] - stats["agreed"]
+    stats["seconds"] = time.perf_counter() - started
+    return records, stats
+
+
+def recover_all(narration_files, jobs=None, dialogue_dir="dialogue"):
+    """并行处理多个旁白文件，按输入顺序返回 [(path, records, stats)]"""
+    vocabulary = build_vocabulary(narration_files, dialogue_dir)
+    print(f"人名词表: {len(vocabulary)} 个")
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(narration_files)))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(vocabulary,)) as pool:
+        results = list(pool.map(recover_file, narration_files))
+    return [(path, records, stats) for path, (records, stats) in zip(narration_files, results)]
+
+
+def print_report(path, stats):
+    agreement = stats["agreed"] / stats["strict"] if stats["strict"] else 1.0
+    seconds = max(stats["seconds"], 1e-9)
+    print(f"  {Path(path).name}: 找回 {stats['recovered']} 条对话（严格正则 {stats['strict']} 条，"
+          f"一致率 {agreement:.2%}，新增 {stats['extra']} 条），"
+          f"{stats['lines'] / seconds:.0f} 行/秒，{stats['bytes'] / seconds / 1e6:.2f} MB/秒")
+
+
+def iter_extra(narration_files, vocabulary):
+    """逐行产出严格正则之外新找回的对话：(文件, 行号, 章节名, 说话人, 正文)"""
+    automaton = SpeakerAutomaton(vocabulary)
+    for path in narration_files:
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                result = split_line(automaton, line) if line else None
+                if not result:
+                    continue
+                strict = STRICT_PATTERN.match(line)
+                if strict and strict.groups() == result:
+                    continue
+                yield (path, line_no) + result
+
+
+def write_sample(narration_files, out_path, size, seed=0, dialogue_dir="dialogue"):
+    """随机抽取 size 条新增行写成待标注的 TSV（蓄水池抽样），返回抽到的条数"""
+    vocabulary = build_vocabulary(narration_files, dialogue_dir)
+    rng = random.Random(seed)
+    sample = []
+    for i, row in enumerate(iter_extra(narration_files, vocabulary)):
+        if i < size:
+            sample.append(row)
+        else:
+            j = rng.randrange(i + 1)
+            if j < size:
+                sample[j] = row
+    sample.sort()
+    with open(out_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t")
+        writer.writerow(("文件", "行号", "章节名", "说话人", "正文", "标注"))
+        for row in sample:
+            writer.writerow(row + ("",))
+    return len(sample)
+
+
+def labelled_precision(path):
+    """读取标注好的 TSV，返回 (正确条数, 已标注条数)；标注为空的行不计入"""
+    correct = total = 0
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            label = (row.get("标注") or "").strip()
+            if label not in ("0", "1"):
+                continue
+            total += 1
+            correct += label == "1"
+    return correct, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从全部旁白文件中找回对话并报告一致率与吞吐量，或抽样标注新增行以计算精确率")
+    parser.add_argument("--jobs", type=int, default=None, help="并行进程数，默认为 CPU 核数")
+    parser.add_argument("--sample", type=int, default=0, help="随机抽取多少条新增行导出为待标注的 TSV")
+    parser.add_argument("--sample-out", default="recovered_sample.tsv", help="待标注样本的输出路径")
+    parser.add_argument("--seed", type=int, default=0, help="抽样的随机种子")
+    parser.add_argument("--labels", help="已标注的 TSV，报告新增行在样本上的精确率")
+    args = parser.parse_args()
+
+    if args.labels:
+        correct, total = labelled_precision(args.labels)
+        if not total:
+            print(f"{args.labels} 中没有已标注的行（标注列填 1 或 0）")
+            sys.exit(1)
+        print(f"新增行精确率: {correct}/{total} = {correct / total:.2%}（人工标注样本）")
+        return
+
+    files = sorted(str(p) for p in Path().glob(NARRATION_GLOB))
+    if not files:
+        print(f"未找到旁白文件: {NARRATION_GLOB}")
+        return
+    if args.sample:
+        count = write_sample(files, args.sample_out, args.sample, seed=args.seed)
+        print(f"已抽取 {count} 条新增行至 {args.sample_out}，标注后用 --labels 计算精确率")
+        return
+    started = time.perf_counter()
+    results = recover_all(files, jobs=args.jobs)
+    for path, _, stats in results:
+        print_report(path, stats)
+    total = sum(stats["recovered"] for _, _, stats in results)
+    print(f"共找回 {total} 条对话，用时 {time.perf_counter() - started:.2f} 秒")
+    print("一致率不反映新增行的精确率，新增行的精确率用 --sample 抽样人工标注后由 --labels 计算")
+
+
+if __name__ == "__main__":
+    main()
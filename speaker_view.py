@@ -0,0 +1,223 @@
+"""按说话人读取对话的虚拟视图，取代物化的 speaker/ 目录。
+
+build 把 `dialogue/*.json` 逐条转写为同名的 `.jsonl`（每行一条紧凑 JSON），同时记录每条记录的
+字节偏移与长度，写入 `dialogue/speaker.idx`：
+    {"files": {"dialogue_data_world.jsonl": {"sha256": 源 JSON 的哈希,
+                                            "speakers": {说话人: [偏移, 长度, 偏移, 长度, ...]}}}}
+只有源 JSON 哈希变化的文件会重新转写。SpeakerView 按索引直接从 .jsonl 中 seek 读取某个说话人的记录，
+不复制数据。pipeline 的 group 阶段只运行 build；speaker/<分组>/<源文件名>.json 不再默认生成，
+需要时运行 group_by_speaker.py（增量）或 export（全部），两者都从这里的视图读取。
+
+用法:
+    python speaker_view.py build
+    python speaker_view.py show 纳西妲 --limit 5
+    python speaker_view.py export --out-dir speaker
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from crawl_journal import JsonArrayWriter
+from group_by_speaker import DEFAULT_GROUPS, file_sha256, get_speaker, group_of, iter_json_entries, sanitize_filename
+
+DEFAULT_DIALOGUE_DIR = "dialogue"
+INDEX_NAME = "speaker.idx"
+
+
+def speaker_key(item):
+    """索引中使用的说话人名：条目中的原始值，没有说话人时为空串"""
+    sp = get_speaker(item)
+    return "" if sp is None else str(sp)
+
+
+def convert_file(src, dst):
+    """把 JSON 数组文件转写为 JSONL，返回 {说话人: [偏移, 长度, ...]}"""
+    speakers = {}
+    tmp = Path(f"{dst}.tmp")
+    offset = 0
+    with open(tmp, "wb") as f:
+        for item in iter_json_entries(src):
+            line = (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(line)
+            speakers.setdefault(speaker_key(item), []).extend((offset, len(line)))
+            offset += len(line)
+    os.replace(tmp, dst)
+    return speakers
+
+
+def load_index(dialogue_dir=DEFAULT_DIALOGUE_DIR):
+    try:
+        return json.loads((Path(dialogue_dir) / INDEX_NAME).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {"files": {}}
+
+
+def build(dialogue_dir=DEFAULT_DIALOGUE_DIR, full=False):
+    """转写有变化的 JSON 并更新索引，返回 (重新转写的文件名列表, 读取失败的源文件名列表)"""
+    dialogue_dir = Path(dialogue_dir)
+    index = {"files": {}} if full else load_index(dialogue_dir)
+    files = {}
+    rebuilt = []
+    failed = []
+    for src in sorted(dialogue_dir.glob("*.json")):
+        dst = src.with_suffix(".jsonl")
+        sha = file_sha256(src)
+        entry = index["files"].get(dst.name)
+        if entry is None or entry.get("sha256") != sha or not dst.exists():
+            try:
+                entry = {"sha256": sha, "speakers": convert_file(src, dst)}
+            except Exception as e:
+                print(f"跳过文件 {src.name}，读取失败: {e}")
+                failed.append(src.name)
+                continue
+            rebuilt.append(dst.name)
+        files[dst.name] = entry
+
+    # 源 JSON 已删除的文件同时删除其 JSONL
+    for name in set(index["files"]) - set(files):
+        (dialogue_dir / name).unlink(missing_ok=True)
+
+    tmp = dialogue_dir / f"{INDEX_NAME}.tmp"
+    tmp.write_text(json.dumps({"files": files}, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, dialogue_dir / INDEX_NAME)
+    print(f"索引已写入 {dialogue_dir / INDEX_NAME}，重新转写 {len(rebuilt)} 个文件，"
+          f"跳过 {len(files) - len(rebuilt)} 个未变化的文件")
+    return rebuilt, failed
+
+
+class SpeakerView:
+    """按说话人从 .jsonl 源文件中读取记录"""
+
+    def __init__(self, dialogue_dir=DEFAULT_DIALOGUE_DIR):
+        self.dialogue_dir = Path(dialogue_dir)
+        if not (self.dialogue_dir / INDEX_NAME).exists():
+            raise FileNotFoundError(f"未找到 {self.dialogue_dir / INDEX_NAME}，请先运行 python speaker_view.py build")
+        self.files = load_index(dialogue_dir)["files"]
+
+    def speakers(self):
+        """{说话人: 记录数}，按记录数降序"""
+        counts = {}
+        for entry in self.files.values():
+            for speaker, spans in entry["speakers"].items():
+                counts[speaker] = counts.get(speaker, 0) + len(spans) // 2
+        return dict(sorted(counts.items(), key=lambda x: (-x[1], x[0])))
+
+    def _read(self, spans_by_file):
+        """spans_by_file: [(文件名, [偏移, 长度, ...])]，按文件内偏移顺序读取"""
+        for name, spans in spans_by_file:
+            pairs = sorted(zip(spans[0::2], spans[1::2]))
+            with open(self.dialogue_dir / name, "rb") as f:
+                for offset, length in pairs:
+                    f.seek(offset)
+                    yield name, json.loads(f.read(length))
+
+    def lines(self, speaker, files=None):
+        """某个说话人的全部记录，按源文件、文件内顺序；files 可限定源文件名（.jsonl）"""
+        spans = [(name, entry["speakers"][speaker]) for name, entry in sorted(self.files.items())
+                 if speaker in entry["speakers"] and (files is None or name in files)]
+        for _, item in self._read(spans):
+            yield item
+
+    def group_lines(self, group, groups=DEFAULT_GROUPS):
+        """
+        一个分组（speaker/ 下的一个目录）在各源文件中的记录，返回 [(源 JSON 文件名, item)]。
+        group 为 "other" 时包括所有不在 groups 中的说话人。
+        """
+        sanitized_groups = {sanitize_filename(g) for g in groups}
+        for name, entry in sorted(self.files.items()):
+            spans = []
+            for speaker, s in entry["speakers"].items():
+                if group_of({"speaker": speaker or None}, sanitized_groups) == group:
+                    spans.extend(s)
+            for _, item in self._read([(name, spans)] if spans else []):
+                yield Path(name).with_suffix(".json").name, item
+
+    def export_file(self, name, out_dir, sanitized_groups):
+        """
+        把一个源文件（.jsonl 名）的记录按分组写到 out_dir/<分组>/<源 JSON 文件名>，返回 {分组: 条数}。
+        每个分组先写临时文件再替换；该源文件在其他分组目录下的旧输出（本次已无条目）会被删除。
+        """
+        out_dir = Path(out_dir)
+        target = Path(name).with_suffix(".json").name
+        by_group = {}
+        for speaker, spans in self.files[name]["speakers"].items():
+            grp = group_of({"speaker": speaker or None}, sanitized_groups)
+            by_group.setdefault(grp, []).extend(spans)
+        for grp, spans in sorted(by_group.items()):
+            grp_dir = out_dir / grp
+            grp_dir.mkdir(parents=True, exist_ok=True)
+            tmp = grp_dir / f"{target}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                writer = JsonArrayWriter(f, indent=2)
+                for _, item in self._read([(name, spans)]):
+                    writer.write(item)
+                writer.close()
+            os.replace(tmp, grp_dir / target)
+        if out_dir.is_dir():
+            for grp_dir in out_dir.iterdir():
+                stale = grp_dir / target
+                if grp_dir.is_dir() and grp_dir.name not in by_group and stale.exists():
+                    stale.unlink()
+        return {grp: len(spans) // 2 for grp, spans in by_group.items()}
+
+    def export(self, out_dir="speaker", groups=DEFAULT_GROUPS):
+        """生成与 group_by_speaker 相同的 speaker/<分组>/<源文件名>.json，返回 {分组: 条数}"""
+        sanitized_groups = {sanitize_filename(g) for g in groups}
+        summary = {}
+        for name in sorted(self.files):
+            for grp, n in self.export_file(name, out_dir, sanitized_groups).items():
+                summary[grp] = summary.get(grp, 0) + n
+        return summary
+
+
+def export_task(task):
+    """进程池 worker：(dialogue_dir, .jsonl 文件名, out_dir, sanitized_groups) -> {分组: 条数}"""
+    dialogue_dir, name, out_dir, sanitized_groups = task
+    return SpeakerView(dialogue_dir).export_file(name, out_dir, sanitized_groups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按说话人读取对话的虚拟视图")
+    parser.add_argument("--dialogue-dir", default=DEFAULT_DIALOGUE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="转写 JSONL 并更新说话人索引")
+    build_parser.add_argument("--full", action="store_true", help="忽略已有索引，全部重新转写")
+    show = sub.add_parser("show", help="显示某个说话人的台词")
+    show.add_argument("speaker")
+    show.add_argument("--limit", type=int, default=20)
+    sub.add_parser("speakers", help="列出说话人及其台词数")
+    export = sub.add_parser("export", help="生成 speaker/ 目录结构")
+    export.add_argument("--out-dir", default="speaker")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        _, failed = build(args.dialogue_dir, full=args.full)
+        if failed:
+            # 退出码非 0，pipeline 据此判定阶段失败
+            sys.exit(1)
+        return
+    try:
+        view = SpeakerView(args.dialogue_dir)
+    except FileNotFoundError as e:
+        print(e)
+        return
+    if args.command == "show":
+        for i, item in enumerate(view.lines(args.speaker)):
+            if i >= args.limit:
+                break
+            print(f"[{item.get('source_title')}] {item.get('text')}")
+    elif args.command == "speakers":
+        for speaker, n in view.speakers().items():
+            print(f"  {speaker or '(无)'}: {n}")
+    else:
+        summary = view.export(args.out_dir)
+        print("导出完成，统计如下:")
+        for grp, n in sorted(summary.items()):
+            print(f"  {grp}: {n}")
+        print(f"  total: {sum(summary.values())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""async_fetch 对本地 `python -m http.server` 式服务器托管页面的抓取：能解析的页面直接提取，没有对话结构的页面标记 needs_js，
+不带 charset 的 text/html 中文不能变成乱码。"""
+import asyncio
+import functools
+import http.server
+import json
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from async_fetch import fetch_all  # noqa: E402
+from get_dialogue import parse_dialogue_html  # noqa: E402
+from page_cache import PageCache  # noqa: E402
+
+PAGES_DIR = ROOT / "benchmarks" / "fixtures" / "pages"
+
+STRUCTURE_B = """<html><head><meta charset="utf-8"></head><body>
+<div class="obc-tmpl-fold"><div class="obc-tmpl-fold__title"><span>剧情对话</span></div>
+<div class="obc-tmpl-fold__content"><p><span>派蒙</span>：前面就是蒙德城了！</p>
+<p><span>旅行者</span>：走吧。</p>
+<p>风吹过草地。</p></div></div>
+</body></html>"""
+NO_STRUCTURE = """<html><head><meta charset="utf-8"></head><body><div id="app"></div></body></html>"""
+
+
+class Utf8Handler(http.server.SimpleHTTPRequestHandler):
+    extensions_map = {**http.server.SimpleHTTPRequestHandler.extensions_map, ".html": "text/html; charset=utf-8"}
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(directory, handler_class):
+    handler = functools.partial(handler_class, directory=str(directory))
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / "b.html").write_text(STRUCTURE_B, encoding="utf-8")
+    (tmp_path / "js.html").write_text(NO_STRUCTURE, encoding="utf-8")
+    yield from serve(tmp_path, Utf8Handler)
+
+
+@pytest.fixture
+def plain_server(tmp_path):
+    """与 `python -m http.server` 相同：text/html 不带 charset"""
+    site = tmp_path / "site"
+    site.mkdir()
+    for name in ("structure_a_1.html", "structure_b_1.html"):
+        shutil.copyfile(PAGES_DIR / name, site / name)
+    yield from serve(site, http.server.SimpleHTTPRequestHandler)
+
+
+def test_fetch_all_against_local_server(server):
+    rows = [("蒙德", f"{server}/b.html"), ("需要渲染", f"{server}/js.html"), ("不存在", f"{server}/missing.html")]
+    parsed, js_only, missing = asyncio.run(fetch_all(rows, parse_dialogue_html, content_api=""))
+
+    assert not parsed.needs_js and parsed.error is None
+    assert [(d["speaker"], d["text"]) for d in parsed.dialogues] == [("派蒙", "前面就是蒙德城了！"), ("旅行者", "走吧。")]
+    assert parsed.narratives == ["[蒙德] 风吹过草地。"]
+    assert js_only.needs_js and js_only.error is None
+    assert missing.needs_js and missing.error == "HTTPError"
+
+
+def test_chinese_survives_round_trip(plain_server, tmp_path):
+    expected = json.loads((PAGES_DIR / "expected.json").read_text(encoding="utf-8"))
+    names = ("structure_a_1.html", "structure_b_1.html")
+    rows = [(name, f"{plain_server}/{name}") for name in names]
+    cache = PageCache(tmp_path / "cache")
+
+    results = asyncio.run(fetch_all(rows, parse_dialogue_html, content_api="", cache=cache))
+
+    for name, (_, url), result in zip(names, rows, results):
+        original = (PAGES_DIR / name).read_text(encoding="utf-8")
+        assert result.error is None
+        assert not result.needs_js
+        assert len(result.dialogues) == expected[name]["dialogues"]
+        assert len(result.narratives) == expected[name]["narratives"]
+        # 缓存的原文与磁盘上的页面逐字一致
+        assert cache.get(url) == original
+        assert any(item["text"] and item["text"] in original for item in result.dialogues)
@@ -0,0 +1,29 @@
+"""浏览器配置：每个开关只屏蔽自己那一组资源，fast 屏蔽全部、default 不屏蔽；headless 参数覆盖配置中的值。"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from browser_profile import (FONT_URL_PATTERNS, IMAGE_URL_PATTERNS, MEDIA_URL_PATTERNS,  # noqa: E402
+                             PROFILES, THIRD_PARTY_URL_PATTERNS, BrowserProfile, get_profile)
+
+NONE = dict(block_images=False, block_media=False, block_fonts=False, block_third_party=False)
+
+
+def test_each_flag_blocks_only_its_group():
+    for flag, group in (("block_images", IMAGE_URL_PATTERNS), ("block_media", MEDIA_URL_PATTERNS),
+                        ("block_fonts", FONT_URL_PATTERNS), ("block_third_party", THIRD_PARTY_URL_PATTERNS)):
+        assert BrowserProfile("t", **{**NONE, flag: True}).blocked_url_patterns() == group
+
+
+def test_builtin_profiles():
+    assert PROFILES["default"].blocked_url_patterns() == []
+    assert PROFILES["fast"].blocked_url_patterns() == (IMAGE_URL_PATTERNS + MEDIA_URL_PATTERNS + FONT_URL_PATTERNS
+                                                       + THIRD_PARTY_URL_PATTERNS)
+
+
+def test_headless_override():
+    assert get_profile("fast").headless
+    assert not get_profile("fast", headless=False).headless
+    assert get_profile("default", headless=True).page_load_strategy == "normal"
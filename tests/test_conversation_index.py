@@ -0,0 +1,46 @@
+"""conversation_index：读取失败的源文件使 build 报告失败、命令行以非 0 退出码结束，其余文件照常建立索引。"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import conversation_index  # noqa: E402
+
+
+def test_failed_file_is_reported(tmp_path):
+    dialogue = tmp_path / "dialogue"
+    dialogue.mkdir()
+    items = [{"source_title": "序章", "speaker": speaker, "text": f"第 {i} 句", "page_id": 1, "block_id": 0,
+              "branch_id": 0, "turn": i} for i, speaker in enumerate(("旅行者", "派蒙", "旅行者"))]
+    (dialogue / "dialogue_data_world.json").write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+    (dialogue / "dialogue_data_timed.json").write_text('[{"speaker": ', encoding="utf-8")
+
+    rebuilt, failed = conversation_index.build(dialogue)
+    assert rebuilt == ["dialogue_data_world.jsonl"]
+    assert failed == ["dialogue_data_timed.json"]
+    history, item = list(conversation_index.ConversationIndex(dialogue).context("派蒙", k=3))[0]
+    assert [h["text"] for h in history] == ["第 0 句"] and item["text"] == "第 1 句"
+
+    proc = subprocess.run([sys.executable, str(ROOT / "conversation_index.py"), "--dialogue-dir", str(dialogue),
+                           "build"], capture_output=True, text=True)
+    assert proc.returncode == 1
+
+
+def test_mixed_schema_in_one_file(tmp_path):
+    dialogue = tmp_path / "dialogue"
+    dialogue.mkdir()
+    # page_id 解析不出的带位置记录与同章节从旁白找回的记录混在同一文件中
+    positioned = [{"source_title": "序章", "speaker": speaker, "text": f"块内第 {turn} 句", "page_id": None,
+                   "block_id": 0, "branch_id": 0, "turn": turn} for turn, speaker in ((1, "派蒙"), (0, "旅行者"))]
+    recovered = [{"source_title": "序章", "speaker": speaker, "text": f"找回第 {i} 句"}
+                 for i, speaker in enumerate(("旅行者", "派蒙"))]
+    items = [positioned[0], recovered[0], positioned[1], recovered[1]]
+    (dialogue / "dialogue_data_world.json").write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+
+    assert conversation_index.build(dialogue) == (["dialogue_data_world.jsonl"], [])
+    contexts = [([h["text"] for h in history], item["text"])
+                for history, item in conversation_index.ConversationIndex(dialogue).context("派蒙", k=3)]
+    assert sorted(contexts) == [(["块内第 0 句"], "块内第 1 句"), (["找回第 0 句"], "找回第 1 句")]
@@ -0,0 +1,29 @@
+"""corpus_analytics 的命令行：没有语料或读取失败时以非 0 退出码结束。"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run(tmp_path, *args):
+    return subprocess.run([sys.executable, str(ROOT / "corpus_analytics.py"),
+                           "--dialogue-dir", str(tmp_path / "dialogue"), "--speaker-dir", str(tmp_path / "speaker"),
+                           "--cache-dir", str(tmp_path / "analytics"), *args], capture_output=True, text=True)
+
+
+def test_exit_codes(tmp_path):
+    dialogue = tmp_path / "dialogue"
+    dialogue.mkdir()
+    assert run(tmp_path, "lengths").returncode == 1
+
+    items = [{"source_title": "序章", "speaker": "派蒙", "text": "出发吧！"}]
+    (dialogue / "dialogue_data_world.json").write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+    proc = run(tmp_path, "speakers")
+    assert proc.returncode == 0 and "派蒙" in proc.stdout
+
+    (dialogue / "dialogue_data_world.json").write_text('[{"speaker": ', encoding="utf-8")
+    proc = run(tmp_path, "speakers")
+    assert proc.returncode == 1
+    assert "统计失败" in proc.stdout
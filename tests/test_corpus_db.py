@@ -0,0 +1,94 @@
+"""corpus_db：三种来源的导入、按说话人 / 章节查询、章节 URL，以及 export_speakers 与 group_by_speaker 的输出一致（包括对话的位置字段）。"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import corpus_db  # noqa: E402
+
+
+def write_dialogue(path, items):
+    path.write_text(json.dumps(items, ensure_ascii=False, indent=4), encoding="utf-8")
+
+
+def make_corpus(root):
+    for name in ("dialogue", "extraction", "narration", "urls"):
+        (root / name).mkdir()
+    lines = [{"source_title": "序章", "speaker": speaker, "text": text}
+             for speaker, text in (("派蒙", "出发吧！"), ("旅行者", "好。"), ("派蒙", "等等我！"))]
+    write_dialogue(root / "dialogue" / "dialogue_data_world.json", lines)
+    write_dialogue(root / "dialogue" / "dialogue_data_timed.json", [{"source_title": "活动", "speaker": "钟离",
+                                                                      "text": "契约已成。"}])
+    # 找回的对话中已合并进 dialogue/ 的条目不重复导入
+    write_dialogue(root / "extraction" / "extracted_from_world.json",
+                   [lines[0], {"source_title": "序章", "speaker": "派蒙", "text": "找回的一句"}])
+    (root / "narration" / "narrative_data_world.txt").write_text("[序章] 风吹过草地。\n\n无标题的旁白\n",
+                                                                 encoding="utf-8")
+    (root / "urls" / "dialogue_urls_world.csv").write_text("title,url\n序章,https://example.com/content/1/\n",
+                                                           encoding="utf-8")
+
+
+def test_build_and_query(tmp_path):
+    make_corpus(tmp_path)
+    db_path = tmp_path / "corpus.db"
+    counts = corpus_db.build(db_path, tmp_path / "dialogue", tmp_path / "extraction", tmp_path / "narration",
+                             tmp_path / "urls")
+    assert counts == {"dialogue": 4, "recovered": 1, "narration": 2}
+
+    with corpus_db.CorpusDB(db_path) as db:
+        assert [r["text"] for r in db.lines(speaker="派蒙")] == ["出发吧！", "等等我！", "找回的一句"]
+        assert {r["url"] for r in db.lines(title="序章")} == {"https://example.com/content/1/"}
+        assert db.count(category="world", kind="narration") == 2
+        assert db.speakers(category="world")[0] == ("派蒙", 3)
+        assert db.categories() == ["timed", "world"]
+        assert db.count(contains="契约") == 1
+
+
+def test_export_speakers_matches_group_by_speaker(tmp_path):
+    make_corpus(tmp_path)
+    subprocess.run([sys.executable, str(ROOT / "group_by_speaker.py"), "--dialogue-dir", "dialogue",
+                    "--out-dir", "speaker", "--jobs", "1"], cwd=tmp_path, check=True, capture_output=True)
+    db_path = tmp_path / "corpus.db"
+    corpus_db.build(db_path, tmp_path / "dialogue", tmp_path / "extraction", tmp_path / "narration",
+                    tmp_path / "urls")
+    with corpus_db.CorpusDB(db_path) as db:
+        db.export_speakers(tmp_path / "exported")
+
+    def tree(root):
+        return {p.relative_to(root).as_posix(): p.read_text(encoding="utf-8") for p in root.glob("*/*.json")}
+
+    expected = tree(tmp_path / "speaker")
+    assert expected and tree(tmp_path / "exported") == expected
+
+
+def test_export_speakers_round_trip(tmp_path):
+    dialogue = tmp_path / "dialogue"
+    dialogue.mkdir()
+    positioned = [{"source_title": "序章", "speaker": speaker, "text": f"第 {turn} 句", "page_id": 1001,
+                   "block_id": 0, "branch_id": 0, "turn": turn}
+                  for turn, speaker in enumerate(("派蒙", "旅行者", "派蒙", "神秘人"))]
+    # 旧数据没有位置字段；page_id 解析不出时为 null 但字段仍在
+    legacy = [{"source_title": "旧章节", "speaker": "派蒙", "text": "旧数据"}]
+    no_page = [{"source_title": "无编号", "speaker": "旅行者", "text": "……", "page_id": None,
+                "block_id": 2, "branch_id": 1, "turn": 0}]
+    write_dialogue(dialogue / "dialogue_data_world.json", positioned + legacy + no_page)
+    write_dialogue(dialogue / "dialogue_data_timed.json", legacy + positioned[:2])
+
+    subprocess.run([sys.executable, str(ROOT / "group_by_speaker.py"), "--dialogue-dir", "dialogue",
+                    "--out-dir", "speaker", "--jobs", "1"], cwd=tmp_path, check=True, capture_output=True)
+    db_path = tmp_path / "corpus.db"
+    corpus_db.build(db_path, dialogue, tmp_path / "extraction", tmp_path / "narration", tmp_path / "urls")
+    with corpus_db.CorpusDB(db_path) as db:
+        db.export_speakers(tmp_path / "exported")
+        rows = db.lines(speaker="旅行者", category="world")
+
+    def tree(root):
+        return {p.relative_to(root).as_posix(): p.read_text(encoding="utf-8") for p in root.glob("*/*.json")}
+
+    expected = tree(tmp_path / "speaker")
+    assert expected and tree(tmp_path / "exported") == expected
+    assert [(r["page_id"], r["block_id"], r["branch_id"], r["turn"]) for r in rows] == [(1001, 0, 0, 1),
+                                                                                         (None, 2, 1, 0)]
@@ -0,0 +1,83 @@
+"""export_training：配额、说话人过滤与分片大小，相同种子的输出逐字节一致；quota、buffer_size 为 0 或负数时直接报错；
+导出失败时进程以非 0 退出码结束，保留上一次的分片且不留下临时目录。"""
+import gzip
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from export_training import export  # noqa: E402
+
+
+def make_corpus(root):
+    dialogue = root / "dialogue"
+    dialogue.mkdir()
+    for category, speakers in (("world", ("派蒙", "纳西妲", "旅行者")), ("timed", ("派蒙", "钟离"))):
+        items = [{"source_title": f"{category}-{i // 4}", "speaker": speakers[i % len(speakers)],
+                  "text": f"{category} 第 {i} 句台词"} for i in range(30)]
+        (dialogue / f"dialogue_data_{category}.json").write_text(json.dumps(items, ensure_ascii=False, indent=4),
+                                                                 encoding="utf-8")
+    return dialogue
+
+
+def read_shards(out_dir):
+    return [json.loads(line) for path in sorted(out_dir.glob("shard-*.jsonl.gz"))
+            for line in gzip.open(path, "rt", encoding="utf-8")]
+
+
+def test_quota_filters_and_shards(tmp_path):
+    dialogue = make_corpus(tmp_path)
+    out = tmp_path / "out"
+    manifest = export(out, dialogue, tmp_path / "speaker", speakers=["派蒙", "钟离"], quota=5, seed=7,
+                      buffer_size=4, shard_size=3, jobs=1)
+
+    records = read_shards(out)
+    assert manifest["speakers"] == {"派蒙": 5, "钟离": 5}
+    assert manifest["records"] == len(records) == 10
+    assert [s["records"] for s in manifest["shards"]] == [3, 3, 3, 1]
+    assert {r["speaker"] for r in records} == {"派蒙", "钟离"}
+    assert not (out / ".spool").exists()
+
+
+def test_same_seed_same_bytes(tmp_path):
+    dialogue = make_corpus(tmp_path)
+    runs = []
+    for name in ("a", "b"):
+        export(tmp_path / name, dialogue, tmp_path / "speaker", quota=4, seed=3, buffer_size=8, shard_size=5, jobs=2)
+        runs.append([p.read_bytes() for p in sorted((tmp_path / name).glob("shard-*.jsonl.gz"))])
+    assert runs[0] == runs[1]
+
+
+@pytest.mark.parametrize("option, value", [("quota", 0), ("quota", -1), ("buffer_size", 0), ("shard_size", 0)])
+def test_export_rejects_non_positive_sizes(tmp_path, option, value):
+    with pytest.raises(ValueError):
+        export(tmp_path / "out", tmp_path / "dialogue", tmp_path / "speaker", **{option: value})
+    assert not (tmp_path / "out").exists()
+
+
+@pytest.mark.parametrize("option", ["--quota", "--buffer-size"])
+def test_cli_rejects_zero(tmp_path, option):
+    proc = subprocess.run([sys.executable, str(ROOT / "export_training.py"), option, "0",
+                           "--out-dir", str(tmp_path / "out")], capture_output=True, text=True)
+    assert proc.returncode == 2
+    assert option in proc.stderr
+
+
+def test_failed_export_keeps_previous_shards(tmp_path):
+    dialogue = make_corpus(tmp_path)
+    out = tmp_path / "out"
+    export(out, dialogue, tmp_path / "speaker", quota=5, seed=7, shard_size=3, jobs=1)
+    before = {p.name: p.read_bytes() for p in out.iterdir()}
+
+    (dialogue / "dialogue_data_world.json").write_text('[{"speaker": "派蒙", "text": ', encoding="utf-8")
+    proc = subprocess.run([sys.executable, str(ROOT / "export_training.py"), "--dialogue-dir", str(dialogue),
+                           "--speaker-dir", str(tmp_path / "speaker"), "--out-dir", str(out), "--jobs", "1"],
+                          capture_output=True, text=True)
+    assert proc.returncode == 1
+    assert "导出失败" in proc.stdout
+    assert {p.name: p.read_bytes() for p in out.iterdir()} == before
@@ -0,0 +1,89 @@
+"""失败分类与重试：RetryQueue 的指数退避与次数上限，FailureStore 的持久化与未解决的临时失败；
+多个分类各自的 store 写同一个 url_failures.json，互不覆盖。"""
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from failures import (HTTP_ERROR, LEGACY, NO_STRUCTURE, PAGE_LOAD_TIMEOUT, STATUS_PERMANENT,  # noqa: E402
+                      STATUS_TRANSIENT, FailureStore, PageFailure, RetryQueue)
+
+
+def test_retry_queue_backoff_and_limit():
+    queue = RetryQueue(max_attempts=3, backoff_base=0.0, backoff_max=60.0)
+    assert [RetryQueue(backoff_base=2.0, backoff_max=5.0).backoff(n) for n in (1, 2, 3, 4)] == [2.0, 4.0, 5.0, 5.0]
+    assert queue.push("a", 1) and queue.push("b", 2)
+    assert not queue.push("c", 3)
+    assert len(queue) == 2
+    assert queue.pop_ready() == ("a", 1)
+    assert queue.pop_ready() == ("b", 2)
+    assert queue.pop_ready() is None and queue.wait_time() == 0.0
+
+
+def test_store_round_trip_and_outstanding(tmp_path):
+    path = tmp_path / "url_failures.json"
+    store = FailureStore(path)
+    store.record("u1", "超时", "world", PageFailure(PAGE_LOAD_TIMEOUT, "TimeoutException"), 4)
+    store.record("u2", "无结构", "world", PageFailure(NO_STRUCTURE), 1)
+    store.record("u3", "其他分类", "timed", PageFailure(HTTP_ERROR), 2)
+    store.record("u4", "已恢复", "world", PageFailure(HTTP_ERROR), 1)
+    store.resolve("u4")
+    store.save()
+
+    loaded = FailureStore(path)
+    assert loaded.get("u1")["status"] == STATUS_TRANSIENT and loaded.get("u1")["attempts"] == 4
+    assert loaded.get("u2")["status"] == STATUS_PERMANENT
+    assert loaded.get("u4") is None
+    assert loaded.outstanding() == {"u1", "u3"}
+    assert loaded.outstanding("world") == {"u1"}
+    assert loaded.outstanding("world", include_permanent=True) == {"u1", "u2"}
+
+
+def test_import_legacy(tmp_path):
+    legacy = tmp_path / "url_error.txt"
+    legacy.write_text("u1\nu2\n\nu1\n", encoding="utf-8")
+    store = FailureStore(tmp_path / "url_failures.json")
+    assert store.import_legacy(legacy) == 2
+    assert store.import_legacy(legacy) == 0
+    assert {e["cause"] for e in store.entries().values()} == {LEGACY}
+    assert store.outstanding() == {"u1", "u2"}
+
+
+def record_category(args):
+    path, category, n = args
+    store = FailureStore(path)
+    for i in range(n):
+        store.record(f"https://example.com/{category}/{i}", f"{category}-{i}", category, PageFailure(HTTP_ERROR), 1)
+        store.save()
+    return category
+
+
+def test_stores_loaded_together_keep_each_others_records(tmp_path):
+    path = tmp_path / "url_failures.json"
+    seed = FailureStore(path)
+    seed.record("u-old", "old", "world", PageFailure(HTTP_ERROR), 1)
+    seed.save()
+
+    world = FailureStore(path)
+    timed = FailureStore(path)
+    world.record("u-world", "w", "world", PageFailure(NO_STRUCTURE), 1)
+    world.resolve("u-old")
+    timed.record("u-timed", "t", "timed", PageFailure(HTTP_ERROR), 2)
+    world.save()
+    timed.save()
+
+    entries = FailureStore(path).entries()
+    assert set(entries) == {"u-world", "u-timed"}
+    assert entries["u-timed"]["attempts"] == 2
+
+
+def test_parallel_processes(tmp_path):
+    path = str(tmp_path / "url_failures.json")
+    categories = ("world", "timed", "archons", "legend", "others")
+    with ProcessPoolExecutor(max_workers=len(categories)) as pool:
+        list(pool.map(record_category, [(path, c, 20) for c in categories]))
+    entries = FailureStore(path).entries()
+    assert len(entries) == 20 * len(categories)
+    assert not Path(f"{path}.lock").exists()
@@ -0,0 +1,191 @@
+"""fetch_page_selenium 的失败分类：加载超时与驱动崩溃为临时失败，找到结构却提取不到内容为永久失败；
+等待对话容器超时时，只有页面已加载完成才记为永久的 no_structure。
+html 模式点击展开按钮后等到按钮失效或折叠内容出现，不固定 sleep；按钮没有反应时超时后继续解析。
+离线 reparse 把新的解析结果写入断点日志，之后的续爬导出的仍是新结果；没有新完成的页面时续爬不改写输出文件。"""
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from failures import (NO_STRUCTURE, PAGE_LOAD_TIMEOUT, STRUCTURE_TIMEOUT, TRANSIENT_CAUSES,  # noqa: E402
+                      WEBDRIVER_CRASH, ZERO_RECORDS, PageFailure)
+from crawl_journal import CrawlJournal  # noqa: E402
+import get_dialogue  # noqa: E402
+from get_dialogue import fetch_page_selenium, main_extraction, main_http_extraction, main_reparse  # noqa: E402
+from page_cache import PageCache  # noqa: E402
+
+EMPTY_FOLD = ('<html><body><div class="obc-tmpl-fold"><div class="obc-tmpl-fold__title"><span>剧情对话</span></div>'
+              '<div class="obc-tmpl-fold__content"></div></div></body></html>')
+DIALOGUE_FOLD = EMPTY_FOLD.replace('__content">', '__content"><p>派蒙：出发吧！</p><p>远处传来钟声。</p>')
+LOADING = "<html><body><p>加载中</p></body></html>"
+
+
+class FakeDriver:
+    def __init__(self, page_source="", get_error=None, ready_state="complete"):
+        self.page_source = page_source
+        self.get_error = get_error
+        self.ready_state = ready_state
+
+    def get(self, url):
+        if self.get_error is not None:
+            raise self.get_error
+
+    def execute_script(self, script, *args):
+        assert "readyState" in script
+        return self.ready_state
+
+    def find_elements(self, by, value):
+        return []
+
+
+class ExpandButton:
+    """stale：点击后从 DOM 移除；grow：点击后在原处展开出一段对话；dead：点击没有反应"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.clicked = False
+
+    def click(self, driver):
+        self.clicked = True
+        if self.mode == "grow":
+            driver.paragraphs.append("旅行者：继续吧。")
+
+    def is_displayed(self):
+        if self.clicked and self.mode == "stale":
+            raise StaleElementReferenceException()
+        return True
+
+
+class ExpandDriver:
+    def __init__(self, buttons):
+        self.buttons = buttons
+        self.paragraphs = ["派蒙：出发吧！"]
+
+    @property
+    def page_source(self):
+        paragraphs = "".join(f"<p>{text}</p>" for text in self.paragraphs)
+        return ('<html><body><div class="obc-tmpl-interactiveDialogue"><div class="content-box">'
+                f'{paragraphs}</div></div></body></html>')
+
+    def get(self, url):
+        pass
+
+    def execute_script(self, script, *args):
+        assert script == "arguments[0].click();"
+        args[0].click(self)
+
+    def find_elements(self, by, value):
+        if by == By.XPATH:
+            return list(self.buttons)
+        if by == By.CSS_SELECTOR:
+            return list(self.paragraphs)
+        return [object()]
+
+
+class ReadyWait:
+    def until(self, condition):
+        return True
+
+
+class TimeoutWait:
+    def until(self, condition):
+        raise TimeoutException()
+
+
+@pytest.mark.parametrize("error, cause", [(TimeoutException(), PAGE_LOAD_TIMEOUT),
+                                          (WebDriverException(), WEBDRIVER_CRASH)])
+def test_navigation_errors_are_transient(error, cause):
+    with pytest.raises(PageFailure) as exc:
+        fetch_page_selenium(FakeDriver(get_error=error), "https://example.com/content/1/", "序章", ReadyWait())
+    assert exc.value.cause == cause and exc.value.transient
+
+
+def test_structure_without_records_is_permanent():
+    with pytest.raises(PageFailure) as exc:
+        fetch_page_selenium(FakeDriver(EMPTY_FOLD), "https://example.com/content/1/", "序章", ReadyWait())
+    assert exc.value.cause == ZERO_RECORDS and not exc.value.transient
+
+
+def test_parsed_page():
+    dialogues, narratives = fetch_page_selenium(FakeDriver(DIALOGUE_FOLD), "https://example.com/content/1/", "序章",
+                                                ReadyWait())
+    assert [(d["speaker"], d["text"]) for d in dialogues] == [("派蒙", "出发吧！")]
+    assert narratives == ["[序章] 远处传来钟声。"]
+
+
+@pytest.mark.parametrize("ready_state, cause", [("complete", NO_STRUCTURE), ("interactive", STRUCTURE_TIMEOUT)])
+def test_structure_wait_timeout(ready_state, cause):
+    with pytest.raises(PageFailure) as exc:
+        fetch_page_selenium(FakeDriver(LOADING, ready_state=ready_state), "https://example.com/content/1/", "序章",
+                            TimeoutWait())
+    assert exc.value.cause == cause
+    assert exc.value.transient == (cause in TRANSIENT_CAUSES)
+    assert exc.value.transient == (ready_state != "complete")
+
+
+def test_expand_waits_for_dom_change():
+    driver = ExpandDriver([ExpandButton("stale"), ExpandButton("grow"), ExpandButton("stale")])
+    started = time.monotonic()
+    dialogues, _ = fetch_page_selenium(driver, "https://example.com/content/1/", "序章", ReadyWait())
+    # 每个按钮的 DOM 变化都已发生，不应再有每次 0.3 秒的固定等待
+    assert time.monotonic() - started < 0.3
+    assert all(btn.clicked for btn in driver.buttons)
+    assert [d["text"] for d in dialogues] == ["出发吧！", "继续吧。"]
+
+
+def test_expand_timeout_keeps_parsing(monkeypatch):
+    monkeypatch.setattr(get_dialogue, "EXPAND_WAIT_SECONDS", 0.2)
+    driver = ExpandDriver([ExpandButton("dead"), ExpandButton("grow")])
+    dialogues, _ = fetch_page_selenium(driver, "https://example.com/content/1/", "序章", ReadyWait())
+    assert all(btn.clicked for btn in driver.buttons)
+    assert [d["text"] for d in dialogues] == ["出发吧！", "继续吧。"]
+
+
+def test_reparse_survives_resume(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    urls = ["https://example.com/content/1/", "https://example.com/content/2/", "https://example.com/content/3/"]
+    (tmp_path / "urls.csv").write_text("title,url\n" + "".join(f"第{i}章,{u}\n" for i, u in enumerate(urls)),
+                                       encoding="utf-8")
+    paths = ("urls.csv", "dialogue_data_world.json", "narrative_data_world.txt")
+    # 日志中是旧解析器的结果；第三个页面不在缓存中，保留日志中的记录
+    journal = CrawlJournal(paths[1])
+    for i, url in enumerate(urls):
+        journal.append(i, f"第{i}章", url, [{"source_title": f"第{i}章", "speaker": "旧", "text": "旧"}], [])
+    cache = PageCache(tmp_path / "cache")
+    cache.put(urls[0], DIALOGUE_FOLD)
+    cache.put(urls[1], EMPTY_FOLD)
+
+    assert main_reparse(*paths, cache_dir=tmp_path / "cache", jobs=1)
+    reparsed = json.loads((tmp_path / paths[1]).read_text(encoding="utf-8"))
+    assert [(d["source_title"], d["speaker"]) for d in reparsed] == [("第0章", "派蒙"), ("第1章", "旧"), ("第2章", "旧")]
+    assert (tmp_path / paths[2]).read_text(encoding="utf-8") == "[第0章] 远处传来钟声。"
+
+    # 所有 URL 都已完成，续爬不访问网络，输出仍是 reparse 的结果
+    assert main_extraction(*paths, cache_dir=None, metrics_dir=None)
+    assert json.loads((tmp_path / paths[1]).read_text(encoding="utf-8")) == reparsed
+
+
+@pytest.mark.parametrize("run", [lambda paths: main_extraction(*paths, cache_dir=None, metrics_dir=None),
+                                 lambda paths: main_http_extraction(*paths, cache_dir=None)])
+def test_noop_resume_keeps_outputs(tmp_path, monkeypatch, run):
+    monkeypatch.chdir(tmp_path)
+    url = "https://example.com/content/1/"
+    (tmp_path / "urls.csv").write_text(f"title,url\n序章,{url}\n", encoding="utf-8")
+    paths = ("urls.csv", "dialogue_data_world.json", "narrative_data_world.txt")
+    CrawlJournal(paths[1]).append(0, "序章", url, [{"source_title": "序章", "speaker": "派蒙", "text": "走吧"}], [])
+    # 日志之外追加的内容（如 --discover 抓取的新页面）
+    (tmp_path / paths[1]).write_text('[{"source_title": "新页面"}]', encoding="utf-8")
+    (tmp_path / paths[2]).write_text("[新页面] 旁白", encoding="utf-8")
+    os.utime(tmp_path / paths[2], (1, 1))
+
+    assert run(paths)
+    assert (tmp_path / paths[1]).read_text(encoding="utf-8") == '[{"source_title": "新页面"}]'
+    assert (tmp_path / paths[2]).stat().st_mtime == 1
@@ -0,0 +1,55 @@
+"""MergeIndex：去重追加与 json.dump(indent=4) 逐字节一致，主文件被外部改写后重建索引，键索引保存在磁盘上。"""
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from merge_index import MergeIndex  # noqa: E402
+
+
+def rec(i, speaker="派蒙"):
+    return {"source_title": f"任务{i % 7}", "speaker": speaker, "text": f"第 {i} 句……"}
+
+
+def test_merge_dedups_and_appends(tmp_path):
+    main = tmp_path / "dialogue_data_world.json"
+    main.write_text(json.dumps([rec(i) for i in range(1000)], ensure_ascii=False, indent=4), encoding="utf-8")
+    index = MergeIndex(main, tmp_path / "journal")
+
+    batch = [rec(i) for i in range(900, 1600)] + [rec(1500)]
+    assert index.merge(batch) == (600, 101)
+    expected = [rec(i) for i in range(1600)]
+    assert main.read_text(encoding="utf-8") == json.dumps(expected, ensure_ascii=False, indent=4)
+
+    # 重复合并不改变主文件，也不触发重建
+    assert index.merge(batch) == (0, 701)
+    assert json.loads(main.read_text(encoding="utf-8")) == expected
+
+
+def test_rebuild_after_external_rewrite(tmp_path):
+    main = tmp_path / "dialogue_data_world.json"
+    main.write_text("[]", encoding="utf-8")
+    index = MergeIndex(main, tmp_path / "journal")
+    assert index.merge([rec(1), rec(2)]) == (2, 0)
+
+    # 其他程序改写主文件：rec(2) 被删掉，rec(3) 被加入
+    main.write_text(json.dumps([rec(1), rec(3)], ensure_ascii=False, indent=4), encoding="utf-8")
+    assert index.merge([rec(2), rec(3)]) == (1, 1)
+    assert json.loads(main.read_text(encoding="utf-8")) == [rec(1), rec(3), rec(2)]
+
+
+def test_keys_stay_on_disk(tmp_path, monkeypatch):
+    main = tmp_path / "dialogue_data_world.json"
+    main.write_text("[]", encoding="utf-8")
+    journal = tmp_path / "journal"
+    assert MergeIndex(main, journal).merge([rec(i) for i in range(50)]) == (50, 0)
+    assert (journal / "dialogue_data_world.keys.sqlite").exists()
+
+    # 主文件未被外部改写时，新的 MergeIndex 直接查询磁盘上的索引，不重建
+    def fail(self, conn):
+        raise AssertionError("不应重建索引")
+
+    monkeypatch.setattr(MergeIndex, "_rebuild", fail)
+    assert MergeIndex(main, journal).merge([rec(i) for i in range(40, 60)]) == (10, 10)
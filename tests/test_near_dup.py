@@ -0,0 +1,26 @@
+"""near_dup 的命令行：检测失败时以非 0 退出码结束，可以作为脚本或 pipeline 阶段使用。"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run(tmp_path, *args):
+    return subprocess.run([sys.executable, str(ROOT / "near_dup.py"), "--dialogue-dir", str(tmp_path / "dialogue"),
+                           "--speaker-dir", str(tmp_path / "speaker"), "--out-dir", str(tmp_path / "dedup"),
+                           "--jobs", "1", *args], capture_output=True, text=True)
+
+
+def test_exit_codes(tmp_path):
+    (tmp_path / "dialogue").mkdir()
+    items = [{"source_title": "序章", "speaker": "派蒙", "text": "我们一起去蒙德城看看吧，那里有好多好吃的！"}] * 2
+    (tmp_path / "dialogue" / "dialogue_data_world.json").write_text(json.dumps(items, ensure_ascii=False),
+                                                                    encoding="utf-8")
+    assert run(tmp_path).returncode == 0
+    assert (tmp_path / "dedup" / "clusters.jsonl").exists()
+
+    proc = run(tmp_path, "--num-perm", "100", "--bands", "7")
+    assert proc.returncode == 1
+    assert "近似重复检测失败" in proc.stdout
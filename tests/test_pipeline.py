@@ -0,0 +1,81 @@
+"""pipeline 的调度：失败阶段阻塞下游，已是最新的阶段跳过，输入更新后重新运行；
+脚本出错时的非 0 退出码、退出码为 0 但缺少输出，下游阶段都不能运行。"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pipeline  # noqa: E402
+from pipeline import Stage, run_pipeline  # noqa: E402
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "ROOT", tmp_path)
+    (tmp_path / "dialogue").mkdir()
+    (tmp_path / "dialogue" / "dialogue_data_world.json").write_text("[]", encoding="utf-8")
+    return tmp_path
+
+
+def touch(path):
+    return [sys.executable, "-c", f"open({str(path)!r}, 'w').close()"]
+
+
+def test_failed_stage_blocks_dependents(workdir):
+    stages = [
+        Stage("extract", "world", [], [], [], [sys.executable, "-c", "import sys; print('出错了'); sys.exit(3)"]),
+        Stage("merge", "world", ["extract:world"], [], [], touch(workdir / "merged.txt")),
+        Stage("extract", "timed", [], [], [], [sys.executable, "-c", "pass"]),
+    ]
+    status = run_pipeline(stages, parallel=2)
+    assert status == {"extract:world": "failed", "merge:world": "blocked", "extract:timed": "ran"}
+    assert stages[0].failed_marker.exists() and not stages[0].stamp.exists()
+    assert "出错了" in stages[0].log.read_text(encoding="utf-8")
+    assert not (workdir / "merged.txt").exists()
+
+
+def test_up_to_date_stages_are_skipped(workdir):
+    (workdir / "in.txt").write_text("1", encoding="utf-8")
+    stage = Stage("extract", "world", [], ["in.txt"], ["out.txt"], touch(workdir / "out.txt"))
+    assert run_pipeline([stage], parallel=1) == {"extract:world": "ran"}
+    assert run_pipeline([stage], parallel=1) == {"extract:world": "skipped"}
+    assert run_pipeline([stage], parallel=1, force=("extract",)) == {"extract:world": "ran"}
+
+    future = time.time() + 10
+    os.utime(workdir / "in.txt", (future, future))
+    assert run_pipeline([stage], parallel=1) == {"extract:world": "ran"}
+
+
+def test_failing_merge_blocks_dependents(workdir):
+    # 没有提取文件时 extract_and_merge.py 打印“未找到提取文件”，应以非 0 退出码结束
+    stages = [
+        Stage("merge", "world", [], [], [], [sys.executable, str(ROOT / "extract_and_merge.py"), "--category", "world"]),
+        Stage("group", None, ["merge:world"], [], ["out.txt"], touch(workdir / "out.txt")),
+    ]
+    status = run_pipeline(stages, parallel=1)
+    assert status == {"merge:world": "failed", "group": "blocked"}
+    assert "未找到提取文件" in stages[0].log.read_text(encoding="utf-8")
+    assert stages[0].failed_marker.exists() and not stages[0].stamp.exists()
+    assert not (workdir / "out.txt").exists()
+
+
+def test_missing_output_is_failure(workdir):
+    stages = [
+        Stage("extract", "world", [], [], ["extraction/missing.json"], [sys.executable, "-c", "pass"]),
+        Stage("merge", "world", ["extract:world"], [], [], [sys.executable, "-c", "pass"]),
+    ]
+    status = run_pipeline(stages, parallel=1)
+    assert status == {"extract:world": "failed", "merge:world": "blocked"}
+
+    # 失败后即使补上了输出，下次运行仍会重新运行该阶段
+    (workdir / "extraction").mkdir()
+    stages[0].command = touch(workdir / "extraction" / "missing.json")
+    assert not stages[0].up_to_date()
+    status = run_pipeline(stages, parallel=1)
+    assert status == {"extract:world": "ran", "merge:world": "ran"}
+    assert stages[0].up_to_date()
@@ -0,0 +1,47 @@
+"""speaker_recovery：新增行的统计、待标注样本的抽取，以及按标注计算新增行的精确率。"""
+import csv
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import speaker_recovery  # noqa: E402
+
+LINES = [
+    "[序章] 派蒙 : 严格格式",
+    "[序章] 派蒙：全角冒号",
+    "[序章] 旅行者:没有空格",
+    "[序章] 我觉得：这不是对话",
+    "[序章] 一段旁白",
+]
+
+
+def write_narration(tmp_path):
+    path = tmp_path / "narrative_data_world.txt"
+    path.write_text("\n".join(LINES) + "\n", encoding="utf-8")
+    (tmp_path / "dialogue").mkdir()
+    return str(path)
+
+
+def test_extra_lines_are_counted(tmp_path):
+    path = write_narration(tmp_path)
+    speaker_recovery._init_worker(speaker_recovery.build_vocabulary([path], tmp_path / "dialogue"))
+    records, stats = speaker_recovery.recover_file(path)
+    assert [r["speaker"] for r in records] == ["派蒙", "派蒙", "旅行者"]
+    assert (stats["strict"], stats["agreed"], stats["recovered"], stats["extra"]) == (1, 1, 3, 2)
+
+
+def test_sample_and_labels(tmp_path):
+    path = write_narration(tmp_path)
+    out = tmp_path / "sample.tsv"
+    assert speaker_recovery.write_sample([path], out, 10, dialogue_dir=tmp_path / "dialogue") == 2
+    with open(out, "r", encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f, delimiter="\t"))
+    assert [(r[1], r[3], r[5]) for r in rows[1:]] == [("2", "派蒙", ""), ("3", "旅行者", "")]
+    assert speaker_recovery.labelled_precision(out) == (0, 0)
+
+    rows[1][5], rows[2][5] = "1", "0"
+    with open(out, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f, delimiter="\t").writerows(rows)
+    assert speaker_recovery.labelled_precision(out) == (1, 2)
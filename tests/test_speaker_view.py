@@ -0,0 +1,96 @@
+"""speaker_view：按说话人 seek 读取的记录与源文件一致，只重新转写变化的文件，export 与按说话人分组 json.dump 逐字节一致；
+group_by_speaker 从视图生成 speaker/。"""
+import json
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import speaker_view  # noqa: E402
+from group_by_speaker import DEFAULT_GROUPS, group_of, sanitize_filename  # noqa: E402
+
+FIXTURE = ROOT / "benchmarks" / "fixtures" / "dialogue" / "dialogue_data_world.json"
+
+
+def make_dialogue(root):
+    dialogue = root / "dialogue"
+    dialogue.mkdir()
+    for category, speakers in (("world", ("派蒙", "纳西妲", None, "路人甲")), ("timed", ("派蒙", "钟离"))):
+        items = [{"source_title": f"{category}-{i // 3}", "speaker": speakers[i % len(speakers)],
+                  "text": f"{category} 第 {i} 句"} for i in range(12)]
+        (dialogue / f"dialogue_data_{category}.json").write_text(json.dumps(items, ensure_ascii=False, indent=4),
+                                                                 encoding="utf-8")
+    return dialogue
+
+
+def source_items(dialogue):
+    return {p.name: json.loads(p.read_text(encoding="utf-8")) for p in sorted(dialogue.glob("*.json"))}
+
+
+def test_lines_and_incremental_build(tmp_path):
+    dialogue = make_dialogue(tmp_path)
+    speaker_view.build(dialogue)
+    view = speaker_view.SpeakerView(dialogue)
+    items = source_items(dialogue)
+    assert list(view.lines("派蒙")) == [item for name in sorted(items) for item in items[name]
+                                        if item["speaker"] == "派蒙"]
+    assert view.speakers()["派蒙"] == 9
+
+    world = dialogue / "dialogue_data_world.json"
+    world.write_text(json.dumps(items[world.name][:4], ensure_ascii=False, indent=4), encoding="utf-8")
+    speaker_view.build(dialogue)
+    assert list(speaker_view.SpeakerView(dialogue).lines("纳西妲")) == [items[world.name][1]]
+
+
+def test_export_matches_grouping(tmp_path):
+    dialogue = make_dialogue(tmp_path)
+    speaker_view.build(dialogue)
+    speaker_view.SpeakerView(dialogue).export(tmp_path / "speaker")
+
+    sanitized_groups = {sanitize_filename(g) for g in DEFAULT_GROUPS}
+    expected = {}
+    for name, items in source_items(dialogue).items():
+        groups = {}
+        for item in items:
+            groups.setdefault(group_of(item, sanitized_groups), []).append(item)
+        for grp, group_items in groups.items():
+            expected[f"{grp}/{name}"] = json.dumps(group_items, ensure_ascii=False, indent=2)
+    actual = {p.relative_to(tmp_path / "speaker").as_posix(): p.read_text(encoding="utf-8")
+              for p in (tmp_path / "speaker").glob("*/*.json")}
+    assert actual == expected
+
+
+def expected_tree(src):
+    sanitized_groups = {sanitize_filename(g) for g in DEFAULT_GROUPS}
+    groups = {}
+    for item in json.loads(src.read_text(encoding="utf-8")):
+        groups.setdefault(group_of(item, sanitized_groups), []).append(item)
+    return {grp: json.dumps(items, ensure_ascii=False, indent=2) for grp, items in groups.items()}
+
+
+def run_group(workdir):
+    subprocess.run([sys.executable, str(ROOT / "group_by_speaker.py"), "--dialogue-dir", "dialogue",
+                    "--out-dir", "speaker", "--jobs", "1"], cwd=workdir, check=True, capture_output=True)
+
+
+def test_group_by_speaker_reads_view(tmp_path):
+    (tmp_path / "dialogue").mkdir()
+    src = tmp_path / "dialogue" / FIXTURE.name
+    shutil.copyfile(FIXTURE, src)
+
+    run_group(tmp_path)
+    assert (tmp_path / "dialogue" / "speaker.idx").exists()
+    expected = expected_tree(src)
+    actual = {p.parent.name: p.read_text(encoding="utf-8") for p in (tmp_path / "speaker").glob("*/*.json")}
+    assert actual == expected
+
+    # 源文件变化后只重新生成该文件，已不再出现的分组中的旧输出被删除
+    items = [item for item in json.loads(src.read_text(encoding="utf-8")) if item.get("speaker") != "派蒙"]
+    src.write_text(json.dumps(items, ensure_ascii=False, indent=4), encoding="utf-8")
+    run_group(tmp_path)
+    actual = {p.parent.name: p.read_text(encoding="utf-8") for p in (tmp_path / "speaker").glob("*/*.json")}
+    assert "派蒙" not in actual
+    assert actual == expected_tree(src)